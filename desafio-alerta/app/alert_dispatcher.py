@@ -0,0 +1,177 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from email_alert import build_email_message, open_smtp_connection
+from telegram_alert import post_telegram_alert
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramChannel:
+    """Telegram delivery over one pooled keep-alive session."""
+
+    name = 'telegram'
+
+    def __init__(self, pool_size: int = 4):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, notification: dict):
+        post_telegram_alert(
+            self.session, notification['status'], notification['timestamp'], notification['count'],
+            notification['kind'], notification.get('details')
+        )
+
+    def close(self):
+        self.session.close()
+
+
+class EmailChannel:
+    """Email delivery over a persistent SMTP connection, reopened on failure."""
+
+    name = 'email'
+
+    def __init__(self, connect=open_smtp_connection):
+        self._connect = connect
+        self._server = None
+        self._lock = threading.Lock() # smtplib não é thread-safe
+
+    def send(self, notification: dict):
+        msg = build_email_message(
+            notification['status'], notification['timestamp'], notification['count'],
+            notification['kind'], notification.get('details')
+        )
+        with self._lock:
+            if self._server is None:
+                self._server = self._connect()
+            try:
+                self._server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Conexão caiu entre envios: reabre uma vez e tenta de novo. Recusas
+                # do servidor (SMTPRecipientsRefused etc.) e timeouts não são repetidos
+                self._drop()
+                self._server = self._connect()
+                self._server.send_message(msg)
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+            self._drop()
+
+
+class AlertDispatcher:
+    """Bounded queue of alert deliveries drained by a fixed pool of worker threads.
+
+    `submit` never blocks the request: when the queue is full the delivery is
+    dropped and counted. Per-channel counters (sent, failed, dropped, latency)
+    are available from `stats`.
+    """
+
+    def __init__(self, channels, workers: int = 2, queue_size: int = 1000):
+        self.channels = {channel.name: channel for channel in channels}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            channel.name: {'sent': 0, 'failed': 0, 'dropped': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+            for channel in self.channels.values()
+        }
+        self._workers = [
+            threading.Thread(target=self._run, name=f"alert-dispatcher-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, notification: dict, channels=None) -> bool:
+        """Queue `notification` for the given channel names (default: all)."""
+        accepted = True
+        for name in channels or self.channels:
+            try:
+                self._queue.put_nowait((self.channels[name], notification))
+            except queue.Full:
+                accepted = False
+                with self._lock:
+                    self._stats[name]['dropped'] += 1
+                logger.warning(
+                    f"Alert queue full, dropping {name} {notification['kind']} alert for {notification['status']}"
+                )
+        return accepted
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            channel, notification = item
+            started = time.perf_counter()
+            try:
+                channel.send(notification)
+                ok = True
+            except Exception as err:
+                ok = False
+                logger.error(
+                    f"Failed to send {channel.name} {notification['kind']} alert for "
+                    f"{notification['status']} at {notification['timestamp']}: {err}"
+                )
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stats = self._stats[channel.name]
+                stats['sent' if ok else 'failed'] += 1
+                stats['latency_total'] += elapsed
+                stats['latency_max'] = max(stats['latency_max'], elapsed)
+            self._queue.task_done()
+
+    def join(self):
+        """Block until every queued delivery has been attempted."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            channels = {}
+            for name, stats in self._stats.items():
+                attempts = stats['sent'] + stats['failed']
+                channels[name] = {
+                    'sent': stats['sent'],
+                    'failed': stats['failed'],
+                    'dropped': stats['dropped'],
+                    'latency_avg_ms': round(1000 * stats['latency_total'] / attempts, 2) if attempts else None,
+                    'latency_max_ms': round(1000 * stats['latency_max'], 2),
+                }
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'workers': len(self._workers),
+            'channels': channels,
+        }
+
+    def close(self, timeout: float = 5):
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout)
+        for channel in self.channels.values():
+            channel.close()
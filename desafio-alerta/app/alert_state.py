@@ -0,0 +1,165 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Allows `burst` sends at once, refilled at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = None
+
+    def consume(self, now: float) -> bool:
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AlertManager:
+    """Per-status incident state machine in front of the alert dispatcher.
+
+    The first high-severity point of a status opens an incident ('firing') and
+    sends one 'started' alert. Further points only update the incident
+    ('ongoing') and are summarized in a digest every `digest_interval`
+    seconds. After `resolve_after` seconds without anomalies the incident
+    closes with one 'resolved' alert. Each channel has a token bucket; alerts
+    that exceed it wait in a backlog holding at most one alert per (status,
+    kind), so delivery work stays bounded no matter how long the burst is.
+    """
+
+    def __init__(self, dispatcher, resolve_after: float = 300, digest_interval: float = 300,
+                 rate_per_minute: float = 6, burst: int = 3, tick_interval: float = 1.0,
+                 clock=time.monotonic, start: bool = True):
+        self.dispatcher = dispatcher
+        self.resolve_after = resolve_after
+        self.digest_interval = digest_interval
+        self.clock = clock
+        self._incidents = {} # status -> estado do incidente aberto
+        self._buckets = {name: TokenBucket(rate_per_minute, burst) for name in dispatcher.channels}
+        self._backlog = {name: {} for name in dispatcher.channels} # (status, kind) -> notificação
+        self._counters = {'observed': 0, 'sent': 0, 'coalesced': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(
+                target=self._run, args=(tick_interval,), name="alert-manager", daemon=True
+            )
+            self._thread.start()
+
+    def observe(self, status: str, timestamp: str, count: int):
+        """Record one high-severity anomalous point for `status`."""
+        with self._lock:
+            now = self.clock()
+            self._counters['observed'] += 1
+            incident = self._incidents.get(status)
+            if incident is None:
+                self._incidents[status] = {
+                    'state': 'firing',
+                    'started_at': timestamp,
+                    'last_seen': now,
+                    'last_digest': now,
+                    'last_timestamp': timestamp,
+                    'last_count': count,
+                    'points': 1,
+                    'peak': count,
+                    'pending': 0,
+                    'pending_peak': 0,
+                }
+                self._emit(now, 'started', status, timestamp, count, {'Incident started at': timestamp})
+                return
+            incident['state'] = 'ongoing'
+            incident['last_seen'] = now
+            incident['last_timestamp'] = timestamp
+            incident['last_count'] = count
+            incident['points'] += 1
+            incident['peak'] = max(incident['peak'], count)
+            incident['pending'] += 1
+            incident['pending_peak'] = max(incident['pending_peak'], count)
+            self._counters['coalesced'] += 1
+
+    def tick(self):
+        """Send due digests and resolutions, then drain what the buckets allow."""
+        with self._lock:
+            now = self.clock()
+            for status, incident in list(self._incidents.items()):
+                if now - incident['last_seen'] >= self.resolve_after:
+                    del self._incidents[status]
+                    self._emit(now, 'resolved', status, incident['last_timestamp'], incident['last_count'], {
+                        'Incident started at': incident['started_at'],
+                        'Anomalous points': incident['points'],
+                        'Peak count': incident['peak'],
+                    })
+                elif incident['pending'] and now - incident['last_digest'] >= self.digest_interval:
+                    self._emit(now, 'ongoing', status, incident['last_timestamp'], incident['last_count'], {
+                        'Incident started at': incident['started_at'],
+                        'New anomalous points': incident['pending'],
+                        'Peak count (since last update)': incident['pending_peak'],
+                        'Anomalous points so far': incident['points'],
+                    })
+                    incident['pending'] = 0
+                    incident['pending_peak'] = 0
+                    incident['last_digest'] = now
+            self._drain(now)
+
+    def _emit(self, now: float, kind: str, status: str, timestamp: str, count: int, details: dict):
+        notification = {'kind': kind, 'status': status, 'timestamp': timestamp, 'count': count, 'details': details}
+        for name, backlog in self._backlog.items():
+            key = (status, kind)
+            if not backlog and self._buckets[name].consume(now):
+                self._send(name, notification)
+            elif key in backlog and kind == 'ongoing':
+                backlog[key] = _merge_digest(backlog[key], notification)
+            else:
+                backlog[key] = notification
+
+    def _drain(self, now: float):
+        for name, backlog in self._backlog.items():
+            while backlog and self._buckets[name].consume(now):
+                key = next(iter(backlog))
+                self._send(name, backlog.pop(key))
+
+    def _send(self, channel: str, notification: dict):
+        self._counters['sent'] += 1
+        self.dispatcher.submit(notification, [channel])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                'backlog': {name: len(backlog) for name, backlog in self._backlog.items()},
+                'incidents': {
+                    status: {
+                        'state': incident['state'],
+                        'started_at': incident['started_at'],
+                        'points': incident['points'],
+                        'peak': incident['peak'],
+                    }
+                    for status, incident in self._incidents.items()
+                },
+            }
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            self.tick()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _merge_digest(held: dict, newer: dict) -> dict:
+    # Dois resumos 'ongoing' ainda não enviados viram um só
+    details = dict(newer['details'])
+    details['New anomalous points'] += held['details']['New anomalous points']
+    details['Peak count (since last update)'] = max(
+        details['Peak count (since last update)'], held['details']['Peak count (since last update)']
+    )
+    return {**newer, 'details': details}
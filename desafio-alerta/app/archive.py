@@ -0,0 +1,239 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timezone
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from schema import DB_PATH
+
+ARCHIVE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'archive'))
+DAY = 86400
+DAYS_PER_QUERY = 31 # Dias lidos do SQLite por consulta na exportação
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+# tabela -> coluna chave (vira categórica)
+TABLES = {
+    'transactions': 'status',
+    'auth_codes': 'auth_code',
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar archive needs pyarrow 14 or newer: pip install 'pyarrow>=14'")
+
+
+def _day(value) -> date:
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def partition_path(archive_dir: str, table: str, day: date, fmt: str = 'arrow') -> str:
+    return os.path.join(archive_dir, table, f"{day.isoformat()}{FORMATS[fmt]}")
+
+
+def partitions(archive_dir: str, table: str) -> dict:
+    """{day: path} of the archived days of `table`."""
+    folder = os.path.join(archive_dir, table)
+    if not os.path.isdir(folder):
+        return {}
+    found = {}
+    for name in os.listdir(folder):
+        stem, ext = os.path.splitext(name)
+        if ext in FORMATS.values():
+            try:
+                found[date.fromisoformat(stem)] = os.path.join(folder, name)
+            except ValueError:
+                continue
+    return dict(sorted(found.items()))
+
+
+def to_arrow(frame: pd.DataFrame, key: str):
+    """Typed table of archived rows: UTC timestamp, categorical key and
+    severity, integer count, boolean alert and the float verdict columns."""
+    return pa.table({
+        'timestamp': pa.array(frame['ts'].to_numpy('int64'), pa.timestamp('s', tz='UTC')),
+        key: pa.array(frame[key].astype(str), pa.string()).dictionary_encode(),
+        'count': pa.array(frame['count'].to_numpy('int64')),
+        'alert': pa.array(frame['alert'].fillna(0).astype(bool).to_numpy()),
+        'severity': pa.array(frame['severity'], pa.string()).dictionary_encode(),
+        'mean': pa.array(frame['mean'], pa.float64()),
+        'std': pa.array(frame['std'], pa.float64()),
+        'threshold': pa.array(frame['threshold'], pa.float64()),
+    })
+
+
+def write_table(table, path: str, fmt: str = 'arrow'):
+    # Arquivo temporário + rename: um leitor nunca vê um dia pela metade
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    if fmt == 'parquet':
+        pq.write_table(table, tmp, compression='zstd')
+    else:
+        # IPC sem compressão: o loader mapeia o arquivo sem copiar nem decodificar
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def export(db_path: str = DB_PATH, archive_dir: str = ARCHIVE_DIR, tables=tuple(TABLES), fmt: str = 'arrow',
+           full: bool = False, log=print) -> dict:
+    """Write `tables` of the DB at `db_path` as one file per UTC day.
+
+    Incremental by default: days before the last archived one are kept
+    as they are (they may no longer exist in the DB after compaction) and
+    the last one, which may have been partial, is rewritten with
+    everything after it. `full` rewrites every day still in the DB.
+    """
+    _require_pyarrow()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    result = {}
+    try:
+        for table in tables:
+            key = TABLES[table]
+            started = time.perf_counter()
+            archived = partitions(archive_dir, table)
+            first, last = conn.execute(f"SELECT MIN(ts), MAX(ts) FROM {table} WHERE ts IS NOT NULL").fetchone()
+            if first is None:
+                result[table] = {'days': 0, 'rows': 0}
+                continue
+            if archived and not full:
+                first = max(first, int(datetime.combine(max(archived), datetime.min.time(), timezone.utc).timestamp()))
+            days = rows = 0
+            start = first // DAY * DAY
+            while start <= last:
+                end = start + DAYS_PER_QUERY * DAY
+                frame = pd.read_sql_query(
+                    f"SELECT ts, {key}, count, alert, severity, mean, std, threshold FROM {table} "
+                    "WHERE ts >= ? AND ts < ? ORDER BY ts, id",
+                    conn, params=(start, end)
+                )
+                for day_start, part in frame.groupby(frame['ts'] // DAY * DAY, sort=True):
+                    day = datetime.fromtimestamp(int(day_start), timezone.utc).date()
+                    stale = archived.get(day)
+                    path = partition_path(archive_dir, table, day, fmt)
+                    write_table(to_arrow(part, key), path, fmt)
+                    if stale is not None and stale != path:
+                        os.remove(stale) # O dia mudou de formato
+                    days += 1
+                    rows += len(part)
+                start = end
+            elapsed = time.perf_counter() - started
+            result[table] = {'days': days, 'rows': rows}
+            log(f"{table}: wrote {rows:,} rows in {days} daily {fmt} files in {elapsed:.1f}s")
+    finally:
+        conn.close()
+    return result
+
+
+def read_file(path: str, columns: list = None):
+    """One archived file as a pyarrow Table, memory-mapped.
+
+    Arrow IPC files are zero-copy: only the pages of the selected columns
+    are ever read from disk. Parquet is decoded, but only `columns`.
+    """
+    _require_pyarrow()
+    if path.endswith(FORMATS['parquet']):
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.select(columns) if columns else table
+
+
+def load(archive_dir: str = ARCHIVE_DIR, table: str = 'transactions', start=None, end=None,
+         columns: list = None):
+    """Archived rows of the days in [start, end) as one pyarrow Table.
+
+    `start`/`end` are dates or ISO strings (None = unbounded); only those
+    days' files are opened.
+    """
+    _require_pyarrow()
+    start, end = _day(start), _day(end)
+    tables = [
+        read_file(path, columns)
+        for day, path in partitions(archive_dir, table).items()
+        if (start is None or day >= start) and (end is None or day < end)
+    ]
+    if not tables:
+        return None
+    # Os dicionários de cada dia podem diferir; cada arquivo vira um chunk
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+def load_frame(archive_dir: str = ARCHIVE_DIR, table: str = 'transactions', start=None, end=None,
+               columns: list = None) -> pd.DataFrame:
+    """`load` as a DataFrame (categorical key/severity, tz-aware timestamp)."""
+    loaded = load(archive_dir, table, start, end, columns)
+    if loaded is None:
+        return pd.DataFrame(columns=columns or [])
+    return loaded.to_pandas()
+
+
+def parse_clock(values: pd.Series) -> pd.Series:
+    """Minute of the day of the "HHh MM" / "HHh" labels of the analysis CSVs."""
+    parts = values.astype(str).str.extract(r'^\s*(\d{1,2})h\s*(\d{1,2})?')
+    return (parts[0].astype('int16') * 60 + parts[1].fillna(0).astype('int16')).astype('int16')
+
+
+def convert_csv(path: str, out_path: str = None, fmt: str = 'arrow') -> str:
+    """Typed copy of an analysis CSV (transactions_1.csv, checkout_1.csv...).
+
+    The `time` label becomes `minute_of_day` (int16), `f0_` is renamed
+    to `count` and `status` is categorical, so notebooks stop re-parsing.
+    Without `out_path` the copy goes to <ARCHIVE_DIR>/csv/, next to the
+    exported days and out of the versioned data folders.
+    """
+    _require_pyarrow()
+    frame = pd.read_csv(path)
+    if 'time' in frame.columns:
+        frame.insert(0, 'minute_of_day', parse_clock(frame.pop('time')))
+    frame = frame.rename(columns={'f0_': 'count'})
+    if 'status' in frame.columns:
+        frame['status'] = frame['status'].astype('category')
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = out_path or os.path.join(ARCHIVE_DIR, 'csv', f"{stem}{FORMATS[fmt]}")
+    write_table(pa.Table.from_pandas(frame, preserve_index=False), out_path, fmt)
+    return out_path
+
+
+if __name__ == '__main__':
+    # python archive.py export [--format parquet] [--full]
+    # python archive.py convert ../../desafio-analise/data/*.csv
+    parser = argparse.ArgumentParser(description="Columnar (Arrow IPC / Parquet) archive of transactions.db")
+    commands = parser.add_subparsers(dest='command', required=True)
+    exporter = commands.add_parser('export', help="write the tables as one file per day")
+    exporter.add_argument('--db', default=DB_PATH)
+    exporter.add_argument('--out', default=ARCHIVE_DIR)
+    exporter.add_argument('--table', choices=sorted(TABLES), action='append',
+                          help="table to export (repeatable; default: all)")
+    exporter.add_argument('--format', choices=sorted(FORMATS), default='arrow',
+                          help="arrow (memory-mappable, default) or parquet (smaller)")
+    exporter.add_argument('--full', action='store_true', help="rewrite every day instead of only new ones")
+    converter = commands.add_parser('convert', help="typed copies of the analysis CSVs")
+    converter.add_argument('paths', nargs='+')
+    converter.add_argument('--out', help="output folder (default: data/archive/csv)")
+    converter.add_argument('--format', choices=sorted(FORMATS), default='arrow')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            export(args.db, args.out, args.table or tuple(TABLES), args.format, args.full)
+        else:
+            for path in args.paths:
+                out_path = None
+                if args.out:
+                    stem = os.path.splitext(os.path.basename(path))[0]
+                    out_path = os.path.join(args.out, f"{stem}{FORMATS[args.format]}")
+                print(f"{path} -> {convert_csv(path, out_path, args.format)}")
+    except ImportError as err:
+        raise SystemExit(str(err))
@@ -0,0 +1,148 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import score_batch
+from schema import DB_PATH, DEFAULT_SCORING
+from transactions_endpoint import ALERT_STATUSES
+
+CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv'))
+
+# Histórico carregado uma vez por processo do pool (ver load_worker)
+_history = None
+
+
+def load_history(csv_path: str = None, db_path: str = None) -> dict:
+    """Columnar history (status, ts, count) in the order check_anomaly would see it."""
+    if db_path:
+        # A coluna ts já está normalizada (UTC) pela ingestão/migração
+        conn = sqlite3.connect(db_path)
+        try:
+            df = pd.read_sql("SELECT ts, status, count FROM transactions WHERE ts IS NOT NULL ORDER BY id", conn)
+        finally:
+            conn.close()
+        epoch = df['ts'].to_numpy(dtype=np.int64)
+    else:
+        df = pd.read_csv(csv_path or CSV_PATH)
+        # Mesmo tratamento de parse_timestamp: offsets convertidos para UTC e
+        # horários sem fuso tomados como UTC (aceita offsets misturados)
+        ts = pd.to_datetime(df['timestamp'], format='ISO8601', utc=True).dt.tz_localize(None)
+        epoch = ts.to_numpy().astype('datetime64[s]').astype(np.int64)
+    order = np.argsort(epoch, kind='stable') # Empates mantêm a ordem de chegada
+    return {
+        'status': df['status'].to_numpy(dtype=object)[order],
+        'ts': epoch[order],
+        'count': df['count'].to_numpy(dtype=np.int64)[order],
+    }
+
+
+def run_backtest(history: dict, std_multiplier: float, history_limit: int, min_history_points: int) -> dict:
+    """Score every point with the endpoint's rules and count what would alert.
+
+    An alert "fires" when the point is anomalous, its severity is high and
+    its status is in ALERT_STATUSES, the same condition the endpoint uses
+    before handing the point to the alert manager.
+    """
+    started = time.perf_counter()
+    scores = score_batch(
+        history['status'], history['ts'], history['count'],
+        lambda key, min_ts, max_ts: ([], []),
+        history_limit, min_history_points, std_multiplier,
+    )
+    alert = scores['alert']
+    severity = scores['severity']
+    fired = alert & (severity == 'high') & np.isin(history['status'], list(ALERT_STATUSES))
+    statuses, fired_by_status = np.unique(history['status'][fired], return_counts=True)
+    levels, by_severity = np.unique(severity[alert], return_counts=True)
+    return {
+        'std_multiplier': std_multiplier,
+        'history_limit': history_limit,
+        'min_history_points': min_history_points,
+        'points': len(alert),
+        'scored': int(scores['known'].sum()),
+        'anomalies': int(alert.sum()),
+        'anomalies_by_severity': {str(k): int(v) for k, v in zip(levels, by_severity)},
+        'alerts_fired': int(fired.sum()),
+        'alerts_by_status': {str(k): int(v) for k, v in zip(statuses, fired_by_status)},
+        'elapsed_s': round(time.perf_counter() - started, 3),
+    }
+
+
+def load_worker(csv_path: str, db_path: str):
+    global _history
+    _history = load_history(csv_path, db_path)
+
+
+def run_config(config: tuple) -> dict:
+    return run_backtest(_history, *config)
+
+
+def sweep(configs: list[tuple], csv_path: str = None, db_path: str = None, workers: int = None) -> list[dict]:
+    """Run every (std_multiplier, history_limit, min_history_points) in parallel."""
+    if workers == 1 or len(configs) == 1:
+        history = load_history(csv_path, db_path)
+        return [run_backtest(history, *config) for config in configs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_worker, initargs=(csv_path, db_path)) as pool:
+        return list(pool.map(run_config, configs))
+
+
+def export_verdicts(path: str, history: dict, std_multiplier: float, history_limit: int, min_history_points: int):
+    # Veredicto ponto a ponto de uma configuração, para inspecionar os alertas
+    scores = score_batch(
+        history['status'], history['ts'], history['count'],
+        lambda key, min_ts, max_ts: ([], []),
+        history_limit, min_history_points, std_multiplier,
+    )
+    pd.DataFrame({
+        'timestamp': pd.to_datetime(history['ts'], unit='s').strftime('%Y-%m-%dT%H:%M:%S'),
+        'status': history['status'],
+        'count': history['count'],
+        'alert': scores['alert'],
+        'severity': scores['severity'],
+        'mean': scores['mean'],
+        'std': scores['std'],
+        'threshold': scores['threshold'],
+    }).to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+    # python backtest.py --std-multiplier 2 2.5 3 3.5 --history-limit 5 7 10
+    parser = argparse.ArgumentParser(description="Replay historical transactions through the anomaly detector")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--csv', default=None, help=f"history CSV (default: {CSV_PATH})")
+    source.add_argument('--db', nargs='?', const=DB_PATH, default=None, help="read a transactions DB instead")
+    parser.add_argument('--std-multiplier', type=float, nargs='+', default=[DEFAULT_SCORING['std_multiplier']])
+    parser.add_argument('--history-limit', type=int, nargs='+', default=[DEFAULT_SCORING['history_limit']])
+    parser.add_argument('--min-history-points', type=int, nargs='+', default=[DEFAULT_SCORING['min_history_points']])
+    parser.add_argument('--workers', type=int, default=None, help="processes for the sweep (default: all cores)")
+    parser.add_argument('--out', help="write the results as JSON")
+    parser.add_argument('--verdicts', help="write per-point verdicts as CSV (single configuration only)")
+    args = parser.parse_args()
+
+    configs = list(itertools.product(args.std_multiplier, args.history_limit, args.min_history_points))
+    if args.verdicts and len(configs) > 1:
+        parser.error("--verdicts needs exactly one configuration")
+
+    started = time.perf_counter()
+    results = sweep(configs, args.csv, args.db, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print(f"{'std_mult':>8} {'limit':>5} {'min_pts':>7} {'anomalies':>9} {'high':>6} {'fired':>6}  fired by status")
+    for r in results:
+        by_status = ', '.join(f"{k}={v}" for k, v in r['alerts_by_status'].items()) or '-'
+        print(f"{r['std_multiplier']:>8} {r['history_limit']:>5} {r['min_history_points']:>7} "
+              f"{r['anomalies']:>9} {r['anomalies_by_severity'].get('high', 0):>6} {r['alerts_fired']:>6}  {by_status}")
+    print(f"{len(results)} configurations over {results[0]['points']} points in {elapsed:.1f}s")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.verdicts:
+        export_verdicts(args.verdicts, load_history(args.csv, args.db), *configs[0])
@@ -0,0 +1,201 @@
+import math
+import sqlite3
+import threading
+from bisect import insort
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from schema import from_epoch, to_epoch
+
+
+def summarize(values) -> tuple[int, float, float]:
+    """Return (n, mean, sample std) for a list of counts."""
+    n = len(values)
+    if n == 0:
+        return 0, None, None
+    total = sum(values)
+    total_sq = sum(v * v for v in values)
+    return n, *moments(n, total, total_sq)
+
+
+def moments(n: int, total, total_sq) -> tuple[float, float]:
+    mean = total / n
+    if n < 2:
+        return mean, 0.0
+    var = (n * total_sq - total * total) / (n * (n - 1))
+    return mean, math.sqrt(max(var, 0.0))
+
+
+class RollingWindow:
+    """Latest `size` points of one key, with running sum and sum of squares."""
+
+    __slots__ = ('points', 'total', 'total_sq', 'evicted')
+
+    def __init__(self, size: int):
+        self.points = deque(maxlen=size)  # (timestamp, count), ordenado por timestamp
+        self.total = 0
+        self.total_sq = 0
+        self.evicted = False
+
+    def add(self, ts: datetime, count: int):
+        points = self.points
+        if not points or ts >= points[-1][0]:
+            if len(points) == points.maxlen:
+                _, old = points[0]
+                self.total -= old
+                self.total_sq -= old * old
+                self.evicted = True
+            points.append((ts, count))
+            self.total += count
+            self.total_sq += count * count
+            return
+
+        # Ponto fora de ordem: reinsere ordenado e descarta o mais antigo
+        ordered = list(points)
+        insort(ordered, (ts, count), key=lambda p: p[0])
+        if len(ordered) > points.maxlen:
+            ordered.pop(0)
+            self.evicted = True
+        points.clear()
+        points.extend(ordered)
+        self.total = sum(c for _, c in ordered)
+        self.total_sq = sum(c * c for _, c in ordered)
+
+    def stats_before(self, ts: datetime):
+        """(n, mean, std) of the points strictly before `ts`, or None if the
+        window no longer holds enough of them to answer exactly."""
+        points = self.points
+        if not points:
+            return 0, None, None
+        if points[-1][0] < ts:
+            return len(points), *moments(len(points), self.total, self.total_sq)
+        older = [c for t, c in points if t < ts]
+        if self.evicted:
+            # Pontos antigos já saíram do buffer; o SQL precisa responder.
+            return None
+        return summarize(older)
+
+
+class BaselineEngine:
+    """Resident baselines keyed by (status, day, hour) and (status, hour-of-day).
+
+    Mirrors `fetch_history` / `fetch_history_across_days` without touching the
+    database: each key keeps a bounded window of the latest HISTORY_LIMIT counts.
+    Lookups return None when the answer is not resident, so the caller can fall
+    back to SQL.
+    """
+
+    def __init__(self, history_limit: int, max_hour_buckets: int = 4096):
+        self.history_limit = history_limit
+        self.max_hour_buckets = max_hour_buckets
+        self._hour_buckets = OrderedDict()  # (status, hour_start) -> RollingWindow
+        self._hours_of_day = {}             # (status, hour) -> RollingWindow
+        self._evicted_until = None          # hour_start mais recente já descartado
+        self._lock = threading.Lock()
+
+    def warm(self, conn: sqlite3.Connection, table: str = 'transactions', key: str = 'status'):
+        # Na inicialização, só o que cabe nas janelas (auth_codes/auth_code para
+        # o engine dos códigos de autorização), por range scans nos índices:
+        # as horas mais recentes que cabem em max_hour_buckets janelas e, para
+        # cada (key, hora do dia), as history_limit linhas mais recentes
+        try:
+            last = conn.execute(f"SELECT MAX(hour_bucket) FROM {table}").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+        if last is None:
+            return 0
+        # DISTINCT por saltos no índice (key, ...): um MIN por valor, sem varrer a tabela
+        values = [row[0] for row in conn.execute(
+            f"WITH RECURSIVE k(v) AS (SELECT MIN({key}) FROM {table} "
+            f"UNION ALL SELECT (SELECT MIN({key}) FROM {table} WHERE {key} > v) FROM k WHERE v IS NOT NULL) "
+            "SELECT v FROM k WHERE v IS NOT NULL"
+        )]
+        # Cada hora abre até uma janela por valor: mais horas que isso seriam expulsas
+        first = last - max(self.max_hour_buckets // max(len(values), 1), 1) + 1
+        older = conn.execute(f"SELECT 1 FROM {table} WHERE hour_bucket < ? LIMIT 1", (first,)).fetchone()
+        loaded = 0
+        with self._lock:
+            if older:
+                # Horas antes do limite não são carregadas: quem pedir vai ao SQL
+                self._evicted_until = from_epoch((first - 1) * 3600)
+            for value in values:
+                for hour in range(24):
+                    # Uma linha a mais que a janela: se existir, marca a janela como incompleta
+                    rows = conn.execute(
+                        f"SELECT ts, count FROM {table} WHERE {key} = ? AND hour_of_day = ? AND ts IS NOT NULL "
+                        "ORDER BY ts DESC, id DESC LIMIT ?",
+                        (value, hour, self.history_limit + 1)
+                    ).fetchall()
+                    for epoch, count in reversed(rows):
+                        self._add_hour_of_day(value, from_epoch(epoch), count)
+                    loaded += len(rows)
+            # Em ordem de tempo, como na ingestão: a expulsão descarta as horas mais antigas
+            cur = conn.execute(
+                f"SELECT ts, {key}, count FROM {table} WHERE ts >= ? ORDER BY ts, id", (first * 3600,)
+            )
+            for epoch, value, count in cur:
+                self._add_hour_bucket(value, from_epoch(epoch), count)
+                loaded += 1
+        return loaded
+
+    def add(self, status: str, ts: datetime, count: int):
+        with self._lock:
+            self._add_hour_bucket(status, ts, count)
+            self._add_hour_of_day(status, ts, count)
+
+    def _add_hour_bucket(self, status: str, ts: datetime, count: int):
+        hour_start = ts.replace(minute=0, second=0, microsecond=0)
+        key = (status, hour_start)
+        window = self._hour_buckets.get(key)
+        if window is None and (self._evicted_until is None or hour_start > self._evicted_until):
+            window = self._hour_buckets[key] = RollingWindow(self.history_limit)
+            self._evict()
+        if window is not None:
+            window.add(ts, count)
+
+    def _add_hour_of_day(self, status: str, ts: datetime, count: int):
+        key = (status, ts.hour)
+        window = self._hours_of_day.get(key)
+        if window is None:
+            window = self._hours_of_day[key] = RollingWindow(self.history_limit)
+        window.add(ts, count)
+
+    def _evict(self):
+        while len(self._hour_buckets) > self.max_hour_buckets:
+            (_, hour_start), _ = self._hour_buckets.popitem(last=False)
+            if self._evicted_until is None or hour_start > self._evicted_until:
+                self._evicted_until = hour_start
+
+    def same_hour_stats(self, status: str, ts: datetime):
+        hour_start = ts.replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            window = self._hour_buckets.get((status, hour_start))
+            if window is not None:
+                return window.stats_before(ts)
+            if self._evicted_until is not None and hour_start <= self._evicted_until:
+                return None
+            return 0, None, None
+
+    def hour_of_day_stats(self, status: str, ts: datetime):
+        with self._lock:
+            window = self._hours_of_day.get((status, ts.hour))
+            if window is None:
+                return 0, None, None
+            return window.stats_before(ts)
+
+    def window_points(self, level: str, status: str, bucket: int):
+        """Resident ([(epoch, count)], evicted) for ('hour', status, hour_bucket)
+        or ('hour_of_day', status, hour); None when the bucket is not resident."""
+        with self._lock:
+            if level == 'hour':
+                hour_start = from_epoch(bucket * 3600)
+                window = self._hour_buckets.get((status, hour_start))
+                if window is None:
+                    if self._evicted_until is not None and hour_start <= self._evicted_until:
+                        return None
+                    return [], False
+            else:
+                window = self._hours_of_day.get((status, bucket))
+                if window is None:
+                    return [], False
+            return [(to_epoch(t), c) for t, c in window.points], window.evicted
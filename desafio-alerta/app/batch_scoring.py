@@ -0,0 +1,107 @@
+import numpy as np
+
+SEVERITIES = np.array(['unknown', 'low', 'medium', 'high'])
+
+
+def rolling_stats(hist_ts, hist_counts, ts, counts, limit: int):
+    """Baseline of each point over the `limit` latest counts strictly before it.
+
+    The candidate history is the union of `hist_*` (already stored points) and
+    the points being scored, so earlier points of the same batch count as
+    history for later ones. Returns (n, mean, std) arrays aligned with `ts`.
+    """
+    all_ts = np.concatenate([np.asarray(hist_ts, dtype=np.int64), ts])
+    all_counts = np.concatenate([np.asarray(hist_counts, dtype=np.int64), counts])
+    order = np.argsort(all_ts, kind='stable')
+    sorted_ts = all_ts[order]
+    sorted_counts = all_counts[order]
+
+    # Somas acumuladas em inteiros: qualquer janela sai por diferença, sem perda
+    c1 = np.concatenate([[0], np.cumsum(sorted_counts)])
+    c2 = np.concatenate([[0], np.cumsum(sorted_counts * sorted_counts)])
+    end = np.searchsorted(sorted_ts, ts, side='left')
+    n = np.minimum(end, limit)
+    start = end - n
+    total = (c1[end] - c1[start]).astype(float)
+    total_sq = (c2[end] - c2[start]).astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(n > 0, total / n, np.nan)
+        var = np.where(n > 1, (n * total_sq - total * total) / (n * (n - 1.0)), 0.0)
+    std = np.sqrt(np.maximum(var, 0.0))
+    return n, mean, std
+
+
+def _grouped_stats(keys, ts, counts, limit, history_fn, needed=None):
+    n = np.zeros(len(ts), dtype=np.int64)
+    mean = np.full(len(ts), np.nan)
+    std = np.zeros(len(ts))
+    unique, inverse = np.unique(keys, return_inverse=True)
+    members = np.argsort(inverse, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(unique)))])
+    for group, key in enumerate(unique):
+        idx = members[bounds[group]:bounds[group + 1]]
+        if needed is not None and not needed[idx].any():
+            continue
+        hist_ts, hist_counts = history_fn(key, int(ts[idx].min()), int(ts[idx].max()))
+        n[idx], mean[idx], std[idx] = rolling_stats(hist_ts, hist_counts, ts[idx], counts[idx], limit)
+    return n, mean, std
+
+
+def severity(counts, mean, std, known):
+    """Vectorized calculate_severity: z >= 3 high, z >= 2 medium, else low."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (counts - mean) / std
+    level = np.where(z >= 3, 3, np.where(z >= 2, 2, 1))
+    level = np.where(known & (std != 0), level, 0)
+    return SEVERITIES[level]
+
+
+def score_batch(statuses, ts, counts, history_fn, history_limit: int,
+                min_history_points: int, std_multiplier: float):
+    """Score a batch of points with the same rules as check_anomaly.
+
+    `ts` are epoch seconds. `history_fn(key, min_ts, max_ts)` returns the stored
+    (ts, counts) for a key: ('hour', status, hour_bucket) for the same-day/hour
+    baseline or ('hour_of_day', status, hour) for the fallback across days. It
+    must cover the `history_limit` points before `min_ts` and every point in
+    [min_ts, max_ts).
+
+    Returns a dict of arrays: alert, severity, mean, std, threshold, known.
+    """
+    statuses = np.asarray(statuses, dtype=object)
+    ts = np.asarray(ts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    hour_bucket = ts // 3600
+    hour_of_day = hour_bucket % 24
+
+    status_names, status_codes = np.unique(statuses.astype(str), return_inverse=True)
+
+    def grouped(level, buckets, needed=None):
+        keys = status_codes.astype(np.int64) * (1 << 32) + buckets
+
+        def fetch(key, min_ts, max_ts):
+            status = str(status_names[key >> 32])
+            return history_fn((level, status, int(key & 0xFFFFFFFF)), min_ts, max_ts)
+
+        return _grouped_stats(keys, ts, counts, history_limit, fetch, needed)
+
+    n, mean, std = grouped('hour', hour_bucket)
+    fallback = n < min_history_points
+    if fallback.any():
+        n2, mean2, std2 = grouped('hour_of_day', hour_of_day, fallback)
+        n = np.where(fallback, n2, n)
+        mean = np.where(fallback, mean2, mean)
+        std = np.where(fallback, std2, std)
+
+    known = n >= min_history_points
+    threshold = mean + std_multiplier * std
+    alert = known & (counts > threshold)
+    return {
+        'alert': alert,
+        'severity': severity(counts, mean, std, known),
+        'mean': np.where(known, mean, np.nan),
+        'std': np.where(known, std, np.nan),
+        'threshold': np.where(known, threshold, np.nan),
+        'known': known,
+    }
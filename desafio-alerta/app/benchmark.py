@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from synthetic_data import DEFAULT_END, build_database, load_profile, sample_counts
+from transactions_endpoint import ALERT_STATUSES, create_app
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Alertas desligados (bucket sem fichas): o benchmark não deve chamar Telegram/SMTP.
+# Sem o job de compactação, que apagaria linhas no meio da medição
+APP_CONFIG = {'ALERT_RATE_PER_MINUTE': 0, 'ALERT_BURST': 0, 'COMPACTION_INTERVAL': 0}
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None, 'max_ms': None}
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def result_row(rows: int, mode: str, scenario: str, latencies: list[float], elapsed: float,
+               errors: int, points: int) -> dict:
+    return {
+        'rows': rows,
+        'mode': mode,
+        'scenario': scenario,
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'points_per_s': round(points / elapsed, 1) if elapsed and points else None,
+        **latency_summary(latencies),
+    }
+
+
+def database_end(path: str) -> datetime:
+    conn = sqlite3.connect(path)
+    try:
+        last = conn.execute("SELECT MAX(ts) FROM transactions").fetchone()[0]
+    finally:
+        conn.close()
+    return datetime(1970, 1, 1) + timedelta(seconds=last)
+
+
+def new_points(n: int, after: datetime, seed: int) -> list[dict]:
+    # Pontos novos, em ordem, nos minutos seguintes ao fim do banco
+    statuses = np.array(sorted(ALERT_STATUSES))
+    rng = np.random.default_rng(seed)
+    stamps = [after + timedelta(minutes=1 + i // len(statuses)) for i in range(n)]
+    chosen = np.resize(statuses, n)
+    counts = sample_counts(load_profile(), chosen, np.array([t.hour for t in stamps]), rng)
+    return [
+        {'timestamp': t.isoformat(), 'status': str(s), 'count': int(c)}
+        for t, s, c in zip(stamps, chosen, counts)
+    ]
+
+
+def old_points(n: int, end: datetime, rows: int, seed: int) -> list[dict]:
+    # Pontos fora de ordem espalhados pelo histórico: cada um consulta o
+    # baseline de uma hora antiga (memória ou, se já saiu dela, o SQL)
+    statuses = sorted(ALERT_STATUSES)
+    span = max(1, rows // len(load_profile()['status'].unique()))
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, span, n)
+    return [
+        {
+            'timestamp': (end - timedelta(minutes=int(m), seconds=30)).isoformat(),
+            'status': statuses[i % len(statuses)],
+            'count': int(rng.integers(0, 20)),
+        }
+        for i, m in enumerate(minutes)
+    ]
+
+
+def build_requests(rows: int, end: datetime, args) -> dict:
+    """Scenario name -> list of (method, path, json body) to send."""
+    wait = '?wait=1' if args.wait else ''
+    ingest = new_points(args.requests, end, args.seed)
+    batches = new_points(args.requests * args.batch_size, end + timedelta(days=1), args.seed + 1)
+    return {
+        'ingest': [('POST', f'/receive_transaction{wait}', p) for p in ingest],
+        'ingest_batch': [
+            ('POST', f'/receive_transactions{wait}', batches[i:i + args.batch_size])
+            for i in range(0, len(batches), args.batch_size)
+        ],
+        'history': [('POST', f'/receive_transaction{wait}', p) for p in old_points(args.requests, end, rows, args.seed)],
+        'dashboard': [('GET', '/dashboard_data', None)] * args.requests,
+    }
+
+
+def points_in(spec: list) -> int:
+    return sum(len(body) if isinstance(body, list) else 1 for method, _, body in spec if method == 'POST')
+
+
+def run_client(db_path: str, rows: int, scenarios: dict) -> list[dict]:
+    # Test client do Flask, uma requisição por vez: custo do servidor sem rede
+    app = create_app({**APP_CONFIG, 'DB_PATH': db_path})
+    client = app.test_client()
+    results = []
+    try:
+        for scenario, spec in scenarios.items():
+            latencies, errors = [], 0
+            app.extensions['writer'].wait_written()
+            started = time.perf_counter()
+            for method, path, body in spec:
+                t0 = time.perf_counter()
+                response = client.open(path, method=method, json=body)
+                latencies.append(time.perf_counter() - t0)
+                errors += response.status_code >= 400
+            app.extensions['writer'].wait_written() # Inclui o tempo de gravação pendente
+            elapsed = time.perf_counter() - started
+            results.append(result_row(rows, 'client', scenario, latencies, elapsed, errors, points_in(spec)))
+    finally:
+        app.extensions['close']()
+    return results
+
+
+def serve(db_path: str, port: int):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING) # Sem uma linha de log por requisição
+    app = create_app({**APP_CONFIG, 'DB_PATH': db_path})
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start in {timeout}s")
+
+
+async def drive(base_url: str, spec: list, concurrency: int):
+    # `concurrency` clientes keep-alive consumindo a mesma fila de requisições
+    import aiohttp
+
+    pending = asyncio.Queue()
+    for item in spec:
+        pending.put_nowait(item)
+    latencies, errors = [], 0
+
+    async def client(session):
+        nonlocal errors
+        while not pending.empty():
+            method, path, body = pending.get_nowait()
+            t0 = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, json=body) as response:
+                    await response.read()
+                    errors += response.status >= 400
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def run_http(db_path: str, rows: int, scenarios: dict, concurrency: int) -> list[dict]:
+    # Servidor em outro processo, para o cliente não disputar o GIL com ele
+    if importlib.util.find_spec('aiohttp') is None:
+        raise SystemExit("The http mode needs aiohttp: pip install aiohttp")
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(db_path, port), daemon=True)
+    server.start()
+    results = []
+    try:
+        wait_for_port(port)
+        for scenario, spec in scenarios.items():
+            latencies, errors, elapsed = asyncio.run(drive(f"http://127.0.0.1:{port}", spec, concurrency))
+            results.append(result_row(rows, 'http', scenario, latencies, elapsed, errors, points_in(spec)))
+    finally:
+        server.terminate()
+        server.join()
+    return results
+
+
+def template_database(rows: int, args) -> tuple[str, float]:
+    # Bancos sintéticos ficam em --db-dir e são reaproveitados entre execuções
+    path = os.path.join(args.db_dir, f"bench_{rows}_{args.seed}_{args.end:%Y%m%d%H%M}.db")
+    if os.path.exists(path) and not args.rebuild:
+        return path, None
+    print(f"Building {rows:,} row database at {path}...", file=sys.stderr)
+    return path, round(build_database(path, rows, seed=args.seed, end=args.end), 2)
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], cwd=APP_DIR, capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit or None, 'dirty': dirty}
+
+
+def compare(previous: dict, current: dict):
+    # p95 atual vs. resultado anterior, por (rows, mode, scenario)
+    old = {(r['rows'], r['mode'], r['scenario']): r for r in previous['results']}
+    print(f"{'rows':>10} {'mode':<7} {'scenario':<13} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    for row in current['results']:
+        before = old.get((row['rows'], row['mode'], row['scenario']))
+        if not before or not before['p95_ms'] or row['p95_ms'] is None:
+            continue
+        change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        print(f"{row['rows']:>10,} {row['mode']:<7} {row['scenario']:<13} "
+              f"{before['p95_ms']:>11.2f} {row['p95_ms']:>9.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test and latency benchmark for transactions_endpoint")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="database sizes to test (e.g. 10000 1000000 10000000)")
+    parser.add_argument('--requests', type=int, default=500, help="requests per scenario")
+    parser.add_argument('--batch-size', type=int, default=500, help="points per /receive_transactions request")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument('--modes', nargs='+', choices=('client', 'http'), default=['client', 'http'])
+    parser.add_argument('--scenarios', nargs='+', choices=('ingest', 'ingest_batch', 'history', 'dashboard'),
+                        default=['ingest', 'ingest_batch', 'history', 'dashboard'])
+    parser.add_argument('--wait', action='store_true', help="ingest with ?wait=1 (respond after commit)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', type=datetime.fromisoformat, default=DEFAULT_END,
+                        help="last minute of the synthetic data (default: where data/transactions.csv ends)")
+    parser.add_argument('--db-dir', default=os.path.join(tempfile.gettempdir(), 'monitoring-bench'))
+    parser.add_argument('--rebuild', action='store_true', help="regenerate cached databases")
+    parser.add_argument('--out', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="previous results file to compare p95 against")
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    report = {
+        'meta': {
+            **git_revision(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('out', 'compare')},
+        },
+        'databases': [],
+        'results': [],
+    }
+    for rows in args.rows:
+        template, build_s = template_database(rows, args)
+        end = database_end(template)
+        report['databases'].append({
+            'rows': rows, 'path': template, 'build_s': build_s,
+            'size_bytes': os.path.getsize(template), 'last_timestamp': end.isoformat(),
+        })
+        for mode in args.modes:
+            # Cada modo começa de uma cópia limpa do banco
+            work = os.path.join(args.db_dir, f"work_{rows}.db")
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(work + suffix):
+                    os.remove(work + suffix)
+            shutil.copyfile(template, work)
+            requests = build_requests(rows, end, args)
+            scenarios = {name: requests[name] for name in args.scenarios}
+            print(f"{rows:,} rows, {mode}...", file=sys.stderr)
+            if mode == 'client':
+                results = run_client(work, rows, scenarios)
+            else:
+                results = run_http(work, rows, scenarios, args.concurrency)
+            report['results'].extend(results)
+            for row in results:
+                print(f"  {row['scenario']:<13} {row['throughput_rps']:>9} req/s  p50 {row['p50_ms']:.2f}ms  "
+                      f"p95 {row['p95_ms']:.2f}ms  p99 {row['p99_ms']:.2f}ms  errors {row['errors']}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import uuid
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import Response, jsonify, request
+
+from schema import DB_PATH, ensure_schema
+
+logger = logging.getLogger(__name__)
+
+AUTH_CODE_PARTITION = 'auth_codes' # O fluxo de códigos tem um único dono
+FORWARDED_HEADER = 'X-Partition-Forwarded'
+FORWARD_THREADS = 8
+FORWARD_TIMEOUT = 30
+
+
+def partition_of(key: str, count: int, known: tuple = ()) -> int:
+    """Index of the worker that owns `key` among `count` workers.
+
+    Known keys (the alert statuses and the auth_codes stream) are spread
+    round-robin, so 4 statuses + auth_codes use up to 5 workers evenly;
+    any other key goes by CRC32, the same in every process.
+    """
+    if key in known:
+        return known.index(key) % count
+    return zlib.crc32(str(key).encode()) % count
+
+
+def partition_keys() -> list:
+    """The partitioned keys: each alert status and the auth_codes stream.
+
+    Their count is the useful maximum of workers: a sixth worker would
+    own nothing and only forward requests.
+    """
+    from transactions_endpoint import ALERT_STATUSES
+    return sorted(ALERT_STATUSES) + [AUTH_CODE_PARTITION]
+
+
+class Cluster:
+    """One worker's link to the others in a pre-forked deployment.
+
+    Every status (and the auth_codes stream) is owned by exactly one
+    worker: only the owner scores it, holds its baseline and detector,
+    writes it and triggers its alerts, so nothing in memory diverges and
+    each alert goes out once. An ingest request that lands on another
+    worker is forwarded to the owner through its inbox queue (a batch is
+    split by owner and the results merged back in order). Dashboard events
+    are broadcast so every worker's /dashboard_stream sees all of them;
+    the EventHubs share `boot_id` and the `sequence` counter, so a cursor
+    handed out by one worker is valid on all of them.
+    """
+
+    def __init__(self, index: int, count: int, inboxes: list, event_queues: list, known: tuple = (),
+                 boot_id: str = None, sequence=None):
+        self.index = index
+        self.count = count
+        self.inboxes = inboxes            # por worker: requisições encaminhadas e respostas
+        self.event_queues = event_queues  # por worker: eventos publicados pelos donos
+        self.known = tuple(known)
+        self.boot_id = boot_id
+        self.sequence = sequence          # multiprocessing.Value com o último seq numerado
+        self.app = None
+        self._pending = {}                # id da requisição -> Future
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(FORWARD_THREADS, thread_name_prefix="forwarded")
+
+    def owner(self, key) -> int:
+        if not isinstance(key, str) or not key:
+            return self.index # Ponto inválido: a rota local responde com o erro
+        return partition_of(key, self.count, self.known)
+
+    def owns(self, key) -> bool:
+        return self.owner(key) == self.index
+
+    def allocate(self, n: int) -> int:
+        # Numera n eventos no contador compartilhado; devolve o primeiro
+        with self.sequence.get_lock():
+            first = self.sequence.value + 1
+            self.sequence.value += n
+        return first
+
+    def install(self, app):
+        """Start the queue readers and route ingest requests to their owners."""
+        self.app = app
+        threading.Thread(target=self._read_inbox, name="cluster-inbox", daemon=True).start()
+        threading.Thread(target=self._read_events, name="cluster-events", daemon=True).start()
+
+        @app.before_request
+        def route_to_owner():
+            if request.method != 'POST' or request.headers.get(FORWARDED_HEADER):
+                return None
+            if request.path == '/receive_transaction':
+                data = request.get_json(force=True, silent=True)
+                return self._forward_whole(data.get('status') if isinstance(data, dict) else None)
+            if request.path == '/receive_auth_code':
+                return self._forward_whole(AUTH_CODE_PARTITION)
+            if request.path == '/receive_transactions':
+                return self._forward_batch()
+            return None
+
+    def broadcast(self, first: int, events: list):
+        # Chamado pelo writer do dono após o commit, com o seq do primeiro evento
+        if events:
+            for index, events_queue in enumerate(self.event_queues):
+                if index != self.index:
+                    events_queue.put((first, events))
+
+    def forward(self, owner: int, path: str, query: str, body: bytes,
+                content_type: str = 'application/json') -> Future:
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        self.inboxes[owner].put(('request', self.index, request_id, path, query, body, content_type))
+        return future
+
+    def _result(self, future: Future):
+        try:
+            return future.result(timeout=FORWARD_TIMEOUT)
+        except FutureTimeout:
+            return None
+
+    def _forward_whole(self, key):
+        owner = self.owner(key)
+        if owner == self.index:
+            return None # Segue para a rota local
+        reply = self._result(self.forward(
+            owner, request.path, request.query_string.decode(), request.get_data(), request.content_type
+        ))
+        if reply is None:
+            return jsonify(error=f"Worker {owner} did not answer in {FORWARD_TIMEOUT}s"), 504
+        status, content_type, body = reply
+        return Response(body, status=status, content_type=content_type)
+
+    def _forward_batch(self):
+        body = request.get_data(as_text=True)
+        try:
+            if 'ndjson' in (request.mimetype or '') or not body.lstrip().startswith('['):
+                items = [json.loads(line) for line in body.splitlines() if line.strip()]
+            else:
+                items = json.loads(body)
+        except ValueError:
+            return None # A rota local devolve o 400
+        if not isinstance(items, list):
+            return None
+
+        groups = {}
+        for idx, item in enumerate(items):
+            owner = self.owner(item.get('status') if isinstance(item, dict) else None)
+            groups.setdefault(owner, []).append(idx)
+        if list(groups) in ([], [self.index]):
+            return None
+
+        # Um sublote por dono, em paralelo; a parte local passa pela própria fila
+        query = request.query_string.decode()
+        pending = {
+            owner: self.forward(owner, request.path, query, json.dumps([items[i] for i in idxs]).encode())
+            for owner, idxs in groups.items()
+        }
+        results = [None] * len(items)
+        accepted = rejected = 0
+        for owner, future in pending.items():
+            reply = self._result(future)
+            if reply is None:
+                return jsonify(error=f"Worker {owner} did not answer in {FORWARD_TIMEOUT}s"), 504
+            status, content_type, payload = reply
+            if status != 200:
+                return Response(payload, status=status, content_type=content_type)
+            part = json.loads(payload)
+            accepted += part['accepted']
+            rejected += part['rejected']
+            for idx, result in zip(groups[owner], part['results']):
+                results[idx] = result
+        return jsonify(accepted=accepted, rejected=rejected, results=results)
+
+    def _serve(self, origin: int, request_id: int, path: str, query: str, body: bytes, content_type: str):
+        try:
+            response = self.app.test_client().post(
+                path, query_string=query, data=body, content_type=content_type,
+                headers={FORWARDED_HEADER: '1'},
+            )
+            reply = (response.status_code, response.content_type, response.get_data())
+        except Exception as err:
+            logger.exception(f"Forwarded {path} failed")
+            reply = (500, 'application/json', json.dumps({'error': str(err)}).encode())
+        self.inboxes[origin].put(('reply', request_id, *reply))
+
+    def _read_inbox(self):
+        inbox = self.inboxes[self.index]
+        while True:
+            message = inbox.get()
+            if message[0] == 'reply':
+                _, request_id, *reply = message
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None:
+                    future.set_result(tuple(reply))
+            else:
+                self._executor.submit(self._serve, *message[1:])
+
+    def _read_events(self):
+        events = self.app.extensions['events']
+        events_queue = self.event_queues[self.index]
+        while True:
+            events.insert(*events_queue.get())
+
+    def close(self):
+        # Não espera as filas serem lidas por workers que já saíram
+        for q in self.inboxes + self.event_queues:
+            q.cancel_join_thread()
+        self._executor.shutdown(wait=False)
+
+
+def run_worker(index: int, count: int, sock: socket.socket, inboxes: list, event_queues: list, boot_id: str,
+               sequence, config: dict):
+    # Dentro do processo filho: o app (threads, conexões) só nasce depois do fork
+    from transactions_endpoint import create_app
+    from werkzeug.serving import make_server
+
+    stopping = threading.Event()
+    server = None
+
+    def request_stop(*_):
+        # SIGTERM/Ctrl+C: só marca e pede o fim do serve_forever (de outra
+        # thread, ele espera o loop); sinais repetidos não fazem nada
+        if stopping.is_set():
+            return
+        stopping.set()
+        if server is not None:
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - worker {index} - %(levelname)s - %(message)s')
+    cluster = Cluster(index, count, inboxes, event_queues, partition_keys(),
+                      boot_id, sequence)
+    app = create_app({
+        **config,
+        'CLUSTER': cluster,
+        # Um job de compactação para o banco inteiro, no worker 0
+        **({} if index == 0 else {'COMPACTION_INTERVAL': 0}),
+    })
+    try:
+        app.logger.setLevel(logging.INFO)
+        host, port = sock.getsockname()[:2]
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        if not stopping.is_set():
+            logger.info(f"Worker {index}/{count} (pid {os.getpid()}) ready")
+            server.serve_forever()
+    finally:
+        cluster.close()
+        # O multiprocessing encerra o filho com os._exit, que pula o atexit:
+        # fecha aqui o writer (flush), os detectores, o dispatcher etc.
+        app.extensions['close']()
+        logger.info(f"Worker {index} stopped")
+
+
+def serve(workers: int, host: str = '127.0.0.1', port: int = 5000, config: dict = None):
+    """Pre-fork `workers` server processes sharing one listening socket.
+
+    `workers` is capped at the number of partitions. Every owner still
+    commits to the same SQLite file, whose single write lock is shared by
+    all of them: the extra processes spread scoring, JSON and HTTP work
+    across cores, but commits stay serialized (WAL group commits keep
+    them short).
+    """
+    config = config or {}
+    partitions = len(partition_keys())
+    if workers > partitions:
+        logger.warning(f"Only {partitions} partitions to own; starting {partitions} workers instead of {workers}")
+        workers = partitions
+    db_path = config.get('DB_PATH', DB_PATH)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        ensure_schema(conn) # Uma vez, antes dos workers, para não migrarem em paralelo
+    finally:
+        conn.close()
+
+    sock = socket.create_server((host, port), backlog=128)
+    # Todos os workers esperam no mesmo accept; quem perde a corrida volta ao select
+    sock.setblocking(False)
+    context = multiprocessing.get_context('fork')
+    inboxes = [context.Queue() for _ in range(workers)]
+    event_queues = [context.Queue() for _ in range(workers)]
+    # Um boot id e uma numeração de eventos para o cluster inteiro
+    boot_id = uuid.uuid4().hex[:8]
+    sequence = context.Value('q', 0)
+    processes = [
+        context.Process(target=run_worker,
+                        args=(index, workers, sock, inboxes, event_queues, boot_id, sequence, config),
+                        name=f"worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop() # Os filhos também recebem o Ctrl+C; garante a saída de todos
+        for process in processes:
+            process.join()
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    # python cluster.py --workers 4 --port 5000
+    parser = argparse.ArgumentParser(description="Run the monitoring API with one process per CPU core")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU cores, capped at the 5 partitions)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    serve(args.workers, args.host, args.port, {'DB_PATH': args.db})
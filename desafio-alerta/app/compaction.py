@@ -0,0 +1,242 @@
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+
+from baseline import moments
+from schema import DB_PATH, bucket_columns, ensure_schema
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+VACUUM_STEP_PAGES = 256 # Páginas devolvidas ao disco por passo do incremental_vacuum
+
+# tabela bruta -> (coluna chave, agregado por hora, agregado por dia)
+TIERS = {
+    'transactions': ('status', 'hourly_stats', 'daily_stats'),
+    'auth_codes': ('auth_code', 'auth_code_hourly_stats', 'auth_code_daily_stats'),
+}
+
+# Conexão própria do job: espera o lock do writer em vez de falhar
+COMPACTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+)
+
+
+def compacted_until(conn: sqlite3.Connection, source: str) -> dict:
+    """{'raw': epoch, 'hourly': epoch} of `source`; 0 when never compacted."""
+    until = {'raw': 0, 'hourly': 0}
+    try:
+        rows = conn.execute("SELECT tier, until FROM compaction_state WHERE source = ?", (source,)).fetchall()
+    except sqlite3.OperationalError:
+        return until # Banco ainda sem a tabela (schema < 6)
+    until.update({tier: value for tier, value in rows})
+    return until
+
+
+def _set_until(conn: sqlite3.Connection, source: str, tier: str, until: int):
+    conn.execute(
+        "INSERT INTO compaction_state(source, tier, until) VALUES (?, ?, ?) "
+        "ON CONFLICT(source, tier) DO UPDATE SET until = MAX(until, excluded.until)",
+        (source, tier, until)
+    )
+
+
+def aggregate_stats(conn: sqlite3.Connection, source: str, value: str, level: str, ts, days: int = 7):
+    """(n, mean, std) for a history lookup older than the raw retention.
+
+    level 'hour' reads the hour of `ts` (or its day, once the hour was
+    rolled into the daily tier); 'hour_of_day' combines the same hour of
+    the previous `days` days (whole days from the daily tier).
+
+    Unlike the raw lookups this looks ahead: an aggregate covers every
+    point of its hour or day, including the ones after `ts`, and once an
+    hour was rolled up the whole day's n/mean/std stand in for the hour
+    baseline. Only late points older than the raw retention are scored
+    this way; their verdicts are approximate, not a replay of ingest.
+    """
+    key, hourly, daily = TIERS[source]
+    _, hour_bucket, hour = bucket_columns(ts)
+    hourly_from = compacted_until(conn, source)['hourly'] // 3600
+    rows = []
+    if level == 'hour':
+        if hour_bucket >= hourly_from:
+            rows = conn.execute(
+                f"SELECT n, total, total_sq FROM {hourly} WHERE hour_bucket = ? AND {key} = ?",
+                (hour_bucket, value)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT n, total, total_sq FROM {daily} WHERE day_bucket = ? AND {key} = ?",
+                (hour_bucket // 24, value)
+            ).fetchall()
+    else:
+        first = hour_bucket - 24 * days
+        rows = conn.execute(
+            f"SELECT n, total, total_sq FROM {hourly} "
+            f"WHERE hour_bucket >= ? AND hour_bucket < ? AND hour_bucket % 24 = ? AND {key} = ?",
+            (max(first, hourly_from), hour_bucket, hour, value)
+        ).fetchall()
+        if first < hourly_from:
+            rows += conn.execute(
+                f"SELECT n, total, total_sq FROM {daily} WHERE day_bucket >= ? AND day_bucket < ? AND {key} = ?",
+                (first // 24, min(hourly_from, hour_bucket) // 24, value)
+            ).fetchall()
+    n = sum(row[0] for row in rows)
+    if n == 0:
+        return 0, None, None
+    return n, *moments(n, sum(row[1] for row in rows), sum(row[2] for row in rows))
+
+
+def compact(conn: sqlite3.Connection, raw_days: float, hourly_days: float, batch_rows: int = 5000,
+            pause: float = 0.01, now: float = None) -> dict:
+    """Apply the retention of every tier, in short transactions.
+
+    Raw rows older than `raw_days` are deleted; their hour is already in
+    the hourly tier (the insert trigger keeps it). Hourly rows older than
+    `hourly_days` are added into the daily tier and deleted. Ages count
+    back from the newest row of each table (capped at `now`), rounded to
+    whole days, so a replayed or demo history is not wiped out. 0 keeps a
+    tier forever. Each batch is its own transaction with `pause` seconds
+    between batches, so the ingest writer never waits long for the lock.
+    """
+    now = time.time() if now is None else now
+    hourly_days = max(hourly_days, raw_days) if hourly_days else 0
+    result = {}
+    for source, (key, hourly, daily) in TIERS.items():
+        latest = conn.execute(f"SELECT MAX(ts) FROM {source}").fetchone()[0]
+        if latest is None:
+            continue
+        reference = min(latest, int(now)) // DAY * DAY
+        deleted = rolled = 0
+
+        if raw_days:
+            cutoff = int(reference - raw_days * DAY) // DAY * DAY
+            # O marcador vem antes: as consultas desse período passam a usar os
+            # agregados, que já estão completos, enquanto as linhas são apagadas
+            with conn:
+                _set_until(conn, source, 'raw', cutoff)
+            while True:
+                with conn:
+                    batch = conn.execute(
+                        f"DELETE FROM {source} WHERE id IN "
+                        f"(SELECT id FROM {source} WHERE ts < ? ORDER BY ts LIMIT ?)",
+                        (cutoff, batch_rows)
+                    ).rowcount
+                deleted += batch
+                if batch < batch_rows:
+                    break
+                time.sleep(pause)
+
+        if hourly_days:
+            cutoff = int(reference - hourly_days * DAY) // DAY * DAY
+            last = cutoff // 3600
+            start = conn.execute(
+                f"SELECT MIN(hour_bucket) FROM {hourly} WHERE hour_bucket < ?", (last,)
+            ).fetchone()[0]
+            # 30 dias de horas por transação: soma no diário e apaga do horário
+            step = 24 * 30
+            while start is not None and start < last:
+                end = min(start - start % 24 + step, last)
+                with conn:
+                    conn.execute(
+                        f"INSERT INTO {daily}(day_bucket, {key}, n, total, total_sq) "
+                        f"SELECT hour_bucket / 24, {key}, SUM(n), SUM(total), SUM(total_sq) FROM {hourly} "
+                        f"WHERE hour_bucket >= ? AND hour_bucket < ? GROUP BY hour_bucket / 24, {key} "
+                        f"ON CONFLICT(day_bucket, {key}) DO UPDATE SET "
+                        "n = n + excluded.n, total = total + excluded.total, total_sq = total_sq + excluded.total_sq",
+                        (start, end)
+                    )
+                    rolled += conn.execute(
+                        f"DELETE FROM {hourly} WHERE hour_bucket >= ? AND hour_bucket < ?", (start, end)
+                    ).rowcount
+                    _set_until(conn, source, 'hourly', end * 3600)
+                start = end
+                time.sleep(pause)
+            with conn:
+                _set_until(conn, source, 'hourly', cutoff)
+
+        result[source] = {'raw_deleted': deleted, 'hourly_rolled_up': rolled}
+
+    # Devolve as páginas livres aos poucos (só com auto_vacuum=INCREMENTAL)
+    # e atualiza as estatísticas do planejador que mudaram
+    freed = 0
+    while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        # executescript roda o pragma até o fim; execute() libera uma página só
+        conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+        released = before - conn.execute("PRAGMA page_count").fetchone()[0]
+        if released <= 0:
+            break # auto_vacuum desligado: as páginas ficam para novas inserções
+        freed += released
+        time.sleep(pause)
+    conn.execute("PRAGMA optimize")
+    result['pages_freed'] = freed
+    return result
+
+
+class CompactionJob:
+    """Background thread that runs `compact` every `interval` seconds."""
+
+    def __init__(self, db_path: str, raw_days: float, hourly_days: float, interval: float = 3600,
+                 batch_rows: int = 5000):
+        self.db_path = db_path
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.batch_rows = batch_rows
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="compaction", daemon=True)
+        self._thread.start()
+
+    def run_once(self) -> dict:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for pragma in COMPACTION_PRAGMAS:
+                conn.execute(pragma)
+            started = time.perf_counter()
+            self.last_result = compact(conn, self.raw_days, self.hourly_days, self.batch_rows)
+            logger.info(f"Compaction finished in {time.perf_counter() - started:.1f}s: {self.last_result}")
+            return self.last_result
+        finally:
+            conn.close()
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except sqlite3.Error as err:
+                logger.error(f"Compaction failed: {err}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+if __name__ == '__main__':
+    # python compaction.py --raw-days 30 --hourly-days 365 [--vacuum]
+    parser = argparse.ArgumentParser(description="Apply the retention tiers of transactions.db")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--raw-days', type=float, default=30, help="days of raw minute rows to keep (0 = all)")
+    parser.add_argument('--hourly-days', type=float, default=365, help="days of hourly aggregates to keep (0 = all)")
+    parser.add_argument('--batch-rows', type=int, default=5000)
+    parser.add_argument('--vacuum', action='store_true',
+                        help="enable auto_vacuum=INCREMENTAL on an older DB (full VACUUM, stop the server first)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        ensure_schema(conn)
+        for pragma in COMPACTION_PRAGMAS:
+            conn.execute(pragma)
+        started = time.perf_counter()
+        print(compact(conn, args.raw_days, args.hourly_days, args.batch_rows))
+        if args.vacuum:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        print(f"Compacted {args.db} in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
@@ -0,0 +1,279 @@
+import copy
+import json
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+
+from schema import from_epoch
+
+# Fator que torna o MAD comparável ao desvio padrão em dados normais
+MAD_SCALE = 1.4826
+
+
+class Detector:
+    """Streaming baseline for the points of one status.
+
+    `update` scores a point against the state built from the points seen
+    before it and then absorbs it. Its cost depends only on the detector's
+    own bounded state, never on how much history is stored. Points are absorbed in arrival order. The
+    state is a small JSON-serializable dict (`state` / `restore`).
+    """
+
+    kind = None
+
+    def __init__(self, std_multiplier: float = 3.0, min_history_points: int = 3):
+        self.std_multiplier = std_multiplier
+        self.min_history_points = min_history_points
+
+    def baseline(self, ts: datetime) -> tuple[int, float, float]:
+        """(n, center, spread) of the state before absorbing the point at `ts`."""
+        raise NotImplementedError
+
+    def absorb(self, ts: datetime, count: int):
+        raise NotImplementedError
+
+    def score(self, ts: datetime, count: int) -> tuple[bool, float, float, float]:
+        """Same contract as check_anomaly: (alert, mean, std, threshold),
+        without absorbing the point."""
+        n, center, spread = self.baseline(ts)
+        if n < self.min_history_points:
+            return False, None, None, None
+        threshold = center + self.std_multiplier * spread
+        return count > threshold, center, spread, threshold
+
+    def update(self, ts: datetime, count: int) -> tuple[bool, float, float, float]:
+        """`score` the point, then absorb it."""
+        verdict = self.score(ts, count)
+        self.absorb(ts, count)
+        return verdict
+
+    def state(self) -> dict:
+        raise NotImplementedError
+
+    def restore(self, state: dict):
+        raise NotImplementedError
+
+
+def _ewma_step(n: int, mean: float, var: float, alpha: float, count: int) -> tuple[int, float, float]:
+    # Média e variância exponenciais (West, 1979): O(1) por ponto
+    if n == 0:
+        return 1, float(count), 0.0
+    diff = count - mean
+    incr = alpha * diff
+    return n + 1, mean + incr, (1 - alpha) * (var + diff * incr)
+
+
+class EwmaDetector(Detector):
+    """Exponentially weighted mean and variance of all points of the status."""
+
+    kind = 'ewma'
+
+    def __init__(self, alpha: float = 0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+        self.n, self.mean, self.var = 0, 0.0, 0.0
+
+    def baseline(self, ts):
+        return self.n, self.mean, math.sqrt(self.var)
+
+    def absorb(self, ts, count):
+        self.n, self.mean, self.var = _ewma_step(self.n, self.mean, self.var, self.alpha, count)
+
+    def state(self):
+        return {'n': self.n, 'mean': self.mean, 'var': self.var}
+
+    def restore(self, state):
+        self.n, self.mean, self.var = state['n'], state['mean'], state['var']
+
+
+class SeasonalDetector(Detector):
+    """One EWMA per hour of the week (168 slots), for weekly traffic cycles."""
+
+    kind = 'seasonal'
+    SLOTS = 7 * 24
+
+    def __init__(self, alpha: float = 0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+        self.slots = [(0, 0.0, 0.0)] * self.SLOTS
+
+    @staticmethod
+    def slot(ts: datetime) -> int:
+        return ts.weekday() * 24 + ts.hour
+
+    def baseline(self, ts):
+        n, mean, var = self.slots[self.slot(ts)]
+        return n, mean, math.sqrt(var)
+
+    def absorb(self, ts, count):
+        slot = self.slot(ts)
+        self.slots[slot] = _ewma_step(*self.slots[slot], self.alpha, count)
+
+    def state(self):
+        return {'slots': [list(slot) for slot in self.slots]}
+
+    def restore(self, state):
+        self.slots = [tuple(slot) for slot in state['slots']]
+
+
+class MadDetector(Detector):
+    """Median and MAD of the last `window` points.
+
+    The window is kept twice: in arrival order (to know what leaves) and
+    sorted (to read the median directly), so one outlier moves the
+    baseline by at most one rank instead of dragging the mean. Unlike the
+    EWMA detectors this is not O(1): each point costs O(window) (the sorted
+    insert/delete and the merge up to the median of the deviations).
+    """
+
+    kind = 'mad'
+
+    def __init__(self, window: int = 60, **kwargs):
+        super().__init__(**kwargs)
+        self.window = window
+        self.values = deque()
+        self.ordered = []
+
+    def baseline(self, ts):
+        n = len(self.ordered)
+        if n == 0:
+            return 0, None, None
+        median = _median(self.ordered)
+        return n, median, MAD_SCALE * _median_abs_deviation(self.ordered, median)
+
+    def absorb(self, ts, count):
+        self.values.append(count)
+        insort(self.ordered, count)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            del self.ordered[bisect_left(self.ordered, old)]
+
+    def state(self):
+        return {'values': list(self.values)}
+
+    def restore(self, state):
+        self.values = deque(state['values'][-self.window:])
+        self.ordered = sorted(self.values)
+
+
+def _median(ordered: list) -> float:
+    mid = len(ordered) // 2
+    if len(ordered) % 2:
+        return float(ordered[mid])
+    return (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _median_abs_deviation(ordered: list, median: float) -> float:
+    # Os desvios abaixo e acima da mediana já saem ordenados da lista
+    # ordenada; basta intercalar as duas sequências até o meio.
+    split = bisect_left(ordered, median)
+    below = [median - v for v in reversed(ordered[:split])]
+    above = [v - median for v in ordered[split:]]
+    merged = []
+    i = j = 0
+    half = len(ordered) // 2
+    while len(merged) <= half:
+        if j >= len(above) or (i < len(below) and below[i] <= above[j]):
+            merged.append(below[i])
+            i += 1
+        else:
+            merged.append(above[j])
+            j += 1
+    return merged[half] if len(ordered) % 2 else (merged[half - 1] + merged[half]) / 2
+
+
+DETECTOR_KINDS = {cls.kind: cls for cls in (EwmaDetector, SeasonalDetector, MadDetector)}
+
+
+def parse_assignments(spec: str) -> dict:
+    """'denied=ewma, reversed=mad' -> {'denied': 'ewma', 'reversed': 'mad'}.
+
+    'baseline' (the default) keeps the status on check_anomaly.
+    """
+    assignments = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        status, _, kind = item.partition('=')
+        status, kind = status.strip(), kind.strip()
+        if kind != 'baseline' and kind not in DETECTOR_KINDS:
+            raise ValueError(f"Unknown detector '{kind}' for status '{status}'")
+        if kind != 'baseline':
+            assignments[status] = kind
+    return assignments
+
+
+class DetectorRegistry:
+    """The configured streaming detector of each status, with persistence.
+
+    Statuses without an assignment use the mean/std baseline of
+    check_anomaly and have no entry here (`get` returns None).
+    """
+
+    def __init__(self, assignments: dict, params: dict = None, std_multiplier: float = 3.0,
+                 min_history_points: int = 3):
+        params = params or {}
+        self.detectors = {
+            status: DETECTOR_KINDS[kind](
+                std_multiplier=std_multiplier, min_history_points=min_history_points, **params.get(kind, {})
+            )
+            for status, kind in assignments.items()
+        }
+        self._lock = threading.Lock()
+
+    def get(self, status: str):
+        return self.detectors.get(status)
+
+    def score(self, status: str, points: list) -> list:
+        """Verdicts of `points` [(ts, count)] of `status`, in order, each scored
+        after the ones before it, without changing the detector: the points
+        are only absorbed (`absorb`) once they have been stored."""
+        with self._lock:
+            detector = self.detectors[status]
+            if len(points) == 1:
+                return [detector.score(*points[0])]
+            scratch = copy.deepcopy(detector) # O lote avança numa cópia
+        return [scratch.update(ts, count) for ts, count in points]
+
+    def absorb(self, status: str, points: list):
+        with self._lock:
+            detector = self.detectors[status]
+            for ts, count in points:
+                detector.absorb(ts, count)
+
+    def load(self, conn) -> set:
+        """Restore saved states; returns the statuses that had one."""
+        restored = set()
+        for status, kind, state in conn.execute("SELECT status, detector, state FROM detector_state"):
+            detector = self.detectors.get(status)
+            if detector is not None and detector.kind == kind:
+                detector.restore(json.loads(state))
+                restored.add(status)
+        return restored
+
+    def warm(self, conn, statuses, limit: int):
+        # Sem estado salvo: reprocessa os `limit` pontos mais recentes do status
+        with self._lock:
+            for status in statuses:
+                rows = conn.execute(
+                    "SELECT ts, count FROM transactions WHERE status = ? AND ts IS NOT NULL "
+                    "ORDER BY id DESC LIMIT ?",
+                    (status, limit)
+                ).fetchall()
+                detector = self.detectors[status]
+                for epoch, count in reversed(rows):
+                    detector.absorb(from_epoch(epoch), count)
+
+    def save(self, conn):
+        with self._lock:
+            rows = [
+                (status, detector.kind, json.dumps(detector.state()), int(time.time()))
+                for status, detector in self.detectors.items()
+            ]
+        if rows:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO detector_state(status, detector, state, updated_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
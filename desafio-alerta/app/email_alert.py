@@ -1,45 +1,79 @@
+import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import sys # Importa o módulo sys para acessar argumentos de linha de comando
 
-def send_email_alert(status, detected_at, current_count):
-    """
-    Envia um e-mail de alerta para uma anomalia detectada.
-    Recebe o status, timestamp da detecção e a contagem atual como argumentos.
-    """
-   
-    smtp_server = 'smtp.example.com' 
-    smtp_port = 587                  
-    sender_email = 'your_email@example.com'
-    receiver_email = 'destinatary_alerta@example.com'
-    
-    password = 'your_password' 
+SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.example.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'your_email@example.com')
+RECEIVER_EMAIL = os.environ.get('RECEIVER_EMAIL', 'destinatary_alerta@example.com')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', 'your_password')
 
 
-    subject = f'ALERTA DE ANOMALIA: Status {status.upper()}'
+SUBJECTS = {
+    'started': ('ALERTA DE ANOMALIA', 'Anomaly detected!'),
+    'ongoing': ('ANOMALIA EM ANDAMENTO', 'Anomaly still ongoing.'),
+    'resolved': ('ANOMALIA RESOLVIDA', 'Anomaly resolved.'),
+}
+
+
+def build_email_message(status, detected_at, current_count, kind='started', details=None):
+    """
+    Monta a mensagem de alerta para uma anomalia detectada.
+    """
+    prefix, headline = SUBJECTS[kind]
+    subject = f'{prefix}: Status {status.upper()}'
     body = (
-        f"Anomaly detected!\n\n"
+        f"{headline}\n\n"
         f"Transaction Status: {status}\n"
         f"Detected at: {detected_at}\n"
-        f"Current count: {current_count}\n\n"
-        f"Verify Monitoring System for more details"
+        f"Current count: {current_count}\n"
     )
+    # Resumo do incidente (alertas agrupados pelo AlertManager)
+    for label, value in (details or {}).items():
+        body += f"{label}: {value}\n"
+    body += "\nVerify Monitoring System for more details"
 
     # Constrói a mensagem de e-mail
     msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = RECEIVER_EMAIL
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+def open_smtp_connection():
+    """
+    Abre uma conexão SMTP autenticada, que pode ser reutilizada entre envios.
+    """
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    try:
+        if SMTP_STARTTLS:
+            server.starttls() # Inicia a segurança TLS
+        if SMTP_PASSWORD:
+            server.login(SENDER_EMAIL, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def send_email_alert(status, detected_at, current_count):
+    """
+    Envia um e-mail de alerta para uma anomalia detectada.
+    Recebe o status, timestamp da detecção e a contagem atual como argumentos.
+    """
+    msg = build_email_message(status, detected_at, current_count)
 
     try:
         # Conecta ao servidor SMTP e envia o e-mail
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls() # Inicia a segurança TLS
-            server.login(sender_email, password)
+        with open_smtp_connection() as server:
             server.send_message(msg)
-        print(f"📧 Email alert send to {receiver_email} por status: {status}")
+        print(f"📧 Email alert send to {RECEIVER_EMAIL} por status: {status}")
     except Exception as e:
         print(f"❌ Fail to send email alert for status {status}: {e}")
 
@@ -55,4 +89,4 @@ if __name__ == '__main__':
     current_count_arg = int(sys.argv[3])
 
     
-    send_email_alert(status_arg, detected_at_arg, current_count_arg)
\ No newline at end of file
+    send_email_alert(status_arg, detected_at_arg, current_count_arg)
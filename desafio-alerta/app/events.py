@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+GAP_TIMEOUT = 2.0 # Segundos esperando um lote fora de ordem de outro worker
+
+
+class EventHub:
+    """In-memory, sequence-numbered log of dashboard events.
+
+    Every ingest publishes its new transactions, alerts and the hourly
+    aggregates it changed. Readers keep a cursor (the last sequence number
+    they saw) and block in `wait` until something newer exists, so idle
+    dashboards cost nothing. `version` doubles as the data version used for
+    ETags on /dashboard_data.
+
+    With several processes (cluster.py) all hubs share `boot_id` and take
+    sequence numbers from the same `allocate(n)` counter; batches published
+    elsewhere arrive through `insert` and are applied in sequence order, so
+    a cursor from any worker is valid on every other one.
+    """
+
+    def __init__(self, capacity: int = 2000, boot_id: str = None, allocate=None):
+        self.boot_id = boot_id or uuid.uuid4().hex[:8] # Cursores de outro boot forçam resync
+        self._events = deque(maxlen=capacity)  # (seq, kind, payload)
+        self._seq = 0                          # último número aplicado, sem buracos
+        self._allocated = 0
+        self._allocate = allocate or self._allocate_local
+        self._pending = {}                     # primeiro seq -> lote que chegou fora de ordem
+        self._gap_since = None
+        self._cond = threading.Condition()
+
+    @property
+    def version(self) -> int:
+        return self._seq
+
+    def token(self, seq: int = None) -> str:
+        return f"{self.boot_id}-{self._seq if seq is None else seq}"
+
+    def parse_token(self, token: str):
+        # Retorna o número de sequência, ou None se o cursor é de outro boot
+        boot_id, _, seq = (token or '').partition('-')
+        if boot_id != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _allocate_local(self, n: int) -> int:
+        self._allocated += n
+        return self._allocated - n + 1
+
+    def publish_many(self, events) -> int:
+        """Publish a batch; returns the sequence number of its first event
+        (None for an empty batch). One notify per ingest, even for a batch."""
+        events = list(events)
+        if not events:
+            return None
+        with self._cond:
+            first = self._allocate(len(events))
+            self._insert(first, events)
+            return first
+
+    def insert(self, first: int, events: list):
+        # Lote numerado por outro processo (broadcast do cluster)
+        with self._cond:
+            self._insert(first, events)
+
+    def _insert(self, first: int, events: list):
+        if first <= self._seq:
+            return # Chegou depois de o buraco ser pulado
+        self._pending[first] = events
+        while self._seq + 1 in self._pending:
+            for kind, payload in self._pending.pop(self._seq + 1):
+                self._seq += 1
+                self._events.append((self._seq, kind, payload))
+        if self._pending and self._gap_since is None:
+            # Um lote anterior ainda não chegou; se nunca chegar (worker caiu
+            # entre numerar e publicar), o buraco é pulado depois de GAP_TIMEOUT
+            self._gap_since = time.monotonic()
+            timer = threading.Timer(GAP_TIMEOUT, self._skip_gap)
+            timer.daemon = True
+            timer.start()
+        elif not self._pending:
+            self._gap_since = None
+        self._cond.notify_all()
+
+    def _skip_gap(self):
+        with self._cond:
+            if self._gap_since is None:
+                return
+            if time.monotonic() - self._gap_since < GAP_TIMEOUT:
+                # Outro buraco, aberto depois deste timer
+                timer = threading.Timer(GAP_TIMEOUT, self._skip_gap)
+                timer.daemon = True
+                timer.start()
+                return
+            self._gap_since = None
+            self._seq = min(self._pending) - 1
+            self._insert(self._seq + 1, self._pending.pop(self._seq + 1))
+
+    def wait(self, cursor: int, timeout: float):
+        """Return (events after `cursor`, new cursor, resync).
+
+        `resync` is True when the cursor is older than the buffer (or from a
+        previous boot), meaning the client must reload the full snapshot. A
+        cursor ahead of this hub (another worker applied it first) just
+        waits for it to catch up.
+        """
+        with self._cond:
+            if cursor is None:
+                return [], self._seq, True
+            self._cond.wait_for(lambda: self._seq > cursor, timeout)
+            if self._seq <= cursor:
+                return [], cursor, False
+            oldest = self._events[0][0]
+            if cursor < oldest - 1:
+                return [], self._seq, True
+            events = [e for e in self._events if e[0] > cursor]
+            return events, self._seq, False
+
+
+def format_sse(event_id: str, kind: str, payload: dict) -> str:
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
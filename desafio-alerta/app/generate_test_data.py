@@ -1,79 +1,246 @@
+import argparse
+import asyncio
+import json
 import os
+import random
 import time
-import pandas as pd
-import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import random
-import sqlite3 # Importação mantida, mas sqlite3 não será usado neste script
 
+import numpy as np
+import pandas as pd
+
+from synthetic_data import CSV_PATH, load_profile, sample_counts
 
 ENDPOINT_URL = os.environ.get('ENDPOINT_URL', 'http://127.0.0.1:5000/receive_transaction')
-# CSV_PATH não será usado para escrita, apenas para referência (se aplicável)
-CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv'))
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.db')) # Não será usado para limpar o DB aqui
-STREAM_SPEED = float(os.environ.get('STREAM_SPEED', 0.5))
--
-data = []
+STREAM_SPEED = float(os.environ.get('STREAM_SPEED', 0.5)) # Pausa entre os pontos do cenário demo
+# Status aceitos pelo endpoint (o CSV também tem backend_reversed e refunded)
+STATUSES = ('approved', 'denied', 'failed', 'reversed')
+CHUNK_MINUTES = 60 # Minutos simulados gerados por vez no cenário sazonal
 
 target_anomaly_hour = datetime(2025, 7, 22, 21, 0, 0) # Exemplo: 22 de Julho de 2025, 21:00:00
 
-# 1. Gerar dados "normais" antes e depois da hora da anomalia, simulando tráfego contínuo.
-# Estes não são essenciais para a detecção da anomalia, mas simulam um fluxo real.
-# Geraremos dados por 30 minutos, abrangendo a hora da anomalia.
-start_time = target_anomaly_hour - timedelta(minutes=15)
-
-for i in range(30):
-    ts = start_time + timedelta(minutes=i)
-    
-    # Garantir que os 'approved' tenham contagens mais altas, e outros baixas, como no seu CSV
-    if ts.minute % 5 == 0: # A cada 5 minutos, um approved
-        status = 'approved'
-        count = random.randint(100, 150) # Contagens altas para approved
-    else:
-        status = random.choice(['failed', 'denied', 'reversed'])
-        count = random.randint(1, 5) # Contagens baixas para outros status
-    
-    data.append({
-        'timestamp': ts.isoformat(),
-        'status': status,
-        'count': count
-    })
-
-# 2. Injetar a transação anômala para 'denied' em um minuto específico dentro da hora alvo.
-# Escolha um minuto que o `transactions_endpoint.py` possa calcular a baseline.
-# Por exemplo, no minuto 6 da hora (21:06:00), após alguns minutos de dados "normais" dessa mesma hora.
-anomaly_ts = target_anomaly_hour + timedelta(minutes=6) # 2025-07-22T21:06:00
-data.append({
-    'timestamp': anomaly_ts.isoformat(),
-    'status': 'denied',
-    'count': 5000 # A anomalia! Valor bem alto para garantir o disparo.
-})
-
-# Opcional: Para garantir que a anomalia seja processada por último, você pode reordenar a lista:
-# data.sort(key=lambda x: datetime.fromisoformat(x['timestamp']))
-
-# --- End of data generation logic ---
-
-# Criar o DataFrame
-df = pd.DataFrame(data)
-
-# As linhas que salvariam no CSV CONTINUAM REMOVIDAS/COMENTADAS para não sobrescrever o histórico:
-# df.to_csv(CSV_PATH, index=False)
-# print(f"✔️ Test data saved to {CSV_PATH}")
-
-# Envia dados para o endpoint
-print(f"🔄 Starting data stream to {ENDPOINT_URL} (sleep {STREAM_SPEED}s)...\n")
-for idx, row in df.iterrows():
-    payload = {
-        'timestamp': row['timestamp'],
-        'status': row['status'],
-        'count': int(row['count'])
-    }
+
+def demo_points(seed: int = None) -> list[dict]:
+    """The original demo scenario: 30 minutes of normal traffic around the
+    target hour and a 'denied' spike of 5000 at 21:06, sent last."""
+    rng = random.Random(seed)
+    data = []
+    # Dados "normais" por 30 minutos, abrangendo a hora da anomalia
+    start_time = target_anomaly_hour - timedelta(minutes=15)
+    for i in range(30):
+        ts = start_time + timedelta(minutes=i)
+        if ts.minute % 5 == 0: # A cada 5 minutos, um approved com contagem alta
+            status = 'approved'
+            count = rng.randint(100, 150)
+        else:
+            status = rng.choice(['failed', 'denied', 'reversed'])
+            count = rng.randint(1, 5)
+        data.append({'timestamp': ts.isoformat(), 'status': status, 'count': count})
+
+    # A anomalia, no minuto 6 da hora alvo (após alguns minutos "normais" dessa hora)
+    anomaly_ts = target_anomaly_hour + timedelta(minutes=6)
+    data.append({'timestamp': anomaly_ts.isoformat(), 'status': 'denied', 'count': 5000})
+    return data
+
+
+def parse_anomaly(spec: str) -> tuple[tuple, int]:
+    # "denied,2025-07-22T21:06:00,5000" -> ((timestamp, status), count)
+    status, timestamp, count = spec.split(',')
+    minute = datetime.fromisoformat(timestamp.strip()).replace(second=0, microsecond=0)
+    return (minute.strftime('%Y-%m-%dT%H:%M:%S'), status.strip()), int(count)
+
+
+def seasonal_points(start: datetime, days: float, statuses=STATUSES, anomalies: dict = None,
+                    anomaly_rate: float = 0.0, anomaly_factor: float = 10.0, seed: int = 0,
+                    csv_path: str = CSV_PATH):
+    """Yield one point per status per simulated minute for `days` days.
+
+    Counts follow the per-status, per-hour mean and variance of
+    data/transactions.csv (see synthetic_data.sample_counts), so the
+    stream has the daily seasonality of the real data. `anomalies` maps
+    (timestamp, status) to a count injected at that minute (points
+    outside the range are sent at the end); `anomaly_rate` multiplies a
+    random fraction of the counts by `anomaly_factor`.
+    """
+    profile = load_profile(csv_path)
+    profile = profile[profile['status'].isin(statuses)]
+    statuses = np.array(sorted(profile['status'].unique()))
+    scheduled = dict(anomalies or {})
+    rng = np.random.default_rng(seed)
+    first_minute = np.datetime64(start.replace(second=0, microsecond=0), 'm')
+    minutes = int(days * 1440)
+
+    for first in range(0, minutes, CHUNK_MINUTES):
+        offsets = np.arange(first, min(first + CHUNK_MINUTES, minutes))
+        stamps = pd.DatetimeIndex(np.repeat(first_minute + offsets.astype('timedelta64[m]'), len(statuses)))
+        chunk_statuses = np.tile(statuses, len(offsets))
+        counts = sample_counts(profile, chunk_statuses, stamps.hour.to_numpy(), rng)
+        if anomaly_rate:
+            spikes = rng.random(len(counts)) < anomaly_rate
+            counts[spikes] = (np.maximum(counts[spikes], 1) * anomaly_factor).astype(counts.dtype)
+        for timestamp, status, count in zip(stamps.strftime('%Y-%m-%dT%H:%M:%S'), chunk_statuses, counts.tolist()):
+            yield {'timestamp': timestamp, 'status': str(status), 'count': scheduled.pop((timestamp, status), count)}
+
+    for (timestamp, status), count in sorted(scheduled.items()):
+        yield {'timestamp': timestamp, 'status': status, 'count': count}
+
+
+def request_bodies(points, batch_size: int = 0):
+    """(JSON body, points in it): one point per request, or arrays of
+    `batch_size` points for /receive_transactions."""
+    if not batch_size:
+        for point in points:
+            yield json.dumps(point).encode(), 1
+        return
+    batch = []
+    for point in points:
+        batch.append(point)
+        if len(batch) == batch_size:
+            yield json.dumps(batch).encode(), len(batch)
+            batch = []
+    if batch:
+        yield json.dumps(batch).encode(), len(batch)
+
+
+async def stream(url: str, bodies, rate: float = 0.0, concurrency: int = 64, duration: float = 0.0,
+                 verbose: bool = False) -> dict:
+    """POST `bodies` with `concurrency` keep-alive connections.
+
+    `rate` caps the points per second (0 = as fast as the server answers)
+    by scheduling each request at sent_points / rate from the start;
+    `duration` stops sending after that many seconds (0 = until the
+    bodies run out).
+    """
+    import aiohttp
+
+    pending = asyncio.Queue(maxsize=concurrency * 4)
+    latencies = []
+    errors = Counter()
+    totals = {'requests': 0, 'points': 0, 'alerts': 0}
+    started = time.perf_counter()
+
+    async def produce():
+        scheduled = 0
+        for body, points in bodies:
+            now = time.perf_counter()
+            if duration and now - started >= duration:
+                break
+            if rate:
+                delay = started + scheduled / rate - now
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await pending.put((body, points))
+            scheduled += points
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def client(session):
+        while (item := await pending.get()) is not None:
+            body, points = item
+            t0 = time.perf_counter()
+            try:
+                async with session.post(url, data=body, headers={'Content-Type': 'application/json'}) as response:
+                    payload = await response.read()
+                    if response.status >= 400:
+                        errors[f"HTTP {response.status}"] += 1
+                    else:
+                        result = json.loads(payload)
+                        results = result.get('results', [result])
+                        totals['alerts'] += sum(1 for r in results if r and r.get('alert'))
+                        totals['points'] += points
+                    if verbose:
+                        print(f"Sent {body.decode()} -> {response.status} {payload.decode().strip()}")
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+                errors[type(err).__name__] += 1
+                if verbose:
+                    print(f"Failed to send {body.decode()}: {err}")
+            latencies.append(time.perf_counter() - t0)
+            totals['requests'] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(produce(), *(client(session) for _ in range(concurrency)))
+    return summarize(totals, errors, latencies, time.perf_counter() - started)
+
+
+def run(coro):
+    """Run `coro` to completion and return its result.
+
+    `asyncio.run` refuses to start inside a running loop, as in a Jupyter
+    kernel (`%run -m generate_test_data` in monitoring_implementation.ipynb);
+    there the coroutine gets its own loop in a worker thread.
+    """
     try:
-        resp = requests.post(ENDPOINT_URL, json=payload, timeout=5)
-        print(f"[{row['timestamp']}] Sent {payload} -> {resp.status_code} {resp.json()}")
-    except Exception as e:
-        print(f"Failed to send {payload}: {e}")
-    time.sleep(STREAM_SPEED)
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def summarize(totals: dict, errors: Counter, latencies: list, elapsed: float) -> dict:
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        **totals,
+        'errors': dict(errors),
+        'elapsed_s': round(elapsed, 3),
+        'points_per_s': round(totals['points'] / max(elapsed, 1e-9), 1),
+        'requests_per_s': round(totals['requests'] / max(elapsed, 1e-9), 1),
+        'latency_ms': {
+            'p50': round(float(np.percentile(lat, 50)), 2),
+            'p90': round(float(np.percentile(lat, 90)), 2),
+            'p99': round(float(np.percentile(lat, 99)), 2),
+            'max': round(float(lat.max()), 2),
+        },
+    }
+
+
+if __name__ == '__main__':
+    # python generate_test_data.py                        (cenário demo, um ponto a cada STREAM_SPEED s)
+    # python generate_test_data.py --scenario seasonal --days 7 --batch-size 500 --rate 10000
+    parser = argparse.ArgumentParser(description="Send simulated transactions to the monitoring API")
+    parser.add_argument('--url', default=ENDPOINT_URL,
+                        help="single-point endpoint; --batch-size uses /receive_transactions next to it")
+    parser.add_argument('--scenario', choices=('demo', 'seasonal'), default='demo')
+    parser.add_argument('--days', type=float, default=1, help="simulated days of seasonal traffic")
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        help="first simulated minute (default: --days before now)")
+    parser.add_argument('--anomaly', action='append', type=parse_anomaly, default=[],
+                        metavar='STATUS,TIMESTAMP,COUNT', help="inject a count at a minute (repeatable)")
+    parser.add_argument('--anomaly-rate', type=float, default=0.0, help="fraction of points turned into spikes")
+    parser.add_argument('--anomaly-factor', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=0, help="points per /receive_transactions request")
+    parser.add_argument('--rate', type=float, help="target points/s (demo default: 1/STREAM_SPEED, else unlimited)")
+    parser.add_argument('--concurrency', type=int, help="parallel connections (demo default: 1, else 64)")
+    parser.add_argument('--duration', type=float, default=0, help="stop after this many seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="write the summary as JSON")
+    args = parser.parse_args()
+
+    demo = args.scenario == 'demo'
+    if demo:
+        points = demo_points()
+    else:
+        start = args.start or datetime.now().replace(second=0, microsecond=0) - timedelta(days=args.days)
+        points = seasonal_points(start, args.days, anomalies=dict(args.anomaly), anomaly_rate=args.anomaly_rate,
+                                 anomaly_factor=args.anomaly_factor, seed=args.seed)
+    url = args.url
+    if args.batch_size:
+        url = url.rstrip('/').removesuffix('/receive_transaction') + '/receive_transactions'
+    rate = args.rate if args.rate is not None else (1 / STREAM_SPEED if demo and STREAM_SPEED > 0 else 0)
+    concurrency = args.concurrency or (1 if demo else 64)
 
-print("Stream finished.")
+    print(f"🔄 Starting {args.scenario} stream to {url} "
+          f"({f'{rate:g} points/s' if rate else 'unthrottled'}, {concurrency} connections)...\n")
+    summary = run(stream(url, request_bodies(points, args.batch_size), rate, concurrency,
+                         args.duration, verbose=demo))
+    print(f"\nStream finished: {summary['points']:,} points in {summary['requests']:,} requests "
+          f"in {summary['elapsed_s']:.1f}s ({summary['points_per_s']:,.0f} points/s, "
+          f"{summary['requests_per_s']:,.0f} req/s), {summary['alerts']:,} alerts")
+    print(f"Latency ms: {summary['latency_ms']}  Errors: {summary['errors'] or 'none'}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,171 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# WAL deixa leitores e o escritor trabalharem em paralelo; synchronous=NORMAL
+# não faz fsync a cada commit (só no checkpoint), o que basta com WAL.
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous={synchronous}",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA wal_autocheckpoint=4000",
+)
+
+
+class WriteBehindWriter:
+    """Single writer thread that group-commits queued rows.
+
+    `submit` returns immediately with a Future that resolves once the rows
+    are committed. The writer takes whatever is queued, waits up to
+    `max_delay` seconds for more (or until `max_batch` rows), and writes it
+    all in one transaction. Rows go to `insert_sql` unless `submit` names
+    another statement. `on_commit(conn, written)` runs in the writer thread
+    after each commit, with the writer's connection and a {sql: rows} dict;
+    `observe_commit(seconds, rows)` receives the duration of each commit.
+    """
+
+    def __init__(self, db_path: str, insert_sql: str, max_batch: int = 1000, max_delay: float = 0.005,
+                 queue_size: int = 100000, synchronous: str = 'NORMAL', on_commit=None, observe_commit=None):
+        self.insert_sql = insert_sql
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        self.observe_commit = observe_commit
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats = {'rows': 0, 'commits': 0, 'errors': 0}
+        self._submitted = 0 # lotes enfileirados / já gravados (ou com erro)
+        self._done = 0
+        self._cond = threading.Condition()
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        for pragma in WRITER_PRAGMAS:
+            self._conn.execute(pragma.format(synchronous=synchronous))
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: list[tuple], timeout: float = 10, sql: str = None) -> Future:
+        future = Future()
+        self._queue.put((sql or self.insert_sql, rows, future), timeout=timeout) # Fila cheia = contrapressão no produtor
+        with self._cond:
+            self._submitted += 1
+        return future
+
+    def wait_written(self, timeout: float = 10) -> bool:
+        """Block until everything submitted so far has been written.
+
+        Used before reads that must see the caller's own writes (the SQL
+        fallbacks); returns immediately when nothing is pending.
+        """
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            size = len(item[1])
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+                size += len(item[1])
+            self._flush(pending)
+            if stop:
+                return
+
+    def _flush(self, pending: list):
+        written = {}
+        for sql, batch, _ in pending:
+            written.setdefault(sql, []).extend(batch)
+        total = sum(len(rows) for rows in written.values())
+        started = time.perf_counter()
+        try:
+            with self._conn:
+                for sql, rows in written.items():
+                    self._conn.executemany(sql, rows)
+        except Exception as err:
+            self._stats['errors'] += 1
+            logger.error(f"Group commit of {total} rows failed: {err}")
+            for _, _, future in pending:
+                future.set_exception(err)
+            self._mark_done(len(pending))
+            return
+        self._stats['rows'] += total
+        self._stats['commits'] += 1
+        if self.observe_commit is not None:
+            self.observe_commit(time.perf_counter() - started, total)
+        for _, _, future in pending:
+            future.set_result(total)
+        self._mark_done(len(pending))
+        if self.on_commit is not None:
+            try:
+                self.on_commit(self._conn, written)
+            except Exception as err:
+                logger.error(f"on_commit callback failed: {err}")
+
+    def _mark_done(self, batches: int):
+        with self._cond:
+            self._done += batches
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {**self._stats, 'queue_depth': self._queue.qsize()}
+
+    def close(self, timeout: float = 10):
+        """Flush everything queued so far and stop the writer."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._conn.close()
+
+
+class ReadPool:
+    """Fixed pool of read-only connections shared by request threads."""
+
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 10):
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        uri = f"file:{db_path}?mode=ro"
+        for _ in range(size):
+            conn = sqlite3.connect(uri, uri=True, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row # Permite acesso por nome de coluna
+            conn.execute("PRAGMA query_only=ON")
+            self._pool.put(conn)
+        self.size = size
+
+    def acquire(self) -> sqlite3.Connection:
+        return self._pool.get(timeout=self.timeout)
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
@@ -1,41 +1,210 @@
+import argparse
 import os
 import sqlite3
-import pandas as pd
+import time
 
-DATA_DIR = os.path.abspath(os.path.join("..", "..", "desafio-alerta", "data"))
+import numpy as np
+import pandas as pd
 
-auth_codes_csv = os.path.join(DATA_DIR, 'transactions_auth_codes.csv')
-transactions_csv = os.path.join(DATA_DIR, 'transactions.csv')
+from schema import AUTH_CODES_INDEXES, DB_PATH, TRANSACTIONS_INDEXES, backfill_verdicts, ensure_schema, normalize_auth_code
 
-df_auth_codes = pd.read_csv(auth_codes_csv, sep=",")
-df_transactions = pd.read_csv(transactions_csv, sep=",")
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DEFAULT_SOURCES = (
+    os.path.join(DATA_DIR, 'transactions.csv'),
+    os.path.join(DATA_DIR, 'transactions_auth_codes.csv'),
+)
+CHUNK_ROWS = 100000
 
-db_path = os.path.join(DATA_DIR, 'transactions.db')
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+# tabela -> (coluna chave, índices secundários)
+TABLES = {
+    'transactions': ('status', TRANSACTIONS_INDEXES),
+    'auth_codes': ('auth_code', AUTH_CODES_INDEXES),
+}
 
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS auth_codes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    auth_code TEXT,
-    count INTEGER
+# Só valem para a conexão da importação; o servidor continua com as suas
+IMPORT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=FILE", # O staging vai para disco, não para a RAM
 )
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS transactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    status TEXT,
-    count INTEGER
-)
-""")
 
-df_auth_codes.to_sql('auth_codes', conn, if_exists='append', index=False)
-df_transactions.to_sql('transactions', conn, if_exists='append', index=False)
 
-conn.commit()
-conn.close()
+def _index_name(ddl: str) -> str:
+    # "CREATE INDEX IF NOT EXISTS nome ON ..." -> nome
+    return ddl.split(' ON ')[0].split()[-1]
+
+
+def read_chunks(path: str, chunk_rows: int = CHUNK_ROWS):
+    """Iterate over a CSV or NDJSON (.ndjson/.jsonl) file in DataFrames of `chunk_rows`."""
+    if path.endswith(('.ndjson', '.jsonl')):
+        return pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False, convert_dates=False)
+    # Tudo como texto: preserva códigos como '00' e o timestamp como veio
+    return pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+
+
+def detect_table(columns) -> str:
+    for table, (key, _) in TABLES.items():
+        if key in columns:
+            return table
+    raise ValueError(f"Expected a 'status' or 'auth_code' column, got {list(columns)}")
+
+
+def prepare_chunk(chunk: pd.DataFrame, key: str) -> tuple[list, int]:
+    """Rows (timestamp, key, count, ts, hour_bucket, hour_of_day) of a chunk.
+
+    Vectorized version of parse_timestamp + bucket_columns: timestamps
+    without a time zone are taken as UTC and the others converted to UTC.
+    Rows with an invalid timestamp, count or key are dropped and counted.
+    """
+    missing = {'timestamp', key, 'count'} - set(chunk.columns)
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+    ts = pd.to_datetime(chunk['timestamp'], format='ISO8601', utc=True, errors='coerce')
+    count = pd.to_numeric(chunk['count'], errors='coerce')
+    keys = chunk[key]
+    valid = ts.notna() & count.notna() & keys.notna() & (keys.astype(str).str.strip() != '')
+
+    epoch = ts[valid].dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+    hour_bucket = epoch // 3600
+    keys = keys[valid].astype(str)
+    if key == 'auth_code':
+        keys = keys.map(normalize_auth_code)
+    rows = list(zip(
+        chunk.loc[valid, 'timestamp'].astype(str), keys, count[valid].astype(np.int64).tolist(),
+        epoch.tolist(), hour_bucket.tolist(), (hour_bucket % 24).tolist(),
+    ))
+    return rows, int((~valid).sum())
+
+
+def stage_file(conn: sqlite3.Connection, path: str, table: str = None, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """Copy a file into the temporary staging table of its target table.
+
+    Each chunk goes in with one executemany in its own transaction, so
+    memory stays at one chunk regardless of the file size.
+    """
+    started = time.perf_counter()
+    staged = rejected = 0
+    for chunk in read_chunks(path, chunk_rows):
+        table = table or detect_table(chunk.columns)
+        key = TABLES[table][0]
+        rows, bad = prepare_chunk(chunk, key)
+        conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS staging_{table} "
+            f"(timestamp TEXT, {key} TEXT, count INTEGER, ts INTEGER, hour_bucket INTEGER, hour_of_day INTEGER)"
+        )
+        with conn:
+            conn.executemany(f"INSERT INTO staging_{table} VALUES (?, ?, ?, ?, ?, ?)", rows)
+        staged += len(rows)
+        rejected += bad
+    return {
+        'path': path,
+        'table': table,
+        'staged': staged,
+        'rejected': rejected,
+        'elapsed_s': time.perf_counter() - started,
+    }
+
+
+def merge_staging(conn: sqlite3.Connection, table: str) -> dict:
+    """Move the staged rows into `table`, skipping duplicate (timestamp, key).
+
+    Within the import the first occurrence wins; rows already in the table
+    are never inserted again. Rows go in timestamp order so ids follow
+    time. When the table is empty its secondary indexes are dropped for
+    the load and rebuilt once at the end.
+    """
+    key, indexes = TABLES[table]
+    started = time.perf_counter()
+    staged = conn.execute(f"SELECT COUNT(*) FROM staging_{table}").fetchone()[0]
+    empty = conn.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table})").fetchone()[0]
+    existing = "" if empty else f"""
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} AS t
+            WHERE t.{key} = s.{key} AND t.hour_bucket = s.hour_bucket AND t.ts = s.ts
+        )"""
+    with conn:
+        if empty:
+            for ddl in indexes:
+                conn.execute(f"DROP INDEX IF EXISTS {_index_name(ddl)}")
+        # Colunas soltas com MIN(rowid): o SQLite devolve as da primeira linha do grupo
+        inserted = conn.execute(f"""
+            INSERT INTO {table}(timestamp, {key}, count, ts, hour_bucket, hour_of_day)
+            SELECT timestamp, {key}, count, ts, hour_bucket, hour_of_day FROM (
+                SELECT timestamp, {key}, count, ts, hour_bucket, hour_of_day, MIN(rowid) AS first
+                FROM staging_{table}
+                GROUP BY {key}, ts
+            ) AS s{existing}
+            ORDER BY ts, first
+        """).rowcount
+        if empty:
+            for ddl in indexes:
+                conn.execute(ddl)
+        conn.execute(f"DROP TABLE staging_{table}")
+    return {
+        'table': table,
+        'inserted': inserted,
+        'duplicates': staged - inserted,
+        'elapsed_s': time.perf_counter() - started,
+    }
+
+
+def import_files(db_path: str, paths, table: str = None, chunk_rows: int = CHUNK_ROWS,
+                 verdicts: bool = True, log=print) -> list[dict]:
+    """Import CSV/NDJSON files into the transactions DB at `db_path`.
+
+    The target table is `table` or, per file, the one matching its columns
+    (status -> transactions, auth_code -> auth_codes). Imported rows get
+    their verdicts backfilled unless `verdicts` is False.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_schema(conn) # Antes do WAL: um banco novo ainda pode ligar o auto_vacuum
+        for pragma in IMPORT_PRAGMAS:
+            conn.execute(pragma)
+        tables = []
+        for path in paths:
+            result = stage_file(conn, path, table, chunk_rows)
+            log(f"Read {result['staged']:,} rows from {path} ({result['rejected']:,} rejected) "
+                f"in {result['elapsed_s']:.1f}s, {result['staged'] / max(result['elapsed_s'], 1e-9):,.0f} rows/s")
+            if result['table'] and result['table'] not in tables:
+                tables.append(result['table'])
+
+        merged = []
+        for name in tables:
+            result = merge_staging(conn, name)
+            if verdicts:
+                with conn:
+                    scored = backfill_verdicts(conn, table=name, key=TABLES[name][0])
+                result['verdicts'] = scored
+            merged.append(result)
+            log(f"{name}: inserted {result['inserted']:,} rows, skipped {result['duplicates']:,} duplicates "
+                f"in {result['elapsed_s']:.1f}s")
+        conn.execute("ANALYZE")
+        conn.commit()
+        return merged
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    # python initialize_database.py                      (os dois CSVs de data/)
+    # python initialize_database.py exportacao.ndjson --table transactions --db /tmp/outro.db
+    parser = argparse.ArgumentParser(description="Bulk import CSV/NDJSON files into transactions.db")
+    parser.add_argument('paths', nargs='*', default=list(DEFAULT_SOURCES),
+                        help="CSV or NDJSON (.ndjson/.jsonl) files (default: the CSVs in data/)")
+    parser.add_argument('--db', default=DB_PATH, help=f"target database (default: {DB_PATH})")
+    parser.add_argument('--table', choices=sorted(TABLES), default=None,
+                        help="target table (default: detected from the columns of each file)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--no-verdicts', dest='verdicts', action='store_false',
+                        help="skip scoring the imported rows")
+    args = parser.parse_args()
 
-print("Database successfully initialized")
\ No newline at end of file
+    started = time.perf_counter()
+    results = import_files(args.db, args.paths, args.table, args.chunk_rows, args.verdicts)
+    elapsed = time.perf_counter() - started
+    inserted = sum(r['inserted'] for r in results)
+    print(f"Database successfully initialized: {inserted:,} rows in {elapsed:.1f}s "
+          f"({inserted / max(elapsed, 1e-9):,.0f} rows/s) at {args.db}")
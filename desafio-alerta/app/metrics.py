@@ -0,0 +1,197 @@
+import cProfile
+import logging
+import math
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Limites dos histogramas de latência, em segundos (os mesmos do cliente oficial)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one series per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self.labels, key, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus `le` semantics) per label set.
+
+    `observe` is a bisect plus two additions under a lock, cheap enough
+    for every request.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [contagem por bucket (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        names = self.labels + ('le',)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', names, key + (_format_value(bound),), cumulative
+            yield f'{self.name}_sum', self.labels, key, total
+            yield f'{self.name}_count', self.labels, key, cumulative
+
+
+class Gauge:
+    """Value read at scrape time from `fn`.
+
+    `fn` returns a number, or a {label values tuple: number} dict when the
+    gauge has labels. `kind` can be 'counter' for totals kept elsewhere
+    (e.g. the writer's own stats).
+    """
+
+    def __init__(self, name: str, help: str, fn, labels: tuple = (), kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = labels
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as err:
+            logger.warning(f"Metric {self.name} unavailable: {err}")
+            return
+        if value is None:
+            return
+        items = value.items() if self.labels else [((), value)]
+        for key, number in items:
+            yield self.name, self.labels, tuple(str(v) for v in key), number
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn, labels: tuple = (), kind: str = 'gauge') -> Gauge:
+        return self.register(Gauge(name, help, fn, labels, kind))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, values, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels, values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Opt-in cProfile of a sample of requests, kept only when they are slow.
+
+    `start` enables a profiler for a fraction `sample_rate` of the calls;
+    `finish` stops it and, if the request took at least `threshold_ms`,
+    writes a .prof file (python -m pstats / snakeviz) to `out_dir`.
+    """
+
+    def __init__(self, threshold_ms: float, sample_rate: float, out_dir: str):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.out_dir = out_dir
+        self.dumped = 0
+
+    def start(self):
+        if self.threshold <= 0 or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None # Outro profiler já ativo (Python 3.12+ só permite um)
+        return profiler
+
+    def finish(self, profiler, elapsed: float, name: str):
+        profiler.disable()
+        if elapsed < self.threshold:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_') or 'request'
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}-{elapsed * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        self.dumped += 1
+        logger.warning(f"Slow request {name} took {elapsed * 1000:.0f}ms; profile written to {path}")
+        return path
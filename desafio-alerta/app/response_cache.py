@@ -0,0 +1,63 @@
+import gzip
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+GZIP_LEVEL = 6
+
+
+class ResponseCache:
+    """Rendered response bodies by key, each gzipped once.
+
+    The key carries everything the body depends on (for /dashboard_data,
+    the event version and the hour window), so entries never need to be
+    invalidated: new data means a new key and old ones just age out.
+    Concurrent misses on the same key are coalesced ("single flight"):
+    one caller builds the body while the others wait for its result.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict() # key -> (body, body gzipped)
+        self._flights = {}            # key -> Future do build em andamento
+        self._lock = threading.Lock()
+
+    def get(self, key, build) -> tuple[bytes, bytes]:
+        """(body, gzipped body) for `key`, calling `build()` -> bytes on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result() # Repassa também a exceção do build
+
+        try:
+            body = build()
+            entry = (body, gzip.compress(body, GZIP_LEVEL))
+        except BaseException as err:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set_exception(err)
+            raise
+        with self._lock:
+            # Entrada e fim do voo juntos: ninguém vê a chave sem nenhum dos dois
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._flights.pop(key, None)
+        flight.set_result(entry)
+        return entry
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
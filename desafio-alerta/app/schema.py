@@ -0,0 +1,434 @@
+import calendar
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.db'))
+SCHEMA_VERSION = 6
+MIGRATION_CHUNK = 10000
+BACKFILL_CHUNK = 50000 # Linhas pendentes pontuadas por vez em backfill_verdicts
+
+# Parâmetros usados para preencher os veredictos de linhas antigas; o endpoint
+# passa os da sua própria configuração.
+DEFAULT_SCORING = {
+    'history_limit': int(os.environ.get('HISTORY_LIMIT', 7)),
+    'min_history_points': int(os.environ.get('MIN_HISTORY_POINTS', 3)),
+    'std_multiplier': float(os.environ.get('STD_MULTIPLIER', 3)),
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+# timestamp continua guardado como veio; as colunas inteiras são derivadas dele
+# e são as que as consultas usam (ts em segundos desde a época, tratando
+# horários sem fuso como UTC). alert/severity/mean/std/threshold guardam o
+# veredicto calculado na ingestão.
+VERDICT_COLUMNS = (
+    ('alert', 'INTEGER'),
+    ('severity', 'TEXT'),
+    ('mean', 'REAL'),
+    ('std', 'REAL'),
+    ('threshold', 'REAL'),
+)
+
+TRANSACTIONS_DDL = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    status TEXT,
+    count INTEGER,
+    ts INTEGER,
+    hour_bucket INTEGER,
+    hour_of_day INTEGER,
+    alert INTEGER,
+    severity TEXT,
+    mean REAL,
+    std REAL,
+    threshold REAL
+)
+"""
+
+# auth_codes segue o mesmo formato, com auth_code no lugar de status
+AUTH_CODES_DDL = """
+CREATE TABLE IF NOT EXISTS auth_codes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    auth_code TEXT,
+    count INTEGER,
+    ts INTEGER,
+    hour_bucket INTEGER,
+    hour_of_day INTEGER,
+    alert INTEGER,
+    severity TEXT,
+    mean REAL,
+    std REAL,
+    threshold REAL
+)
+"""
+
+INSERT_TRANSACTION = (
+    "INSERT INTO transactions(timestamp, status, count, ts, hour_bucket, hour_of_day, "
+    "alert, severity, mean, std, threshold) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+INSERT_AUTH_CODE = (
+    "INSERT INTO auth_codes(timestamp, auth_code, count, ts, hour_bucket, hour_of_day, "
+    "alert, severity, mean, std, threshold) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+TRANSACTIONS_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_transactions_status_hour_bucket "
+    "ON transactions(status, hour_bucket, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_status_hour_of_day "
+    "ON transactions(status, hour_of_day, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_ts ON transactions(ts)",
+)
+
+AUTH_CODES_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_auth_codes_code_hour_bucket "
+    "ON auth_codes(auth_code, hour_bucket, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_auth_codes_code_hour_of_day "
+    "ON auth_codes(auth_code, hour_of_day, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_auth_codes_ts ON auth_codes(ts)",
+)
+
+# Agregados por (hora, status) mantidos incrementalmente a cada inserção:
+# o dashboard lê no máximo 24 x nº de status linhas em vez de varrer os brutos.
+HOURLY_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS hourly_stats (
+    hour_bucket INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (hour_bucket, status)
+) WITHOUT ROWID
+"""
+
+HOURLY_STATS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_transactions_hourly_stats
+AFTER INSERT ON transactions
+WHEN NEW.hour_bucket IS NOT NULL
+BEGIN
+    INSERT INTO hourly_stats(hour_bucket, status, n, total, total_sq)
+    VALUES (NEW.hour_bucket, NEW.status, 1, NEW.count, NEW.count * NEW.count)
+    ON CONFLICT(hour_bucket, status) DO UPDATE SET
+        n = n + 1,
+        total = total + excluded.total,
+        total_sq = total_sq + excluded.total_sq;
+END
+"""
+
+AUTH_CODE_HOURLY_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS auth_code_hourly_stats (
+    hour_bucket INTEGER NOT NULL,
+    auth_code TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (hour_bucket, auth_code)
+) WITHOUT ROWID
+"""
+
+AUTH_CODE_HOURLY_STATS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_auth_codes_hourly_stats
+AFTER INSERT ON auth_codes
+WHEN NEW.hour_bucket IS NOT NULL
+BEGIN
+    INSERT INTO auth_code_hourly_stats(hour_bucket, auth_code, n, total, total_sq)
+    VALUES (NEW.hour_bucket, NEW.auth_code, 1, NEW.count, NEW.count * NEW.count)
+    ON CONFLICT(hour_bucket, auth_code) DO UPDATE SET
+        n = n + 1,
+        total = total + excluded.total,
+        total_sq = total_sq + excluded.total_sq;
+END
+"""
+
+# Camada diária: as linhas de hourly_stats mais antigas que a retenção são
+# somadas aqui (day_bucket = ts // 86400) antes de serem apagadas.
+DAILY_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day_bucket INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (day_bucket, status)
+) WITHOUT ROWID
+"""
+
+AUTH_CODE_DAILY_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS auth_code_daily_stats (
+    day_bucket INTEGER NOT NULL,
+    auth_code TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (day_bucket, auth_code)
+) WITHOUT ROWID
+"""
+
+# Até onde cada camada já foi compactada (compaction.py): para a tabela
+# `source`, tier 'raw' = linhas brutas com ts < until podem ter sido
+# apagadas; tier 'hourly' = horas antes de until só existem na camada diária.
+COMPACTION_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS compaction_state (
+    source TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    until INTEGER NOT NULL,
+    PRIMARY KEY (source, tier)
+) WITHOUT ROWID
+"""
+
+# Estado serializado (JSON) dos detectores de streaming, um por status:
+# restaurado na inicialização em vez de reprocessar o histórico.
+DETECTOR_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS detector_state (
+    status TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (status, detector)
+) WITHOUT ROWID
+"""
+
+
+def parse_timestamp(value: str) -> datetime:
+    # Aceita tanto '2025-07-12 13:45:00' (CSV) quanto isoformat() com 'T'.
+    # Timestamps com fuso são normalizados para UTC, como o strftime do SQLite faz.
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def normalize_auth_code(value) -> str:
+    # Códigos de resposta têm dois caracteres: 0 ou '0' (lidos como número
+    # de um CSV) viram '00'
+    code = str(value).strip()
+    return code.zfill(2) if code.isdigit() else code
+
+
+def to_epoch(ts: datetime) -> int:
+    return calendar.timegm(ts.timetuple())
+
+
+def from_epoch(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def bucket_columns(ts: datetime) -> tuple[int, int, int]:
+    """Return the (ts, hour_bucket, hour_of_day) columns for a timestamp."""
+    epoch = to_epoch(ts)
+    hour_bucket = epoch // 3600
+    return epoch, hour_bucket, hour_bucket % 24
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _copy_legacy(conn: sqlite3.Connection, table: str, ddl: str, key: str, normalize=None):
+    # Reescreve uma tabela antiga (timestamp TEXT livre) com as colunas normalizadas
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v0")
+    conn.execute(ddl)
+    has_id = 'id' in _columns(conn, f'{table}_v0')
+    select = (
+        f"SELECT id, timestamp, {key}, count FROM {table}_v0 ORDER BY id" if has_id
+        else f"SELECT NULL, timestamp, {key}, count FROM {table}_v0 ORDER BY rowid"
+    )
+    cur = conn.execute(select)
+    while True:
+        rows = cur.fetchmany(MIGRATION_CHUNK)
+        if not rows:
+            break
+        converted = []
+        for row_id, timestamp, value, count in rows:
+            try:
+                columns = bucket_columns(parse_timestamp(timestamp))
+            except (TypeError, ValueError):
+                columns = (None, None, None)
+            converted.append((row_id, timestamp, normalize(value) if normalize else value, count, *columns))
+        conn.executemany(
+            f"INSERT INTO {table}(id, timestamp, {key}, count, ts, hour_bucket, hour_of_day) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            converted
+        )
+    conn.execute(f"DROP TABLE {table}_v0")
+
+
+def _migrate_v1(conn: sqlite3.Connection, scoring: dict):
+    if 'ts' in _columns(conn, 'transactions'):
+        return
+    _copy_legacy(conn, 'transactions', TRANSACTIONS_DDL, 'status')
+
+
+def _migrate_v2(conn: sqlite3.Connection, scoring: dict):
+    # Cria hourly_stats e preenche a partir das linhas já existentes
+    conn.execute(HOURLY_STATS_DDL)
+    conn.execute("DELETE FROM hourly_stats")
+    conn.execute(
+        "INSERT INTO hourly_stats(hour_bucket, status, n, total, total_sq) "
+        "SELECT hour_bucket, status, COUNT(*), SUM(count), SUM(count * count) "
+        "FROM transactions WHERE hour_bucket IS NOT NULL GROUP BY hour_bucket, status"
+    )
+
+
+def backfill_verdicts(conn: sqlite3.Connection, scoring: dict = None, table: str = 'transactions',
+                      key: str = 'status', chunk_rows: int = BACKFILL_CHUNK) -> int:
+    """Score the rows without a stored verdict (severity IS NULL), in timestamp order.
+
+    One key at a time, in chunks of `chunk_rows` pending rows: the vectorized
+    batch scorer gets each chunk plus its history read from the table (the
+    HISTORY_LIMIT rows before the chunk and the already scored rows inside
+    its range), so each row gets the verdict it would have received at
+    ingest time and memory stays at one chunk. `table`/`key` select
+    auth_codes/auth_code instead of transactions/status.
+    """
+    from batch_scoring import score_batch
+
+    scoring = scoring or DEFAULT_SCORING
+    limit = scoring['history_limit']
+
+    def history(level_key: tuple, min_ts: int, max_ts: int) -> tuple[list, list]:
+        level, value, bucket = level_key
+        column = 'hour_bucket' if level == 'hour' else 'hour_of_day'
+        rows = conn.execute(
+            f"SELECT ts, count FROM {table} WHERE {key} = ? AND {column} = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (value, bucket, min_ts, limit)
+        ).fetchall()
+        # Linhas já pontuadas no meio do chunk (ex.: reimportação intercalada)
+        rows += conn.execute(
+            f"SELECT ts, count FROM {table} WHERE {key} = ? AND {column} = ? AND ts >= ? AND ts < ? "
+            "AND severity IS NOT NULL",
+            (value, bucket, min_ts, max_ts)
+        ).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    values = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT {key} FROM {table} WHERE severity IS NULL AND ts IS NOT NULL"
+    )]
+    scored = 0
+    for value in values:
+        last = (-1, -1, -1) # (hour_bucket, ts, id) da última linha pontuada
+        while True:
+            # Ordem do índice (key, hour_bucket, ts): a mesma de ts, sem sort
+            rows = conn.execute(
+                f"SELECT id, hour_bucket, ts, count FROM {table} "
+                f"WHERE {key} = ? AND (hour_bucket, ts, id) > (?, ?, ?) AND severity IS NULL AND ts IS NOT NULL "
+                "ORDER BY hour_bucket, ts, id LIMIT ?",
+                (value, *last, chunk_rows)
+            ).fetchall()
+            if not rows:
+                break
+            scores = score_batch(
+                [value] * len(rows),
+                [row[2] for row in rows],
+                [row[3] for row in rows],
+                history,
+                limit,
+                scoring['min_history_points'],
+                scoring['std_multiplier'],
+            )
+            # Listas Python de uma vez: indexar arrays NumPy linha a linha é lento
+            known = scores['known'].tolist()
+            mean, std, threshold = (
+                [value if ok else None for value, ok in zip(scores[name].tolist(), known)]
+                for name in ('mean', 'std', 'threshold')
+            )
+            conn.executemany(
+                f"UPDATE {table} SET alert = ?, severity = ?, mean = ?, std = ?, threshold = ? WHERE id = ?",
+                zip(scores['alert'].astype(int).tolist(), scores['severity'].tolist(), mean, std, threshold,
+                    [row[0] for row in rows])
+            )
+            scored += len(rows)
+            last = (rows[-1][1], rows[-1][2], rows[-1][0])
+    return scored
+
+
+def _migrate_v3(conn: sqlite3.Connection, scoring: dict):
+    # Colunas do veredicto, preenchidas para o histórico já gravado
+    existing = _columns(conn, 'transactions')
+    for name, sql_type in VERDICT_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE transactions ADD COLUMN {name} {sql_type}")
+    backfill_verdicts(conn, scoring)
+
+
+def _migrate_v4(conn: sqlite3.Connection, scoring: dict):
+    conn.execute(DETECTOR_STATE_DDL)
+
+
+def _migrate_v5(conn: sqlite3.Connection, scoring: dict):
+    # auth_codes (carregada por initialize_database.py) ganha as mesmas
+    # colunas, índices e agregados por hora de transactions
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'auth_codes'"
+    ).fetchone()
+    if not exists:
+        conn.execute(AUTH_CODES_DDL)
+    elif 'ts' not in _columns(conn, 'auth_codes'):
+        _copy_legacy(conn, 'auth_codes', AUTH_CODES_DDL, 'auth_code', normalize_auth_code)
+    conn.execute(AUTH_CODE_HOURLY_STATS_DDL)
+    conn.execute("DELETE FROM auth_code_hourly_stats")
+    conn.execute(
+        "INSERT INTO auth_code_hourly_stats(hour_bucket, auth_code, n, total, total_sq) "
+        "SELECT hour_bucket, auth_code, COUNT(*), SUM(count), SUM(count * count) "
+        "FROM auth_codes WHERE hour_bucket IS NOT NULL GROUP BY hour_bucket, auth_code"
+    )
+    backfill_verdicts(conn, scoring, 'auth_codes', 'auth_code')
+
+
+def _migrate_v6(conn: sqlite3.Connection, scoring: dict):
+    conn.execute(DAILY_STATS_DDL)
+    conn.execute(AUTH_CODE_DAILY_STATS_DDL)
+    conn.execute(COMPACTION_STATE_DDL)
+
+
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+    5: _migrate_v5,
+    6: _migrate_v6,
+}
+
+
+def ensure_schema(conn: sqlite3.Connection, scoring: dict = None):
+    """Create the tables/indexes and apply pending migrations in one transaction."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    if version == 0 and not conn.execute("SELECT 1 FROM sqlite_master").fetchone():
+        # Banco novo: só pode ser ligado antes da primeira tabela; permite
+        # que compaction.py devolva ao disco o espaço das linhas apagadas
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+        ).fetchone()
+        if not exists:
+            conn.execute(TRANSACTIONS_DDL)
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[target](conn, scoring or DEFAULT_SCORING)
+        for ddl in TRANSACTIONS_INDEXES + AUTH_CODES_INDEXES:
+            conn.execute(ddl)
+        conn.execute(HOURLY_STATS_TRIGGER)
+        conn.execute(AUTH_CODE_HOURLY_STATS_TRIGGER)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    conn.execute("ANALYZE")
+
+
+if __name__ == '__main__':
+    # Migração avulsa: python schema.py [caminho/do/transactions.db]
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    conn.close()
+    print(f"Schema at version {SCHEMA_VERSION}: {path}")
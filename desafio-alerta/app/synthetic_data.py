@@ -0,0 +1,146 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from schema import INSERT_TRANSACTION, VERDICT_COLUMNS, backfill_verdicts, ensure_schema
+
+CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'transactions.csv'))
+CHUNK_ROWS = 200000
+# Último minuto de data/transactions.csv: sem --end, os dados não dependem do relógio
+DEFAULT_END = datetime(2025, 7, 15, 13, 44)
+
+# Pragmas só para a carga inicial de um banco descartável
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def load_profile(csv_path: str = CSV_PATH) -> pd.DataFrame:
+    """Mean and variance of `count` per (status, hour of day) in the CSV."""
+    df = pd.read_csv(csv_path)
+    df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
+    profile = df.groupby(['status', 'hour'])['count'].agg(['mean', 'var']).fillna(0.0)
+    return profile.reset_index()
+
+
+def sample_counts(profile: pd.DataFrame, statuses: np.ndarray, hours: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+    """Draw counts shaped like the CSV for the given (status, hour) pairs.
+
+    Poisson when the variance does not exceed the mean, otherwise a
+    gamma-Poisson (negative binomial) mixture with the same mean and
+    variance, which reproduces the occasional spikes of the real data.
+    """
+    keys = pd.MultiIndex.from_arrays([statuses, hours])
+    stats = profile.set_index(['status', 'hour']).reindex(keys)
+    mean = np.nan_to_num(stats['mean'].to_numpy(dtype=float))
+    var = np.nan_to_num(stats['var'].to_numpy(dtype=float))
+    lam = mean.copy()
+    over = (var > mean) & (mean > 0)
+    shape = mean[over] ** 2 / (var[over] - mean[over])
+    lam[over] = rng.gamma(shape, mean[over] / shape)
+    return rng.poisson(lam)
+
+
+def iter_synthetic(rows: int, end: datetime = None, seed: int = 0, profile: pd.DataFrame = None,
+                   chunk_rows: int = CHUNK_ROWS):
+    """Yield DataFrames (timestamp, status, count) with `rows` rows in total.
+
+    Like data/transactions.csv: one point per status per minute, ending at
+    `end` (default: DEFAULT_END, where the CSV ends). The same `rows`, `end`
+    and `seed` give the same data; pass a recent `end` for rows that fall
+    in the dashboard's last 24 hours.
+    """
+    profile = load_profile() if profile is None else profile
+    statuses = np.array(sorted(profile['status'].unique()))
+    end = end or DEFAULT_END
+    minutes = -(-rows // len(statuses))
+    start = np.datetime64(end - timedelta(minutes=minutes - 1), 'm')
+    rng = np.random.default_rng(seed)
+
+    per_chunk = max(1, chunk_rows // len(statuses))
+    emitted = 0
+    for first in range(0, minutes, per_chunk):
+        offsets = np.arange(first, min(first + per_chunk, minutes))
+        stamps = np.repeat(start + offsets.astype('timedelta64[m]'), len(statuses))
+        chunk_statuses = np.tile(statuses, len(offsets))
+        take = min(len(stamps), rows - emitted)
+        stamps, chunk_statuses = stamps[:take], chunk_statuses[:take]
+        timestamps = pd.DatetimeIndex(stamps)
+        counts = sample_counts(profile, chunk_statuses, timestamps.hour.to_numpy(), rng)
+        emitted += take
+        yield pd.DataFrame({
+            'timestamp': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+            'status': chunk_statuses,
+            'count': counts,
+        })
+
+
+def write_csv(path: str, rows: int, **kwargs) -> int:
+    written = 0
+    for i, chunk in enumerate(iter_synthetic(rows, **kwargs)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        written += len(chunk)
+    return written
+
+
+def build_database(path: str, rows: int, verdicts: bool = False, **kwargs) -> float:
+    """Create a fresh transactions DB at `path` with `rows` synthetic rows.
+
+    The hourly_stats trigger fills the aggregates during the load. Verdict
+    columns stay NULL unless `verdicts` is set (scoring 10M rows takes a
+    while). Returns the load time in seconds.
+    """
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        ensure_schema(conn)
+        empty_verdict = (None,) * len(VERDICT_COLUMNS)
+        for chunk in iter_synthetic(rows, **kwargs):
+            epoch = pd.to_datetime(chunk['timestamp']).to_numpy().astype('datetime64[s]').astype(np.int64)
+            columns = zip(
+                chunk['timestamp'], chunk['status'], chunk['count'].tolist(),
+                epoch.tolist(), (epoch // 3600).tolist(), ((epoch // 3600) % 24).tolist(),
+            )
+            with conn:
+                conn.executemany(INSERT_TRANSACTION, (row + empty_verdict for row in columns))
+        if verdicts:
+            backfill_verdicts(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    # python synthetic_data.py --rows 1000000 --db /tmp/bench.db (ou --csv saida.csv)
+    parser = argparse.ArgumentParser(description="Generate transactions shaped like data/transactions.csv")
+    parser.add_argument('--rows', type=int, default=25920)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', type=datetime.fromisoformat, default=None,
+                        help=f"timestamp of the last minute (default: {DEFAULT_END.isoformat()})")
+    parser.add_argument('--csv', help="write a CSV instead of a database")
+    parser.add_argument('--db', help="build a transactions DB (schema, indexes and hourly_stats)")
+    parser.add_argument('--verdicts', action='store_true', help="also score every row (slow for large DBs)")
+    args = parser.parse_args()
+    if not args.csv and not args.db:
+        parser.error("pass --csv and/or --db")
+    if args.csv:
+        print(f"Wrote {write_csv(args.csv, args.rows, end=args.end, seed=args.seed)} rows to {args.csv}")
+    if args.db:
+        elapsed = build_database(args.db, args.rows, verdicts=args.verdicts, end=args.end, seed=args.seed)
+        print(f"Built {args.db} with {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
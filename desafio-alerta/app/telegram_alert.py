@@ -2,9 +2,20 @@ import requests
 import sys
 import os
 
-def send_telegram_alert(status, detected_at, current_count):
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org") # Permite apontar para um servidor local nos testes
+TELEGRAM_TIMEOUT = float(os.environ.get("TELEGRAM_TIMEOUT", 10))
+
+
+TITLES = {
+    'started': "🚨 <b>ANOMALY ALERT - Transaction {status}</b>",
+    'ongoing': "⏳ <b>ANOMALY ONGOING - Transaction {status}</b>",
+    'resolved': "✅ <b>ANOMALY RESOLVED - Transaction {status}</b>",
+}
+
+
+def build_telegram_request(status, detected_at, current_count, kind='started', details=None):
     """
-    Send the alert
+    Build the sendMessage URL and payload for an alert
     """
 #Important Security Notice:
 #The bot token and Chat ID were initially hardcoded for quick testing and demonstration purposes. However, for security reasons and best practices, after the test the token was immediately revoked.
@@ -15,28 +26,47 @@ def send_telegram_alert(status, detected_at, current_count):
 
 
     message_text = (
-        f"🚨 <b>ANOMALY ALERT - Transaction {status.upper()}</b>\n\n"
+        TITLES[kind].format(status=status.upper()) + "\n\n"
         f"<b>Status:</b> {status}\n"
         f"<b>Detected at:</b> {detected_at}\n"
-        f"<b>Current count:</b> {current_count}\n\n"
-        f"Verify the dashboard."
+        f"<b>Current count:</b> {current_count}\n"
     )
+    # Resumo do incidente (alertas agrupados pelo AlertManager)
+    for label, value in (details or {}).items():
+        message_text += f"<b>{label}:</b> {value}\n"
+    message_text += "\nVerify the dashboard."
 
-    telegram_api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    telegram_api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage"
 
     payload = {
         'chat_id': chat_id,
         'text': message_text,
         'parse_mode': 'HTML'
     }
+    return telegram_api_url, payload
 
+
+def post_telegram_alert(session, status, detected_at, current_count, kind='started', details=None):
+    """
+    Send the alert through an existing (pooled) session; raises on failure
+    """
+    telegram_api_url, payload = build_telegram_request(status, detected_at, current_count, kind, details)
+    response = session.post(telegram_api_url, json=payload, timeout=TELEGRAM_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+def send_telegram_alert(status, detected_at, current_count):
+    """
+    Send the alert
+    """
     try:
-        response = requests.post(telegram_api_url, json=payload)
-        response.raise_for_status()
+        post_telegram_alert(requests, status, detected_at, current_count)
         print(f"✅ Alerta enviado para o Telegram: {status}")
     except requests.exceptions.RequestException as e:
         print(f"❌ Erro ao enviar alerta para o Telegram: {e}")
-        print("Resposta:", response.text)
+        if e.response is not None:
+            print("Resposta:", e.response.text)
 
 if __name__ == '__main__':
     if len(sys.argv) != 4:
@@ -1,10 +1,25 @@
+import atexit
+import json
 import os
 import sqlite3
-import statistics
+import time
 from datetime import datetime, timedelta
-from threading import Thread
-import subprocess
-from flask import Flask, request, jsonify, g, send_from_directory # Import send_from_directory
+from flask import Flask, Response, request, jsonify, g, send_from_directory # Import send_from_directory
+
+from alert_dispatcher import AlertDispatcher, EmailChannel, TelegramChannel
+from alert_state import AlertManager
+from baseline import BaselineEngine, moments, summarize
+from batch_scoring import score_batch
+from compaction import CompactionJob, aggregate_stats, compacted_until
+from detectors import DetectorRegistry, parse_assignments
+from events import EventHub, format_sse
+from ingest_buffer import ReadPool, WriteBehindWriter
+from metrics import CONTENT_TYPE, Registry, SlowRequestProfiler
+from response_cache import ResponseCache
+from schema import (
+    INSERT_AUTH_CODE, INSERT_TRANSACTION, bucket_columns, ensure_schema, from_epoch, normalize_auth_code,
+    parse_timestamp, to_epoch,
+)
 
 # Configuration
 APP_DIR = os.path.dirname(__file__) # Adicionado para referência de caminho
@@ -13,10 +28,49 @@ STD_MULTIPLIER = float(os.environ.get('STD_MULTIPLIER', 3))
 HISTORY_LIMIT = int(os.environ.get('HISTORY_LIMIT', 7))
 MIN_HISTORY_POINTS = int(os.environ.get('MIN_HISTORY_POINTS', 3))
 FALLBACK_DAYS = int(os.environ.get('FALLBACK_DAYS', 7))
+BASELINE_MAX_BUCKETS = int(os.environ.get('BASELINE_MAX_BUCKETS', 4096))
+STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', 15))
+ALERT_WORKERS = int(os.environ.get('ALERT_WORKERS', 2))
+ALERT_QUEUE_SIZE = int(os.environ.get('ALERT_QUEUE_SIZE', 1000))
+ALERT_RESOLVE_AFTER = float(os.environ.get('ALERT_RESOLVE_AFTER', 300))
+ALERT_DIGEST_INTERVAL = float(os.environ.get('ALERT_DIGEST_INTERVAL', 300))
+ALERT_RATE_PER_MINUTE = float(os.environ.get('ALERT_RATE_PER_MINUTE', 6))
+ALERT_BURST = int(os.environ.get('ALERT_BURST', 3))
+INGEST_MAX_BATCH = int(os.environ.get('INGEST_MAX_BATCH', 1000))
+INGEST_MAX_DELAY_MS = float(os.environ.get('INGEST_MAX_DELAY_MS', 2))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 100000))
+INGEST_SYNCHRONOUS = os.environ.get('INGEST_SYNCHRONOUS', 'NORMAL')
+INGEST_WAIT = os.environ.get('INGEST_WAIT', '0') == '1'
+INGEST_WAIT_TIMEOUT = float(os.environ.get('INGEST_WAIT_TIMEOUT', 10))
+READ_POOL_SIZE = int(os.environ.get('READ_POOL_SIZE', 8))
+# Detector por status, ex.: DETECTORS="denied=ewma,reversed=mad,failed=seasonal";
+# status sem entrada usam o baseline de média/desvio do check_anomaly
+DETECTORS = os.environ.get('DETECTORS', '')
+EWMA_ALPHA = float(os.environ.get('EWMA_ALPHA', 0.05))
+SEASONAL_ALPHA = float(os.environ.get('SEASONAL_ALPHA', 0.1))
+MAD_WINDOW = int(os.environ.get('MAD_WINDOW', 60))
+DETECTOR_WARM_ROWS = int(os.environ.get('DETECTOR_WARM_ROWS', 10000))
+DETECTOR_SAVE_INTERVAL = float(os.environ.get('DETECTOR_SAVE_INTERVAL', 60))
+# Retenção: minutos brutos por RETENTION_RAW_DAYS dias, agregados por hora por
+# RETENTION_HOURLY_DAYS e por dia depois disso (0 = manter para sempre)
+RETENTION_RAW_DAYS = float(os.environ.get('RETENTION_RAW_DAYS', 30))
+RETENTION_HOURLY_DAYS = float(os.environ.get('RETENTION_HOURLY_DAYS', 365))
+COMPACTION_INTERVAL = float(os.environ.get('COMPACTION_INTERVAL', 3600)) # 0 desliga o job
+COMPACTION_BATCH_ROWS = int(os.environ.get('COMPACTION_BATCH_ROWS', 5000))
+# Profiler opcional: perfila PROFILE_SAMPLE_RATE das requisições e grava o
+# .prof das que passarem de PROFILE_SLOW_MS (0 desliga)
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.abspath(os.path.join(APP_DIR, '..', 'data', 'profiles')))
+METRICS_ROWCOUNT_TTL = float(os.environ.get('METRICS_ROWCOUNT_TTL', 60))
 ALERT_STATUSES = {'approved', 'failed', 'denied', 'reversed'}
+# Códigos de autorização que não geram alerta (00 = aprovada)
+AUTH_CODE_ALERT_EXCLUDE = {
+    normalize_auth_code(code) for code in os.environ.get('AUTH_CODE_ALERT_EXCLUDE', '00').split(',') if code.strip()
+}
 
 # Flask app factory
-def create_app():
+def create_app(config: dict = None):
     app = Flask(__name__)
     app.config.from_mapping(
         DB_PATH=DB_PATH,
@@ -25,66 +79,295 @@ def create_app():
         MIN_HISTORY_POINTS=MIN_HISTORY_POINTS,
         FALLBACK_DAYS=FALLBACK_DAYS,
         ALERT_STATUSES=ALERT_STATUSES,
+        AUTH_CODE_ALERT_EXCLUDE=AUTH_CODE_ALERT_EXCLUDE,
+        BASELINE_MAX_BUCKETS=BASELINE_MAX_BUCKETS,
+        STREAM_KEEPALIVE=STREAM_KEEPALIVE,
+        ALERT_WORKERS=ALERT_WORKERS,
+        ALERT_QUEUE_SIZE=ALERT_QUEUE_SIZE,
+        ALERT_RESOLVE_AFTER=ALERT_RESOLVE_AFTER,
+        ALERT_DIGEST_INTERVAL=ALERT_DIGEST_INTERVAL,
+        ALERT_RATE_PER_MINUTE=ALERT_RATE_PER_MINUTE,
+        ALERT_BURST=ALERT_BURST,
+        INGEST_MAX_BATCH=INGEST_MAX_BATCH,
+        INGEST_MAX_DELAY_MS=INGEST_MAX_DELAY_MS,
+        INGEST_QUEUE_SIZE=INGEST_QUEUE_SIZE,
+        INGEST_SYNCHRONOUS=INGEST_SYNCHRONOUS,
+        INGEST_WAIT=INGEST_WAIT,
+        INGEST_WAIT_TIMEOUT=INGEST_WAIT_TIMEOUT,
+        READ_POOL_SIZE=READ_POOL_SIZE,
+        DETECTORS=DETECTORS,
+        EWMA_ALPHA=EWMA_ALPHA,
+        SEASONAL_ALPHA=SEASONAL_ALPHA,
+        MAD_WINDOW=MAD_WINDOW,
+        DETECTOR_WARM_ROWS=DETECTOR_WARM_ROWS,
+        DETECTOR_SAVE_INTERVAL=DETECTOR_SAVE_INTERVAL,
+        RETENTION_RAW_DAYS=RETENTION_RAW_DAYS,
+        RETENTION_HOURLY_DAYS=RETENTION_HOURLY_DAYS,
+        COMPACTION_INTERVAL=COMPACTION_INTERVAL,
+        COMPACTION_BATCH_ROWS=COMPACTION_BATCH_ROWS,
+        PROFILE_SLOW_MS=PROFILE_SLOW_MS,
+        PROFILE_SAMPLE_RATE=PROFILE_SAMPLE_RATE,
+        PROFILE_DIR=PROFILE_DIR,
+        METRICS_ROWCOUNT_TTL=METRICS_ROWCOUNT_TTL,
     )
+    if config:
+        app.config.update(config) # Ex.: DB_PATH de outro banco (benchmark.py)
+    # Com vários processos (cluster.py), cada status tem um worker dono
+    cluster = app.config.get('CLUSTER')
+
+    def scoring_params() -> dict:
+        return {
+            'history_limit': app.config['HISTORY_LIMIT'],
+            'min_history_points': app.config['MIN_HISTORY_POINTS'],
+            'std_multiplier': app.config['STD_MULTIPLIER'],
+        }
+
+    # Baseline residente em memória: aquecido uma vez a partir do SQLite e
+    # atualizado a cada inserção, para que check_anomaly não consulte o banco.
+    baseline = BaselineEngine(app.config['HISTORY_LIMIT'], app.config['BASELINE_MAX_BUCKETS'])
+    # O mesmo engine, chaveado por código, para o fluxo de auth_codes
+    code_baseline = BaselineEngine(app.config['HISTORY_LIMIT'], app.config['BASELINE_MAX_BUCKETS'])
+    # Detectores de streaming (EWMA, mediana/MAD, sazonal) dos status configurados;
+    # em cluster, só os dos status deste worker (os outros nunca salvam estado velho)
+    assignments = parse_assignments(app.config['DETECTORS'])
+    if cluster is not None:
+        assignments = {status: kind for status, kind in assignments.items() if cluster.owns(status)}
+    detectors = DetectorRegistry(
+        assignments,
+        {
+            'ewma': {'alpha': app.config['EWMA_ALPHA']},
+            'seasonal': {'alpha': app.config['SEASONAL_ALPHA']},
+            'mad': {'window': app.config['MAD_WINDOW']},
+        },
+        std_multiplier=app.config['STD_MULTIPLIER'],
+        min_history_points=app.config['MIN_HISTORY_POINTS'],
+    )
+    os.makedirs(os.path.dirname(app.config['DB_PATH']), exist_ok=True)
+    conn = sqlite3.connect(app.config['DB_PATH'], timeout=10)
+    try:
+        ensure_schema(conn, scoring_params()) # Migra bancos antigos para as colunas indexadas
+        baseline.warm(conn)
+        code_baseline.warm(conn, 'auth_codes', 'auth_code')
+        restored = detectors.load(conn)
+        detectors.warm(conn, set(detectors.detectors) - restored, app.config['DETECTOR_WARM_ROWS'])
+    finally:
+        conn.close()
+    app.extensions['baseline'] = baseline
+    app.extensions['auth_code_baseline'] = code_baseline
+    app.extensions['detectors'] = detectors
+
+    # Canal de eventos para os dashboards conectados (SSE em /dashboard_stream)
+    events = EventHub() if cluster is None else EventHub(boot_id=cluster.boot_id, allocate=cluster.allocate)
+    app.extensions['events'] = events
+    # Corpo de /dashboard_data já serializado e gzipado, pela mesma chave da ETag
+    dashboard_cache = ResponseCache()
+    app.extensions['dashboard_cache'] = dashboard_cache
+
+    # Métricas no formato do Prometheus (/metrics): contadores e histogramas
+    # em memória, atualizados no caminho quente com custo de um lock
+    registry = Registry()
+    app.extensions['metrics'] = registry
+    request_count = registry.counter(
+        'monitor_http_requests_total', "HTTP requests by route, method and status code", ('route', 'method', 'code'))
+    request_latency = registry.histogram(
+        'monitor_http_request_duration_seconds', "HTTP request latency by route", ('route', 'method'))
+    history_latency = registry.histogram(
+        'monitor_history_query_seconds', "SQL history lookups (baseline not resident)", ('query',))
+    persist_latency = registry.histogram(
+        'monitor_persist_seconds', "Time a request spends handing rows to the writer (and waiting, with ?wait=1)",
+        ('table',))
+    commit_latency = registry.histogram('monitor_writer_commit_seconds', "Group commit duration of the writer")
+    alert_latency = registry.histogram('monitor_trigger_alerts_seconds', "Time spent in trigger_alerts")
+    points_total = registry.counter('monitor_points_total', "Points committed", ('table',))
+    anomalies_total = registry.counter(
+        'monitor_anomalies_total', "Committed points flagged as anomalous", ('status', 'severity'))
+    alerts_total = registry.counter(
+        'monitor_alerts_triggered_total', "High-severity anomalies handed to the alert manager", ('status',))
+    profiler = SlowRequestProfiler(
+        app.config['PROFILE_SLOW_MS'], app.config['PROFILE_SAMPLE_RATE'], app.config['PROFILE_DIR']
+    )
+
+    # Escrita write-behind: as requisições só enfileiram as linhas; uma thread
+    # com conexão própria (WAL) grava em group commits. Leituras usam um pool
+    # de conexões somente leitura.
+    writer = WriteBehindWriter(
+        app.config['DB_PATH'],
+        INSERT_TRANSACTION,
+        max_batch=app.config['INGEST_MAX_BATCH'],
+        max_delay=app.config['INGEST_MAX_DELAY_MS'] / 1000,
+        queue_size=app.config['INGEST_QUEUE_SIZE'],
+        synchronous=app.config['INGEST_SYNCHRONOUS'],
+        on_commit=lambda conn, written: after_commit(conn, written),
+        observe_commit=lambda seconds, rows: commit_latency.observe(seconds),
+    )
+    app.extensions['writer'] = writer
+    # Encerramento na ordem inversa da criação: no atexit ou explícito, via
+    # app.extensions['close'] (cluster.py, benchmark.py)
+    closers = [writer.close]
+    last_detector_save = time.monotonic()
+
+    def save_detectors():
+        # Na saída, com conexão própria (roda antes de writer.close)
+        conn = sqlite3.connect(app.config['DB_PATH'], timeout=10)
+        try:
+            detectors.save(conn)
+        finally:
+            conn.close()
+
+    closers.append(save_detectors)
+    read_pool = ReadPool(app.config['DB_PATH'], app.config['READ_POOL_SIZE'])
+    app.extensions['read_pool'] = read_pool
+    closers.append(read_pool.close)
+
+    # Envio de alertas em processo: fila limitada + pool de workers, com sessão
+    # HTTP do Telegram e conexão SMTP reaproveitadas entre alertas.
+    dispatcher = AlertDispatcher(
+        [EmailChannel(), TelegramChannel(pool_size=app.config['ALERT_WORKERS'])],
+        workers=app.config['ALERT_WORKERS'],
+        queue_size=app.config['ALERT_QUEUE_SIZE'],
+    )
+    app.extensions['alert_dispatcher'] = dispatcher
+    closers.append(dispatcher.close)
+
+    # Um incidente por status: 'started', resumos periódicos e 'resolved',
+    # com limite de envio por canal
+    alert_manager = AlertManager(
+        dispatcher,
+        resolve_after=app.config['ALERT_RESOLVE_AFTER'],
+        digest_interval=app.config['ALERT_DIGEST_INTERVAL'],
+        rate_per_minute=app.config['ALERT_RATE_PER_MINUTE'],
+        burst=app.config['ALERT_BURST'],
+    )
+    app.extensions['alert_manager'] = alert_manager
+    closers.append(alert_manager.close)
+
+    # Retenção em segundo plano: apaga brutos antigos e rola horas em dias,
+    # em transações curtas para não segurar o writer
+    if app.config['COMPACTION_INTERVAL'] > 0:
+        compaction = CompactionJob(
+            app.config['DB_PATH'],
+            app.config['RETENTION_RAW_DAYS'],
+            app.config['RETENTION_HOURLY_DAYS'],
+            interval=app.config['COMPACTION_INTERVAL'],
+            batch_rows=app.config['COMPACTION_BATCH_ROWS'],
+        )
+        app.extensions['compaction'] = compaction
+        closers.append(compaction.close)
+
+    def close_app():
+        # Idempotente: quem chamar primeiro fecha, o atexit depois não faz nada
+        while closers:
+            closers.pop()()
+
+    app.extensions['close'] = close_app
+    atexit.register(close_app)
 
     @app.before_request
     def get_db():
+        g.started = time.perf_counter()
+        g.profiler = profiler.start()
         if 'db' not in g:
-            g.db = sqlite3.connect(app.config['DB_PATH'], timeout=10)
-            g.db.row_factory = sqlite3.Row # Permite acesso por nome de coluna
+            g.db = read_pool.acquire() # Conexão somente leitura do pool
+
+    @app.after_request
+    def observe_request(response):
+        elapsed = time.perf_counter() - g.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_count.inc(route=route, method=request.method, code=response.status_code)
+        request_latency.observe(elapsed, route=route, method=request.method)
+        if g.profiler is not None:
+            profiler.finish(g.profiler, elapsed, f"{request.method} {route}")
+        return response
 
     @app.teardown_appcontext
     def close_db(exception=None):
         db = g.pop('db', None)
         if db is not None:
-            db.close()
+            read_pool.release(db)
 
     def fetch_history(status: str, timestamp: datetime, exclude_current: bool = True) -> list[int]:
-        # Same-day, same-hour history
-        hour_start = timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
-        day = timestamp.strftime('%Y-%m-%d')
+        # Same-day, same-hour history (range scan on idx_transactions_status_hour_bucket)
+        epoch, hour_bucket, _ = bucket_columns(timestamp)
         query = (
             "SELECT count FROM transactions "
             "WHERE status = ? "
-            "AND strftime('%Y-%m-%dT%H:00:00', timestamp) = ? "
-            "AND strftime('%Y-%m-%d', timestamp) = ? "
+            "AND hour_bucket = ? "
         )
-        params = [status, hour_start, day]
+        params = [status, hour_bucket]
         if exclude_current:
-            query += "AND timestamp < ? "
-            params.append(timestamp.isoformat())
-        query += "ORDER BY timestamp DESC LIMIT ?"
+            query += "AND ts < ? "
+            params.append(epoch)
+        query += "ORDER BY ts DESC LIMIT ?"
         params.append(app.config['HISTORY_LIMIT'])
-        cur = g.db.execute(query, tuple(params))
-        return [row['count'] for row in cur.fetchall()]
+        writer.wait_written(app.config['INGEST_WAIT_TIMEOUT']) # O SQL precisa ver os pontos ainda na fila
+        with history_latency.time(query='same_hour'):
+            return [row['count'] for row in g.db.execute(query, tuple(params)).fetchall()]
 
     def fetch_history_across_days(status: str, timestamp: datetime) -> list[int]:
-        # Same hour across previous days
-        hour = timestamp.strftime('%H')
-        cutoff = timestamp.isoformat()
+        # Same hour across previous days (range scan on idx_transactions_status_hour_of_day)
+        cutoff, _, hour = bucket_columns(timestamp)
         query = (
             "SELECT count FROM transactions "
             "WHERE status = ? "
-            "AND strftime('%H', timestamp) = ? "
-            "AND timestamp < ? "
-            "ORDER BY timestamp DESC LIMIT ?"
+            "AND hour_of_day = ? "
+            "AND ts < ? "
+            "ORDER BY ts DESC LIMIT ?"
         )
         # allow up to HISTORY_LIMIT * FALLBACK_DAYS to gather enough
         limit = app.config['HISTORY_LIMIT'] * app.config['FALLBACK_DAYS']
-        cur = g.db.execute(query, (status, hour, cutoff, limit))
-        counts = [row['count'] for row in cur.fetchall()]
+        writer.wait_written(app.config['INGEST_WAIT_TIMEOUT'])
+        with history_latency.time(query='across_days'):
+            counts = [row['count'] for row in g.db.execute(query, (status, hour, cutoff, limit)).fetchall()]
         return counts[:app.config['HISTORY_LIMIT']]
 
+    def history_stats(status: str, ts: datetime, level: str) -> tuple[int, float, float]:
+        # Fallback SQL: as linhas brutas ou, para pontos mais antigos que a
+        # retenção, as camadas agregadas (hourly_stats / daily_stats)
+        writer.wait_written(app.config['INGEST_WAIT_TIMEOUT'])
+        if to_epoch(ts) < compacted_until(g.db, 'transactions')['raw']:
+            with history_latency.time(query='aggregate'):
+                return aggregate_stats(g.db, 'transactions', status, level, ts, app.config['FALLBACK_DAYS'])
+        if level == 'hour':
+            return summarize(fetch_history(status, ts))
+        return summarize(fetch_history_across_days(status, ts))
+
     def check_anomaly(status: str, current_ts: str, count: int) -> tuple[bool, float, float, float]:
-        ts = datetime.fromisoformat(current_ts)
-        history = fetch_history(status, ts)
-        if len(history) < app.config['MIN_HISTORY_POINTS']:
-            history = fetch_history_across_days(status, ts)
-        if len(history) < app.config['MIN_HISTORY_POINTS']:
+        ts = parse_timestamp(current_ts)
+        # O engine responde em O(1); o SQL só é usado quando a janela não está residente
+        stats = baseline.same_hour_stats(status, ts)
+        if stats is None:
+            stats = history_stats(status, ts, 'hour')
+        if stats[0] < app.config['MIN_HISTORY_POINTS']:
+            stats = baseline.hour_of_day_stats(status, ts)
+            if stats is None:
+                stats = history_stats(status, ts, 'hour_of_day')
+        if stats[0] < app.config['MIN_HISTORY_POINTS']:
+            return False, None, None, None
+
+        _, mean, std = stats
+        threshold = mean + app.config['STD_MULTIPLIER'] * std
+        return count > threshold, mean, std, threshold
+
+    def check_compacted(engine: BaselineEngine, source: str, value: str, ts: datetime,
+                        count: int) -> tuple[bool, float, float, float]:
+        # Pontos de um lote mais antigos que a retenção bruta: janela residente
+        # ou camadas agregadas, já que o scorer do lote precisa das linhas
+        days = app.config['FALLBACK_DAYS']
+        stats = engine.same_hour_stats(value, ts)
+        if stats is None:
+            writer.wait_written(app.config['INGEST_WAIT_TIMEOUT']) # Os agregados vêm dos triggers do writer
+            with history_latency.time(query='aggregate'):
+                stats = aggregate_stats(g.db, source, value, 'hour', ts, days)
+        if stats[0] < app.config['MIN_HISTORY_POINTS']:
+            stats = engine.hour_of_day_stats(value, ts)
+            if stats is None:
+                writer.wait_written(app.config['INGEST_WAIT_TIMEOUT'])
+                with history_latency.time(query='aggregate'):
+                    stats = aggregate_stats(g.db, source, value, 'hour_of_day', ts, days)
+        if stats[0] < app.config['MIN_HISTORY_POINTS']:
             return False, None, None, None
 
-        mean = statistics.mean(history)
-        std = statistics.stdev(history)
+        _, mean, std = stats
         threshold = mean + app.config['STD_MULTIPLIER'] * std
         return count > threshold, mean, std, threshold
 
@@ -98,53 +381,154 @@ def create_app():
             return "medium"
         return "low"
 
-    def trigger_alerts(status: str, timestamp: str, count: int):
-        try:
-            # Assumindo que email_alert.py e telegram_alert.py estão na mesma pasta do endpoint
-            email_script_path = os.path.join(APP_DIR, 'email_alert.py')
-            telegram_script_path = os.path.join(APP_DIR, 'telegram_alert.py')
+    def metric_row(hour_bucket: int, status: str, n: int, total: int, total_sq: int, key: str = "status") -> dict:
+        avg, std = moments(n, total, total_sq)
+        threshold = avg + app.config['STD_MULTIPLIER'] * std
+        return {
+            "hour_window": from_epoch(hour_bucket * 3600).strftime('%Y-%m-%dT%H:00:00'),
+            key: status,
+            "mean_count": round(avg, 2),
+            "std_count": round(std, 2),
+            "max_normal_value": round(threshold, 2),
+            "num_points": n
+        }
 
-            subprocess.Popen(["python", email_script_path, status, timestamp, str(count)])
-            subprocess.Popen(["python", telegram_script_path, status, timestamp, str(count)])
-            app.logger.info(f"Alert fired for {status} at {timestamp} ({count})")
+    def ingest_events(conn: sqlite3.Connection, rows: list[tuple]) -> list[tuple]:
+        # Transações gravadas, alertas e as linhas de hourly_stats alteradas
+        published = []
+        for timestamp, status, count, _, hour_bucket, _, alert, severity, *_ in rows:
+            transaction = {
+                "timestamp": timestamp,
+                "status": status,
+                "count": count,
+                "alert": bool(alert),
+                "severity": severity
+            }
+            published.append(("transaction", transaction))
+            if alert:
+                published.append(("alert", transaction))
+        for hour_bucket, status in sorted({(row[4], row[1]) for row in rows}):
+            row = conn.execute(
+                "SELECT n, total, total_sq FROM hourly_stats WHERE hour_bucket = ? AND status = ?",
+                (hour_bucket, status)
+            ).fetchone()
+            if row is not None:
+                published.append(("hourly", metric_row(hour_bucket, status, *row)))
+        return published
+
+    def auth_code_events(conn: sqlite3.Connection, rows: list[tuple]) -> list[tuple]:
+        # Pontos de auth_codes gravados e as linhas de auth_code_hourly_stats alteradas
+        published = []
+        for timestamp, code, count, _, hour_bucket, _, alert, severity, *_ in rows:
+            published.append(("auth_code", {
+                "timestamp": timestamp,
+                "auth_code": code,
+                "count": count,
+                "alert": bool(alert),
+                "severity": severity
+            }))
+        for hour_bucket, code in sorted({(row[4], row[1]) for row in rows}):
+            row = conn.execute(
+                "SELECT n, total, total_sq FROM auth_code_hourly_stats WHERE hour_bucket = ? AND auth_code = ?",
+                (hour_bucket, code)
+            ).fetchone()
+            if row is not None:
+                published.append(("auth_code_hourly", metric_row(hour_bucket, code, *row, key="auth_code")))
+        return published
+
+    def persist(rows: list[tuple], sql: str = INSERT_TRANSACTION):
+        # Enfileira no writer; com INGEST_WAIT (ou ?wait=1) espera o commit.
+        # Retorna uma mensagem de erro se a gravação falhou.
+        wait = request.args.get('wait')
+        try:
+            with persist_latency.time(table='auth_codes' if sql == INSERT_AUTH_CODE else 'transactions'):
+                pending = writer.submit(rows, timeout=app.config['INGEST_WAIT_TIMEOUT'], sql=sql)
+                if app.config['INGEST_WAIT'] if wait is None else wait.lower() in ('1', 'true'):
+                    pending.result(timeout=app.config['INGEST_WAIT_TIMEOUT'])
         except Exception as err:
-            app.logger.error(f"Failed to trigger alerts: {err}")
+            app.logger.error(f"Failed to persist {len(rows)} points: {err}")
+            return f"Failed to persist data: {err}"
+        return None
+
+    def after_commit(conn: sqlite3.Connection, written: dict):
+        # Roda na thread do writer após cada group commit, com a conexão dele:
+        # eventos do dashboard e, a cada DETECTOR_SAVE_INTERVAL segundos, o
+        # estado dos detectores
+        nonlocal last_detector_save
+        for sql, rows in written.items():
+            auth = sql == INSERT_AUTH_CODE
+            points_total.inc(len(rows), table='auth_codes' if auth else 'transactions')
+            for row in rows:
+                if row[6]:
+                    anomalies_total.inc(status=f"auth_code {row[1]}" if auth else row[1], severity=row[7])
+        published = (
+            ingest_events(conn, written.get(INSERT_TRANSACTION, []))
+            + auth_code_events(conn, written.get(INSERT_AUTH_CODE, []))
+        )
+        first = events.publish_many(published)
+        if cluster is not None:
+            cluster.broadcast(first, published) # Dashboards conectados aos outros workers
+        if detectors.detectors and time.monotonic() - last_detector_save >= app.config['DETECTOR_SAVE_INTERVAL']:
+            last_detector_save = time.monotonic()
+            detectors.save(conn)
+
+    def score_point(status: str, timestamp: str, ts: datetime, count: int) -> tuple[bool, float, float, float]:
+        # Detector de streaming do status (sem SQL) ou o baseline padrão;
+        # nenhum dos dois muda até o ponto ser aceito pelo writer (absorb_points)
+        if detectors.get(status) is None:
+            return check_anomaly(status, timestamp, count)
+        return detectors.score(status, [(ts, count)])[0]
+
+    def absorb_points(points: list):
+        # Só depois do persist, ou seja, depois de enfileirar (e do commit
+        # só com INGEST_WAIT / ?wait=1): um ponto recusado pelo writer não
+        # entra no baseline nem nos detectores, e o próximo ponto já é
+        # pontuado contra este mesmo antes do commit. Sem espera, se o group
+        # commit falhar depois, o ponto fica na memória sem estar no banco
+        # (o writer registra o erro). `points` em ordem de tempo
+        by_detector = {}
+        for status, ts, count in points:
+            baseline.add(status, ts, count)
+            if detectors.get(status) is not None:
+                by_detector.setdefault(status, []).append((ts, count))
+        for status, detector_points in by_detector.items():
+            detectors.absorb(status, detector_points)
 
-    # --- ROTA EXISTENTE: receive_transaction ---
-    @app.route("/receive_transaction", methods=["POST"])
-    def receive_transaction():
-        data = request.get_json(force=True)
+    def trigger_alerts(status: str, timestamp: str, count: int):
+        # O AlertManager decide se vira alerta novo, resumo ou nada; o envio
+        # acontece nos workers do dispatcher
+        with alert_latency.time():
+            alert_manager.observe(status, timestamp, count)
+        alerts_total.inc(status=status)
+        app.logger.info(f"Alert fired for {status} at {timestamp} ({count})")
+
+    def validate_point(data) -> tuple[tuple, str]:
+        # Retorna ((timestamp, status, count, ts), None) ou (None, mensagem de erro)
+        if not isinstance(data, dict):
+            return None, "Each point must be a JSON object"
         timestamp = data.get('timestamp')
         status = data.get('status')
         count = data.get('count')
 
-        # Input validation
         if not timestamp or not status or count is None:
-            return jsonify(error="Missing 'timestamp', 'status', or 'count'"), 400
+            return None, "Missing 'timestamp', 'status', or 'count'"
+        # Tipos antes do teste de pertinência: uma lista ou um dict como status
+        # daria TypeError (500 para o lote inteiro) em vez de rejeitar o ponto
+        if not isinstance(timestamp, str) or not isinstance(status, str):
+            return None, "'timestamp' and 'status' must be strings"
+        if isinstance(count, bool) or not isinstance(count, (int, float, str)):
+            return None, "'count' must be a number"
         if status not in app.config['ALERT_STATUSES'] and status != 'approved': # Incluir 'approved' para processamento, mesmo se não for alertável no trigger
-            return jsonify(error=f"Unsupported status '{status}'"), 400
+            return None, f"Unsupported status '{status}'"
         try:
             count = int(count)
-            datetime.fromisoformat(timestamp)
+            ts = parse_timestamp(timestamp)
         except Exception as e:
-            return jsonify(error=f"Invalid data format: {e}"), 400
-
-        # Check anomaly before insertion
-        alert, mean, std, threshold = check_anomaly(status, timestamp, count)
-        severity = calculate_severity(count, mean, std) if mean is not None else "unknown"
-
-        # Persist and respond
-        g.db.execute(
-            "INSERT INTO transactions(timestamp, status, count) VALUES (?, ?, ?)",
-            (timestamp, status, count)
-        )
-        g.db.commit()
-
-        # Trigger alerts ONLY for statuses in ALERT_STATUSES AND severity 'high'
-        if status in app.config['ALERT_STATUSES'] and alert and severity == "high":
-            trigger_alerts(status, timestamp, count)
+            return None, f"Invalid data format: {e}"
+        return (timestamp, status, count, ts), None
 
-        response = {
+    def build_response(status: str, alert: bool, severity: str, mean: float, std: float, threshold: float) -> dict:
+        return {
             "alert": alert,
             "status": status,
             "severity": severity,
@@ -158,139 +542,462 @@ def create_app():
                 if alert else "Transaction within normal range"
             )
         }
-        return jsonify(response)
 
+    # --- ROTA EXISTENTE: receive_transaction ---
+    @app.route("/receive_transaction", methods=["POST"])
+    def receive_transaction():
+        data = request.get_json(force=True)
+
+        # Input validation
+        point, error = validate_point(data)
+        if error:
+            return jsonify(error=error), 400
+        timestamp, status, count, ts = point
+
+        # Check anomaly before insertion
+        alert, mean, std, threshold = score_point(status, timestamp, ts, count)
+        severity = calculate_severity(count, mean, std) if mean is not None else "unknown"
+
+        # Persist (com o veredicto) and respond
+        error = persist([(timestamp, status, count, *bucket_columns(ts), int(alert), severity, mean, std, threshold)])
+        if error:
+            return jsonify(error=error), 503
+        absorb_points([(status, ts, count)])
+
+        # Trigger alerts ONLY for statuses in ALERT_STATUSES AND severity 'high'
+        if status in app.config['ALERT_STATUSES'] and alert and severity == "high":
+            trigger_alerts(status, timestamp, count)
+
+        return jsonify(build_response(status, alert, severity, mean, std, threshold))
+
+    def history_source(engine: BaselineEngine, table: str, key_column: str):
+        def history(key: tuple, min_ts: int, max_ts: int) -> tuple[list[int], list[int]]:
+            # Histórico de um grupo do lote: janela residente quando ela responde
+            # exatamente, senão as HISTORY_LIMIT linhas antes do lote mais as do
+            # intervalo do lote, ambas por range scan nos índices.
+            level, value, bucket = key
+            resident = engine.window_points(level, value, bucket)
+            if resident is not None:
+                points, evicted = resident
+                if not evicted or min_ts > points[-1][0]:
+                    return [t for t, _ in points], [c for _, c in points]
+
+            column = 'hour_bucket' if level == 'hour' else 'hour_of_day'
+            writer.wait_written(app.config['INGEST_WAIT_TIMEOUT'])
+            with history_latency.time(query='batch'):
+                rows = g.db.execute(
+                    f"SELECT ts, count FROM {table} WHERE {key_column} = ? AND {column} = ? AND ts < ? "
+                    "ORDER BY ts DESC LIMIT ?",
+                    (value, bucket, min_ts, app.config['HISTORY_LIMIT'])
+                ).fetchall()
+                rows += g.db.execute(
+                    f"SELECT ts, count FROM {table} WHERE {key_column} = ? AND {column} = ? AND ts >= ? AND ts < ?",
+                    (value, bucket, min_ts, max_ts)
+                ).fetchall()
+            return [row['ts'] for row in rows], [row['count'] for row in rows]
+        return history
+
+    batch_history = history_source(baseline, 'transactions', 'status')
+    auth_code_history = history_source(code_baseline, 'auth_codes', 'auth_code')
+
+    def parse_batch_body():
+        # Aceita um array JSON ou NDJSON (um objeto por linha)
+        body = request.get_data(as_text=True)
+        if 'ndjson' in (request.mimetype or '') or not body.lstrip().startswith('['):
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        return json.loads(body)
+
+    # --- ROTA: receive_transactions (lote) ---
+    @app.route("/receive_transactions", methods=["POST"])
+    def receive_transactions():
+        try:
+            items = parse_batch_body()
+        except ValueError as e:
+            return jsonify(error=f"Invalid JSON body: {e}"), 400
+        if not isinstance(items, list):
+            return jsonify(error="Expected a JSON array or NDJSON body"), 400
+
+        results = [None] * len(items)
+        valid = []
+        for idx, data in enumerate(items):
+            point, error = validate_point(data)
+            if error:
+                results[idx] = {"error": error}
+            else:
+                valid.append((idx, *point))
+
+        if valid:
+            # Ordena por tempo para que cada ponto veja os anteriores do mesmo lote
+            valid.sort(key=lambda v: v[4])
+            columns = [bucket_columns(v[4]) for v in valid]
+            raw_until = compacted_until(g.db, 'transactions')['raw']
+            # Só os status no baseline padrão, dentro da retenção bruta, passam
+            # pelo scorer vetorizado
+            scored = [
+                pos for pos, v in enumerate(valid)
+                if detectors.get(v[2]) is None and columns[pos][0] >= raw_until
+            ]
+            scores = score_batch(
+                [valid[pos][2] for pos in scored],
+                [columns[pos][0] for pos in scored],
+                [valid[pos][3] for pos in scored],
+                batch_history,
+                app.config['HISTORY_LIMIT'],
+                app.config['MIN_HISTORY_POINTS'],
+                app.config['STD_MULTIPLIER'],
+            ) if scored else None
+
+            verdicts = [None] * len(valid)
+            for i, pos in enumerate(scored):
+                known = bool(scores['known'][i])
+                verdicts[pos] = (
+                    bool(scores['alert'][i]),
+                    str(scores['severity'][i]),
+                    float(scores['mean'][i]) if known else None,
+                    float(scores['std'][i]) if known else None,
+                    float(scores['threshold'][i]) if known else None,
+                )
+            # Detectores de streaming: os pontos de cada status em ordem de tempo
+            by_detector = {}
+            for pos, v in enumerate(valid):
+                if detectors.get(v[2]) is not None:
+                    by_detector.setdefault(v[2], []).append(pos)
+            streamed = {}
+            for status, positions in by_detector.items():
+                points = [(valid[pos][4], valid[pos][3]) for pos in positions]
+                streamed.update(zip(positions, detectors.score(status, points)))
+            for pos, (idx, timestamp, status, count, ts) in enumerate(valid):
+                if verdicts[pos] is None:
+                    # Detector de streaming ou ponto mais antigo que a retenção
+                    if pos in streamed:
+                        alert, mean, std, threshold = streamed[pos]
+                    else:
+                        alert, mean, std, threshold = check_compacted(baseline, 'transactions', status, ts, count)
+                    severity = calculate_severity(count, mean, std) if mean is not None else "unknown"
+                    verdicts[pos] = (alert, severity, mean, std, threshold)
+
+            # O lote inteiro vai num único executemany/transação do writer
+            error = persist([
+                (v[1], v[2], v[3], *c, int(alert), severity, mean, std, threshold)
+                for v, c, (alert, severity, mean, std, threshold) in zip(valid, columns, verdicts)
+            ])
+            if error:
+                return jsonify(error=error), 503
+            absorb_points([(status, ts, count) for idx, timestamp, status, count, ts in valid])
+
+            for (idx, timestamp, status, count, ts), verdict in zip(valid, verdicts):
+                alert, severity = verdict[:2]
+                if status in app.config['ALERT_STATUSES'] and alert and severity == "high":
+                    trigger_alerts(status, timestamp, count)
+                results[idx] = build_response(status, *verdict)
+
+        return jsonify(
+            accepted=len(valid),
+            rejected=len(items) - len(valid),
+            results=results,
+        )
+
+
+    def validate_auth_code_item(data) -> tuple[list, str]:
+        # Um ponto {"timestamp", "auth_code", "count"} ou o vetor de códigos de
+        # um minuto {"timestamp", "codes": {"51": 3, "59": 1, ...}}.
+        # Retorna ([(timestamp, auth_code, count, ts), ...], None) ou (None, erro).
+        if not isinstance(data, dict):
+            return None, "Each item must be a JSON object"
+        timestamp = data.get('timestamp')
+        codes = data.get('codes')
+        if codes is None:
+            if data.get('auth_code') is None or data.get('count') is None:
+                return None, "Missing 'auth_code' and 'count' (or a 'codes' object)"
+            codes = {data['auth_code']: data['count']}
+        if not timestamp or not isinstance(codes, dict) or not codes:
+            return None, "Missing 'timestamp' or 'codes'"
+        try:
+            ts = parse_timestamp(timestamp)
+            return [(timestamp, normalize_auth_code(code), int(count), ts) for code, count in codes.items()], None
+        except Exception as e:
+            return None, f"Invalid data format: {e}"
+
+    # --- ROTA: receive_auth_code (um código, o vetor de um minuto ou um lote) ---
+    @app.route("/receive_auth_code", methods=["POST"])
+    def receive_auth_code():
+        data = request.get_json(force=True, silent=True)
+        if data is None:
+            try:
+                data = parse_batch_body()
+            except ValueError as e:
+                return jsonify(error=f"Invalid JSON body: {e}"), 400
+        items = data if isinstance(data, list) else [data]
+
+        results = []
+        valid = []
+        for data in items:
+            points, error = validate_auth_code_item(data)
+            if error:
+                results.append({"error": error})
+                continue
+            for point in points:
+                valid.append((len(results), *point))
+                results.append(None)
+
+        if valid:
+            # Todos os códigos do lote num único passe vetorizado: o custo cresce
+            # com o nº de códigos, não com uma consulta por código
+            valid.sort(key=lambda v: v[4])
+            columns = [bucket_columns(v[4]) for v in valid]
+            raw_until = compacted_until(g.db, 'auth_codes')['raw']
+            scored = [pos for pos, c in enumerate(columns) if c[0] >= raw_until]
+            scores = score_batch(
+                [valid[pos][2] for pos in scored],
+                [columns[pos][0] for pos in scored],
+                [valid[pos][3] for pos in scored],
+                auth_code_history,
+                app.config['HISTORY_LIMIT'],
+                app.config['MIN_HISTORY_POINTS'],
+                app.config['STD_MULTIPLIER'],
+            ) if scored else None
+            verdicts = [None] * len(valid)
+            for i, pos in enumerate(scored):
+                known = bool(scores['known'][i])
+                verdicts[pos] = (
+                    bool(scores['alert'][i]),
+                    str(scores['severity'][i]),
+                    float(scores['mean'][i]) if known else None,
+                    float(scores['std'][i]) if known else None,
+                    float(scores['threshold'][i]) if known else None,
+                )
+            for pos, (idx, timestamp, code, count, ts) in enumerate(valid):
+                if verdicts[pos] is None:
+                    # Mais antigo que a retenção bruta: camadas agregadas
+                    alert, mean, std, threshold = check_compacted(code_baseline, 'auth_codes', code, ts, count)
+                    severity = calculate_severity(count, mean, std) if mean is not None else "unknown"
+                    verdicts[pos] = (alert, severity, mean, std, threshold)
+
+            error = persist([
+                (v[1], v[2], v[3], *c, int(alert), severity, mean, std, threshold)
+                for v, c, (alert, severity, mean, std, threshold) in zip(valid, columns, verdicts)
+            ], INSERT_AUTH_CODE)
+            if error:
+                return jsonify(error=error), 503
+            for idx, timestamp, code, count, ts in valid:
+                code_baseline.add(code, ts, count)
+
+            for (idx, timestamp, code, count, ts), verdict in zip(valid, verdicts):
+                alert, severity = verdict[:2]
+                if code not in app.config['AUTH_CODE_ALERT_EXCLUDE'] and alert and severity == "high":
+                    trigger_alerts(f"auth_code {code}", timestamp, count)
+                result = build_response(code, *verdict)
+                del result["status"]
+                results[idx] = {"timestamp": timestamp, "auth_code": code, **result}
+
+        return jsonify(
+            accepted=len(valid),
+            rejected=sum(1 for r in results if "error" in r),
+            results=results,
+        )
 
     # --- NOVA ROTA: get_dashboard_data ---
     @app.route("/dashboard_data", methods=["GET"])
     def get_dashboard_data():
-        try:
+        # A resposta só muda com novos dados ou com a virada da hora: a ETag
+        # combina os dois e um If-None-Match igual recebe 304 sem tocar no banco.
+        # Com a mesma chave, o corpo vem do dashboard_cache: N abas que fazem
+        # polling custam uma consulta por versão dos dados.
+        version = events.version
+        current_time_local = datetime.now() # Pega o tempo local (Brasil -03)
+        first_bucket = to_epoch(current_time_local - timedelta(hours=24)) // 3600
+        etag = f"{events.token(version)}-{first_bucket}"
+        if request.if_none_match.contains(etag):
+            not_modified = app.response_class(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+
+        def build() -> bytes:
             conn = g.db # Usar a conexão do g.db
             cursor = conn.cursor()
 
-            # Query para pegar os dados agregados por status e hora nos últimos 24 horas
-            # Usando datetime.now() e timedelta para o fuso horário correto (Brasil -03)
-            current_time_utc = datetime.utcnow() # Pega o tempo UTC
-            current_time_local = datetime.now() # Pega o tempo local (Brasil -03)
-
-            # Para os dados do dashboard, queremos ver as horas locais.
-            # Ajustamos a janela de 24h para terminar na hora atual local.
-            twenty_four_hours_ago_local = current_time_local - timedelta(hours=24)
-            # A string para a query precisa ser em ISO format
-            twenty_four_hours_ago_str = twenty_four_hours_ago_local.isoformat(sep=' ', timespec='seconds')
-
-
-            # Nota sobre STDEV no SQLite: Ele não é uma função padrão.
-            # Precisamos obter todos os 'counts' e calcular no Python.
-            # STDEV no SQLite é geralmente uma função agregada personalizada ou necessita de uma biblioteca.
-            # Aqui, vou manter a abordagem de GROUP_CONCAT e cálculo em Python, que é mais portátil.
-            
+            # Lê os agregados mantidos por trigger em hourly_stats: no máximo
+            # 24 horas x nº de status linhas, independente do volume bruto.
+            # A janela começa na hora cheia de 24h atrás.
             cursor.execute("""
-                SELECT
-                    strftime('%Y-%m-%dT%H:00:00', timestamp) as hour_window,
-                    status,
-                    GROUP_CONCAT(count) as counts_list
-                FROM transactions
-                WHERE timestamp >= ?
-                GROUP BY hour_window, status
-                ORDER BY hour_window ASC, status ASC;
-            """, (twenty_four_hours_ago_str,))
-            
-            rows_metrics = cursor.fetchall()
-
-            dashboard_metrics = []
-            for row in rows_metrics:
-                # row é um sqlite3.Row, então podemos acessar por nome
-                hour_window = row['hour_window']
-                status = row['status']
-                counts_list_str = row['counts_list']
-                
-                counts = [float(c) for c in counts_list_str.split(',')]
-                
-                avg = statistics.mean(counts)
-                std = statistics.stdev(counts) if len(counts) > 1 else 0.0
-                threshold = avg + app.config['STD_MULTIPLIER'] * std
-
-                dashboard_metrics.append({
-                    "hour_window": hour_window,
-                    "status": status,
-                    "mean_count": round(avg, 2),
-                    "std_count": round(std, 2),
-                    "max_normal_value": round(threshold, 2),
-                    "num_points": len(counts)
-                })
+                SELECT hour_bucket, status, n, total, total_sq
+                FROM hourly_stats
+                WHERE hour_bucket >= ?
+                ORDER BY hour_bucket ASC, status ASC;
+            """, (first_bucket,))
 
-            # Pega as transações recentes E RECALCULA SEU STATUS DE ALERTA para o dashboard
+            dashboard_metrics = [metric_row(*row) for row in cursor.fetchall()]
+
+            # Pega as transações recentes com o veredicto gravado na ingestão
             # Não filtrando por status aqui, para o dashboard poder mostrar todos
             cursor.execute("""
-                SELECT timestamp, status, count FROM transactions
-                ORDER BY timestamp DESC
+                SELECT timestamp, status, count, alert, severity FROM transactions
+                ORDER BY ts DESC
                 LIMIT 50;
             """)
-            raw_recent_transactions = cursor.fetchall()
-            
+
             processed_recent_transactions = []
-            for r in raw_recent_transactions:
-                timestamp = r['timestamp']
-                status = r['status']
-                count = r['count']
-
-                # Reusa a lógica de detecção de anomalia para cada transação recente
-                # A função check_anomaly e calculate_severity são as mesmas usadas para /receive_transaction
-                alert, mean, std, threshold = check_anomaly(status, timestamp, count)
-                severity = calculate_severity(count, mean, std) if mean is not None else "unknown"
-                
+            for r in cursor.fetchall():
                 processed_recent_transactions.append({
-                    "timestamp": timestamp,
-                    "status": status,
-                    "count": count,
-                    "alert": alert,
-                    "severity": severity # Retorna o nível de severidade
+                    "timestamp": r['timestamp'],
+                    "status": r['status'],
+                    "count": r['count'],
+                    "alert": bool(r['alert']),
+                    "severity": r['severity'] or "unknown" # Retorna o nível de severidade
                 })
 
-            return jsonify({
+            # Painel de códigos de autorização: agregados por hora e código
+            # (auth_code_hourly_stats) e os pontos mais recentes
+            cursor.execute("""
+                SELECT hour_bucket, auth_code, n, total, total_sq
+                FROM auth_code_hourly_stats
+                WHERE hour_bucket >= ?
+                ORDER BY hour_bucket ASC, auth_code ASC;
+            """, (first_bucket,))
+            auth_code_metrics = [metric_row(*row, key="auth_code") for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT timestamp, auth_code, count, alert, severity FROM auth_codes
+                ORDER BY ts DESC
+                LIMIT 50;
+            """)
+            recent_auth_codes = [{
+                "timestamp": r['timestamp'],
+                "auth_code": r['auth_code'],
+                "count": r['count'],
+                "alert": bool(r['alert']),
+                "severity": r['severity'] or "unknown"
+            } for r in cursor.fetchall()]
+
+            return app.json.dumps({
                 "metrics_by_hour_status": dashboard_metrics,
-                "recent_transactions": processed_recent_transactions
-            })
+                "recent_transactions": processed_recent_transactions,
+                "auth_code_metrics": auth_code_metrics,
+                "recent_auth_codes": recent_auth_codes,
+                "cursor": events.token(version) # Ponto de partida para /dashboard_stream
+            }).encode()
 
+        try:
+            body, gzipped = dashboard_cache.get(etag, build)
         except sqlite3.Error as e:
             app.logger.error(f"Erro no endpoint /dashboard_data: {e}")
             return jsonify({'error': f'Database error: {str(e)}'}), 500
         except Exception as e:
             app.logger.error(f"Erro inesperado no endpoint /dashboard_data: {e}")
             return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+        response = app.response_class(mimetype='application/json')
+        if 'gzip' in request.accept_encodings:
+            response.set_data(gzipped)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response.set_data(body)
+        response.set_etag(etag)
+        # no-cache: o navegador guarda, mas revalida a cada poll (304 pela ETag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
     
+    # --- ROTA: dashboard_stream (server-sent events) ---
+    @app.route("/dashboard_stream", methods=["GET"])
+    def dashboard_stream():
+        # Empurra apenas o que mudou desde o cursor: transações, alertas e
+        # agregados horários. Sem cursor válido o cliente recebe 'resync' e
+        # recarrega /dashboard_data.
+        cursor = events.parse_token(request.headers.get('Last-Event-ID') or request.args.get('cursor'))
+        keepalive = app.config['STREAM_KEEPALIVE']
+
+        def stream(cursor):
+            yield "retry: 3000\n\n"
+            while True:
+                batch, cursor, resync = events.wait(cursor, keepalive)
+                if resync:
+                    yield format_sse(events.token(cursor), "resync", {})
+                elif not batch:
+                    yield ": keepalive\n\n"
+                for seq, kind, payload in batch:
+                    yield format_sse(events.token(seq), kind, payload)
+
+        return Response(
+            stream(cursor),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    # Valores lidos na hora do scrape: tamanho do banco, linhas por tabela
+    # (COUNT(*) em cache por METRICS_ROWCOUNT_TTL segundos), writer e alertas
+    row_counts = {'at': None, 'values': {}}
+
+    def table_rows() -> dict:
+        now = time.monotonic()
+        if row_counts['at'] is None or now - row_counts['at'] >= app.config['METRICS_ROWCOUNT_TTL']:
+            row_counts['values'] = {
+                (table,): g.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('transactions', 'auth_codes', 'hourly_stats', 'daily_stats')
+            }
+            row_counts['at'] = now
+        return row_counts['values']
+
+    def db_size() -> dict:
+        sizes = {}
+        for name, suffix in (('db', ''), ('wal', '-wal')):
+            path = app.config['DB_PATH'] + suffix
+            sizes[(name,)] = os.path.getsize(path) if os.path.exists(path) else 0
+        return sizes
+
+    registry.gauge('monitor_db_size_bytes', "Size of the SQLite database and WAL files", db_size, ('file',))
+    registry.gauge('monitor_table_rows', "Rows per table", table_rows, ('table',))
+    registry.gauge('monitor_writer_queue_depth', "Batches waiting for the writer", lambda: writer.stats()['queue_depth'])
+    registry.gauge('monitor_writer_rows_total', "Rows committed by the writer",
+                   lambda: writer.stats()['rows'], kind='counter')
+    registry.gauge('monitor_writer_commits_total', "Group commits", lambda: writer.stats()['commits'], kind='counter')
+    registry.gauge('monitor_writer_errors_total', "Failed group commits",
+                   lambda: writer.stats()['errors'], kind='counter')
+    registry.gauge('monitor_alert_queue_depth', "Notifications waiting for a dispatcher worker",
+                   lambda: dispatcher.stats()['queue_depth'])
+    registry.gauge('monitor_alerts_sent_total', "Notifications delivered per channel",
+                   lambda: {(name,): c['sent'] for name, c in dispatcher.stats()['channels'].items()},
+                   ('channel',), kind='counter')
+    registry.gauge('monitor_alerts_failed_total', "Notifications that failed per channel",
+                   lambda: {(name,): c['failed'] for name, c in dispatcher.stats()['channels'].items()},
+                   ('channel',), kind='counter')
+    registry.gauge('monitor_dashboard_cache_total', "/dashboard_data bodies served from memory, built or coalesced",
+                   lambda: {(name,): value for name, value in dashboard_cache.stats().items()}, ('result',),
+                   kind='counter')
+    registry.gauge('monitor_open_incidents', "Open alert incidents", lambda: len(alert_manager.stats()['incidents']))
+    registry.gauge('monitor_profiles_written_total', "Slow-request profiles written",
+                   lambda: profiler.dumped, kind='counter')
+
+    # --- ROTA: metrics (formato texto do Prometheus) ---
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    # --- ROTA: alert_stats ---
+    @app.route("/alert_stats", methods=["GET"])
+    def alert_stats():
+        # Incidentes abertos, fila, latência de envio e falhas por canal
+        return jsonify(dispatcher=dispatcher.stats(), incidents=alert_manager.stats())
+
     # --- Rota para servir o dashboard.html ---
     @app.route('/')
     def index():
         return send_from_directory(APP_DIR, 'dashboard.html')
 
+    if cluster is not None:
+        cluster.install(app)
     return app
 
 
 if __name__ == '__main__':
-    # Garante que a pasta 'data' existe e inicializa o DB
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS transactions (
-            timestamp TEXT,
-            status TEXT,
-            count INTEGER
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
+    # create_app garante que a pasta 'data' existe e inicializa/migra o DB
     app = create_app()
     # Adicionando um logger básico para ver as mensagens no console
     import logging
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     app.logger.setLevel(logging.INFO)
 
-    # Usa app.run() diretamente para simplificar, mas use gunicorn/waitress em produção
+    # Usa app.run() diretamente para simplificar; para vários processos, python cluster.py --workers N
     app.run(port=5000, debug=False, use_reloader=False)
 
     # O bloco input() e Thread.daemon não são mais necessários com app.run() direto para desenvolvimento
@@ -0,0 +1,60 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Os módulos do app são planos (python transactions_endpoint.py), sem pacote
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+STATUSES = ('approved', 'denied', 'failed', 'reversed')
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app on a fresh DB in tmp_path; every app is closed at teardown.
+
+    Writes wait for their commit, the compaction job is off and the alert
+    buckets are empty, so no test ever reaches a real SMTP/Telegram server.
+    """
+    from transactions_endpoint import create_app
+
+    apps = []
+
+    def make(name: str = 'transactions.db', **config):
+        app = create_app({
+            'DB_PATH': str(tmp_path / name),
+            'INGEST_WAIT': True,
+            'COMPACTION_INTERVAL': 0,
+            'ALERT_RATE_PER_MINUTE': 0,
+            'ALERT_BURST': 0,
+            **config,
+        })
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.extensions['close']()
+
+
+@pytest.fixture
+def points():
+    """Two days of traffic in a few hours of the day, with spikes, shuffled.
+
+    Several points share an hour bucket (same-hour baseline) and others are
+    alone in theirs (hour-of-day fallback across days).
+    """
+    rng = random.Random(0)
+    start = datetime(2025, 7, 14, 10)
+    data = []
+    for day in range(2):
+        for hour in (0, 1, 3):
+            for status in STATUSES:
+                for _ in range(rng.randint(1, 12)):
+                    ts = start + timedelta(days=day, hours=hour, minutes=rng.randint(0, 59))
+                    count = rng.randint(5, 20) * (8 if rng.random() < 0.1 else 1)
+                    data.append({'timestamp': ts.isoformat(), 'status': status, 'count': count})
+    rng.shuffle(data)
+    return data
@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from baseline import summarize
+from schema import bucket_columns
+
+HISTORY_LIMIT = 7
+MIN_HISTORY_POINTS = 3
+STD_MULTIPLIER = 3
+SCORING = {'history_limit': HISTORY_LIMIT, 'min_history_points': MIN_HISTORY_POINTS,
+           'std_multiplier': STD_MULTIPLIER}
+VERDICT = "alert, severity, mean, std, threshold"
+
+
+def reference_verdict(history: list, status: str, ts: datetime, count: int) -> tuple:
+    """The check_anomaly rules over plain lists of (status, epoch, count): the
+    latest HISTORY_LIMIT points strictly before `ts` in the same day/hour,
+    else in the same hour of any day. Returns (alert, severity, mean, std,
+    threshold)."""
+    epoch, hour_bucket, hour = bucket_columns(ts)
+    # Empates de timestamp ficam na ordem de chegada, como nos engines
+    earlier = sorted(((e, c) for s, e, c in history if s == status and e < epoch), key=lambda p: p[0])
+    same_hour = [c for e, c in earlier if e // 3600 == hour_bucket][-HISTORY_LIMIT:]
+    n, mean, std = summarize(same_hour)
+    if n < MIN_HISTORY_POINTS:
+        n, mean, std = summarize([c for e, c in earlier if e // 3600 % 24 == hour][-HISTORY_LIMIT:])
+    if n < MIN_HISTORY_POINTS:
+        return False, 'unknown', None, None, None
+    threshold = mean + STD_MULTIPLIER * std
+    if std == 0:
+        severity = 'unknown'
+    else:
+        z = (count - mean) / std
+        severity = 'high' if z >= 3 else 'medium' if z >= 2 else 'low'
+    return count > threshold, severity, mean, std, threshold
+
+
+def as_rows(points: list) -> list:
+    """(status, epoch, count) of API points."""
+    return [(p['status'], bucket_columns(datetime.fromisoformat(p['timestamp']))[0], p['count']) for p in points]
+
+
+def legacy_database(path, points: list, auth_codes: list = ()) -> sqlite3.Connection:
+    # As tabelas como o initialize_database.py original criava (timestamp TEXT livre)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, status TEXT, count INTEGER)")
+    conn.execute("CREATE TABLE auth_codes (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, auth_code TEXT, count INTEGER)")
+    conn.executemany("INSERT INTO transactions(timestamp, status, count) VALUES (?, ?, ?)",
+                     [(p['timestamp'], p['status'], p['count']) for p in points])
+    conn.executemany("INSERT INTO auth_codes(timestamp, auth_code, count) VALUES (?, ?, ?)", auth_codes)
+    conn.commit()
+    return conn
+
+
+def verdicts(conn: sqlite3.Connection, table: str = 'transactions') -> list:
+    return conn.execute(f"SELECT id, {VERDICT} FROM {table} ORDER BY id").fetchall()
+
+
+def assert_same_verdicts(actual: list, expected: list):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got[:3] == want[:3]
+        assert got[3:] == pytest.approx(want[3:])
@@ -0,0 +1,208 @@
+import json
+import smtplib
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import telegram_alert
+from alert_dispatcher import AlertDispatcher, EmailChannel, TelegramChannel
+
+
+def notification(status: str = 'denied', kind: str = 'started') -> dict:
+    return {'kind': kind, 'status': status, 'timestamp': '2025-07-22T21:06:00', 'count': 5000, 'details': {}}
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    # O mínimo do protocolo que o smtplib usa em send_message
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 stub ESMTP')
+        delivered = 0
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command.startswith('RCPT') and server.refuse:
+                self.reply('550 No such user')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while (data := self.rfile.readline()) not in (b'.\r\n', b''):
+                    lines.append(data)
+                with server.lock:
+                    server.messages.append(b''.join(lines))
+                self.reply('250 OK')
+                delivered += 1
+                if server.drop_after and delivered >= server.drop_after:
+                    return # Derruba a conexão, como um servidor com idle timeout
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK') # MAIL, RCPT, RSET, NOOP
+
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, para medir o reuso de conexões
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.requests.append((self.path, payload))
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.refuse = False
+    server.drop_after = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def email_channel(smtp_server):
+    host, port = smtp_server.server_address
+    channel = EmailChannel(connect=lambda: smtplib.SMTP(host, port, timeout=5))
+    yield channel
+    channel.close()
+
+
+@pytest.fixture
+def telegram_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramStubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = []
+    server.statuses = [] # Códigos das próximas respostas (depois, 200)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(telegram_alert, 'TELEGRAM_API_BASE', f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'token')
+    monkeypatch.setenv('TELEGRAM_CHAT_ID', '42')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_email_reuses_one_smtp_connection(smtp_server, email_channel):
+    dispatcher = AlertDispatcher([email_channel], workers=2)
+    for status in ('approved', 'denied', 'failed', 'reversed'):
+        dispatcher.submit(notification(status))
+    dispatcher.join()
+
+    assert len(smtp_server.messages) == 4
+    assert smtp_server.connections == 1
+    assert dispatcher.stats()['channels']['email']['sent'] == 4
+    dispatcher.close()
+
+
+def test_email_reconnects_once_after_a_dropped_connection(smtp_server, email_channel):
+    smtp_server.drop_after = 1
+    for status in ('denied', 'failed', 'reversed'):
+        email_channel.send(notification(status))
+
+    # Cada envio depois do primeiro encontra a conexão derrubada, reabre e entrega
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections == 3
+
+
+def test_email_refusal_is_not_retried(smtp_server, email_channel):
+    smtp_server.refuse = True
+    dispatcher = AlertDispatcher([email_channel], workers=1)
+    dispatcher.submit(notification())
+    dispatcher.join()
+
+    assert smtp_server.connections == 1
+    assert smtp_server.messages == []
+    assert dispatcher.stats()['channels']['email']['failed'] == 1
+    dispatcher.close()
+
+
+def test_telegram_pools_keep_alive_connections(telegram_server):
+    dispatcher = AlertDispatcher([TelegramChannel(pool_size=2)], workers=2)
+    for i in range(20):
+        dispatcher.submit(notification(kind='ongoing' if i else 'started'))
+    dispatcher.join()
+
+    assert len(telegram_server.requests) == 20
+    assert telegram_server.connections <= 2
+    path, payload = telegram_server.requests[0]
+    assert path == '/bottoken/sendMessage'
+    assert payload['chat_id'] == '42'
+    dispatcher.close()
+
+
+def test_telegram_http_error_counts_as_failed(telegram_server):
+    telegram_server.statuses = [500]
+    dispatcher = AlertDispatcher([TelegramChannel()], workers=1)
+    dispatcher.submit(notification('denied'))
+    dispatcher.submit(notification('failed'))
+    dispatcher.join()
+
+    stats = dispatcher.stats()['channels']['telegram']
+    assert (stats['sent'], stats['failed']) == (1, 1)
+    assert len(telegram_server.requests) == 2 # Sem reenvio automático
+    dispatcher.close()
+
+
+class RecordingChannel:
+    def __init__(self, name: str, block: threading.Event = None):
+        self.name = name
+        self.sent = []
+        self.started = threading.Event()
+        self.block = block
+
+    def send(self, notification: dict):
+        self.started.set()
+        if self.block is not None:
+            self.block.wait(5)
+        self.sent.append(notification)
+
+    def close(self):
+        pass
+
+
+def test_dispatcher_drops_when_the_queue_is_full():
+    release = threading.Event()
+    channel = RecordingChannel('email', block=release)
+    dispatcher = AlertDispatcher([channel], workers=1, queue_size=1)
+    assert dispatcher.submit(notification('approved'))
+    assert channel.started.wait(5) # O worker está preso no primeiro envio
+    assert dispatcher.submit(notification('denied'))
+    assert not dispatcher.submit(notification('failed'))
+
+    release.set()
+    dispatcher.join()
+    assert [n['status'] for n in channel.sent] == ['approved', 'denied']
+    assert dispatcher.stats()['channels']['email']['dropped'] == 1
+    dispatcher.close()
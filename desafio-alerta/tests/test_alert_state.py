@@ -0,0 +1,76 @@
+from alert_dispatcher import AlertDispatcher
+from alert_state import AlertManager
+
+
+class RecordingChannel:
+    def __init__(self, name: str):
+        self.name = name
+        self.sent = []
+
+    def send(self, notification: dict):
+        self.sent.append(notification)
+
+    def close(self):
+        pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def sent_kinds(channel: RecordingChannel) -> list:
+    return [(n['status'], n['kind']) for n in channel.sent]
+
+
+def test_alert_manager_rate_limits_each_channel():
+    email, telegram = RecordingChannel('email'), RecordingChannel('telegram')
+    dispatcher = AlertDispatcher([email, telegram], workers=1)
+    clock = FakeClock()
+    manager = AlertManager(dispatcher, rate_per_minute=60, burst=2, clock=clock, start=False)
+
+    for status in ('approved', 'denied', 'failed', 'reversed'):
+        manager.observe(status, '2025-07-22T21:06:00', 100)
+    dispatcher.join()
+    assert len(email.sent) == len(telegram.sent) == 2
+    assert manager.stats()['backlog'] == {'email': 2, 'telegram': 2}
+
+    clock.now = 0.5 # Meio token: nada sai
+    manager.tick()
+    dispatcher.join()
+    assert len(email.sent) == 2
+
+    clock.now = 1.0
+    manager.tick()
+    clock.now = 2.0
+    manager.tick()
+    dispatcher.join()
+    assert sent_kinds(email) == sent_kinds(telegram) == [
+        ('approved', 'started'), ('denied', 'started'), ('failed', 'started'), ('reversed', 'started'),
+    ]
+    dispatcher.close()
+
+
+def test_alert_manager_groups_an_incident():
+    channel = RecordingChannel('email')
+    dispatcher = AlertDispatcher([channel], workers=1)
+    clock = FakeClock()
+    manager = AlertManager(dispatcher, resolve_after=300, digest_interval=60, clock=clock, start=False)
+
+    for count in range(100, 110):
+        manager.observe('denied', '2025-07-22T21:06:00', count)
+    clock.now = 60
+    manager.tick()
+    clock.now = 400
+    manager.tick()
+    dispatcher.join()
+
+    assert sent_kinds(channel) == [('denied', 'started'), ('denied', 'ongoing'), ('denied', 'resolved')]
+    digest, resolved = channel.sent[1]['details'], channel.sent[2]['details']
+    assert digest['New anomalous points'] == 9
+    assert digest['Peak count (since last update)'] == 109
+    assert resolved['Anomalous points'] == 10
+    dispatcher.close()
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import archive  # noqa: E402
+from archive import convert_csv, export, load_frame, partitions  # noqa: E402
+
+CODES = {'timestamp': '2025-07-14T23:30:00', 'codes': {'00': 7, '51': 2}}
+
+
+def stored(db_path: str) -> pd.DataFrame:
+    conn = sqlite3.connect(db_path)
+    frame = pd.read_sql_query("SELECT ts, status, count, alert, severity, mean FROM transactions "
+                              "ORDER BY ts, id", conn)
+    conn.close()
+    return frame
+
+
+def test_export_round_trips_through_load_frame(tmp_path, make_app, points):
+    app = make_app()
+    client = app.test_client()
+    client.post('/receive_transactions', json=points)
+    client.post('/receive_auth_code', json=CODES)
+    archive_dir = str(tmp_path / 'archive')
+
+    result = export(app.config['DB_PATH'], archive_dir, log=lambda *_: None)
+    rows = stored(app.config['DB_PATH'])
+    days = sorted({pd.Timestamp(ts, unit='s').date() for ts in rows['ts']})
+    assert result['transactions'] == {'days': len(days), 'rows': len(rows)}
+    assert list(partitions(archive_dir, 'transactions')) == days
+
+    frame = load_frame(archive_dir)
+    assert str(frame['timestamp'].dt.tz) == 'UTC'
+    assert isinstance(frame['status'].dtype, pd.CategoricalDtype)
+    assert isinstance(frame['severity'].dtype, pd.CategoricalDtype)
+    assert (frame['count'].dtype, frame['alert'].dtype, frame['mean'].dtype) == ('int64', 'bool', 'float64')
+    assert frame['timestamp'].map(lambda ts: int(ts.timestamp())).tolist() == rows['ts'].tolist()
+    assert frame['status'].astype(str).tolist() == rows['status'].tolist()
+    assert frame['count'].tolist() == rows['count'].tolist()
+    assert frame['alert'].tolist() == rows['alert'].astype(bool).tolist()
+    assert frame['severity'].astype(str).tolist() == rows['severity'].tolist()
+    assert frame['mean'].equals(rows['mean'].astype('float64'))
+
+    # Só os dias pedidos são abertos
+    only_first = load_frame(archive_dir, start=days[0], end=days[1], columns=['timestamp', 'count'])
+    assert list(only_first.columns) == ['timestamp', 'count']
+    assert len(only_first) == (rows['ts'] // 86400 == rows['ts'].iloc[0] // 86400).sum()
+    codes = load_frame(archive_dir, 'auth_codes')
+    assert sorted(codes['auth_code'].astype(str)) == ['00', '51']
+
+
+def test_export_rewrites_only_the_last_day(tmp_path, make_app, points):
+    app = make_app()
+    client = app.test_client()
+    ordered = sorted(points, key=lambda p: p['timestamp'])
+    last_day = ordered[-1]['timestamp'][:10]
+    client.post('/receive_transactions', json=[p for p in ordered if p['timestamp'][:10] < last_day])
+    client.post('/receive_transactions', json=[p for p in ordered if p['timestamp'][:10] == last_day][:5])
+    archive_dir = str(tmp_path / 'archive')
+    export(app.config['DB_PATH'], archive_dir, tables=('transactions',), log=lambda *_: None)
+    first_file = next(iter(partitions(archive_dir, 'transactions').values()))
+    os.utime(first_file, (0, 0))
+
+    # O resto do último dia chega, e o primeiro dia sai do banco (compactação)
+    client.post('/receive_transactions', json=[p for p in ordered if p['timestamp'][:10] == last_day][5:])
+    conn = sqlite3.connect(app.config['DB_PATH'])
+    with conn:
+        conn.execute("DELETE FROM transactions WHERE timestamp < ?", (ordered[0]['timestamp'][:10] + 'T23',))
+    conn.close()
+    result = export(app.config['DB_PATH'], archive_dir, tables=('transactions',), log=lambda *_: None)
+
+    assert result['transactions']['days'] == 1
+    assert os.stat(first_file).st_mtime == 0 # Dia anterior não foi reescrito nem apagado
+    assert len(load_frame(archive_dir)) == len(points)
+    # --full reescreve o que ainda está no banco e mantém os dias já fora dele
+    assert export(app.config['DB_PATH'], archive_dir, full=True, log=lambda *_: None)['transactions']['days'] == 1
+    assert len(load_frame(archive_dir)) == len(points)
+
+
+def test_convert_writes_under_the_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    source = tmp_path / 'analysis' / 'transactions_1.csv'
+    source.parent.mkdir()
+    source.write_text("time,status,f0_\n00h 00,approved,9\n13h 45,denied,6\n")
+
+    out_path = convert_csv(str(source))
+    assert out_path == str(tmp_path / 'archive' / 'csv' / 'transactions_1.arrow')
+    assert os.listdir(source.parent) == ['transactions_1.csv']
+    frame = archive.read_file(out_path).to_pandas()
+    assert frame['minute_of_day'].tolist() == [0, 13 * 60 + 45] and frame['minute_of_day'].dtype == 'int16'
+    assert frame['count'].tolist() == [9, 6]
+    assert isinstance(frame['status'].dtype, pd.CategoricalDtype)
@@ -0,0 +1,15 @@
+from helpers import SCORING, VERDICT, assert_same_verdicts, legacy_database, verdicts
+from schema import backfill_verdicts, ensure_schema
+
+
+def test_backfill_scores_only_pending_rows(tmp_path, points):
+    conn = legacy_database(tmp_path / 'legacy.db', sorted(points, key=lambda p: p['timestamp']))
+    ensure_schema(conn, SCORING)
+    expected = verdicts(conn)
+
+    conn.execute(f"UPDATE transactions SET {' = NULL, '.join(VERDICT.split(', '))} = NULL WHERE id % 3 = 0")
+    # Chunks pequenos: a paginação por chave e o histórico entre chunks entram no teste
+    assert backfill_verdicts(conn, SCORING, chunk_rows=5) == len(expected) // 3
+    assert_same_verdicts(verdicts(conn), expected)
+    assert backfill_verdicts(conn, SCORING) == 0
+    conn.close()
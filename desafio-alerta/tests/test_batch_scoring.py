@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+import pytest
+
+from batch_scoring import score_batch
+from helpers import HISTORY_LIMIT, MIN_HISTORY_POINTS, STD_MULTIPLIER, as_rows, reference_verdict
+from schema import from_epoch
+
+
+@pytest.mark.parametrize('stored', [0, 40])
+def test_score_batch_matches_check_anomaly_rules(points, stored):
+    history, batch = as_rows(points[:stored]), as_rows(points[stored:])
+
+    def history_fn(key, min_ts, max_ts):
+        level, status, bucket = key
+        rows = [
+            (e, c) for s, e, c in history
+            if s == status and (e // 3600 if level == 'hour' else e // 3600 % 24) == bucket and e < max_ts
+        ]
+        return [e for e, _ in rows], [c for _, c in rows]
+
+    statuses, ts, counts = zip(*batch)
+    scores = score_batch(statuses, ts, counts, history_fn, HISTORY_LIMIT, MIN_HISTORY_POINTS, STD_MULTIPLIER)
+
+    # Pontos anteriores do mesmo lote contam como histórico dos seguintes
+    everything = history + batch
+    for i, (status, epoch, count) in enumerate(batch):
+        alert, severity, mean, std, threshold = reference_verdict(
+            everything, status, from_epoch(epoch), count
+        )
+        assert bool(scores['alert'][i]) == alert
+        assert scores['severity'][i] == severity
+        if mean is None:
+            assert not scores['known'][i] and np.isnan(scores['mean'][i])
+        else:
+            assert scores['mean'][i] == pytest.approx(mean)
+            assert scores['std'][i] == pytest.approx(std)
+            assert scores['threshold'][i] == pytest.approx(threshold)
+
+
+@pytest.mark.parametrize('max_buckets, detectors', [
+    (4096, ''),
+    (1, ''), # Quase nada residente: o baseline cai no SQL
+    (4096, 'denied=mad, failed=ewma, reversed=seasonal'),
+])
+def test_batch_route_matches_single_point_route(make_app, points, max_buckets, detectors):
+    config = {
+        'HISTORY_LIMIT': HISTORY_LIMIT,
+        'MIN_HISTORY_POINTS': MIN_HISTORY_POINTS,
+        'STD_MULTIPLIER': STD_MULTIPLIER,
+        'BASELINE_MAX_BUCKETS': max_buckets,
+        'DETECTORS': detectors,
+    }
+    single = make_app('single.db', **config).test_client()
+    batch = make_app('batch.db', **config).test_client()
+
+    # O lote ordena por tempo; os pontos avulsos chegam na mesma ordem
+    order = sorted(range(len(points)), key=lambda i: points[i]['timestamp'])
+    expected = [None] * len(points)
+    for i in order:
+        expected[i] = single.post('/receive_transaction', json=points[i]).get_json()
+    body = '\n'.join(json.dumps(p) for p in points)
+    response = batch.post('/receive_transactions', data=body, content_type='application/x-ndjson').get_json()
+
+    assert response['accepted'] == len(points)
+    assert response['results'] == expected
+    assert any(result['alert'] for result in expected)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('status', ['denied']),
+    ('status', {'name': 'denied'}),
+    ('timestamp', ['2025-07-14T10:00:00']),
+    ('count', {'n': 5}),
+    ('count', [5]),
+    ('count', True),
+])
+def test_malformed_points_are_rejected_one_by_one(make_app, field, value):
+    client = make_app().test_client()
+    good = {'timestamp': '2025-07-14T10:00:00', 'status': 'denied', 'count': 5}
+    bad = {**good, field: value}
+
+    response = client.post('/receive_transactions', json=[good, bad, good])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['accepted'], body['rejected']) == (2, 1)
+    assert 'error' in body['results'][1] and 'error' not in body['results'][0]
+    assert client.post('/receive_transaction', json=bad).status_code == 400
@@ -0,0 +1,53 @@
+import json
+import multiprocessing
+import queue
+import zlib
+
+import pytest
+
+from cluster import AUTH_CODE_PARTITION, Cluster, partition_keys, partition_of
+
+
+def test_partition_keys_spread_round_robin():
+    keys = partition_keys()
+    assert keys == ['approved', 'denied', 'failed', 'reversed', AUTH_CODE_PARTITION]
+    assert [partition_of(key, 5, keys) for key in keys] == [0, 1, 2, 3, 4]
+    assert [partition_of(key, 2, keys) for key in keys] == [0, 1, 0, 1, 0]
+    assert {partition_of(key, 1, keys) for key in keys} == {0}
+
+
+def test_unknown_keys_hash_the_same_everywhere():
+    keys = partition_keys()
+    for key in ('refunded', 'pending', 'x'):
+        assert partition_of(key, 3, keys) == zlib.crc32(key.encode()) % 3
+        assert partition_of(key, 3) == partition_of(key, 3, keys)
+
+
+@pytest.fixture
+def workers(make_app):
+    # Dois "workers" no mesmo processo, ligados por filas como no cluster.py
+    inboxes, event_queues = [queue.Queue(), queue.Queue()], [queue.Queue(), queue.Queue()]
+    sequence = multiprocessing.Value('q', 0)
+    return [
+        make_app('cluster.db', CLUSTER=Cluster(index, 2, inboxes, event_queues, partition_keys(), 'boot', sequence))
+        for index in range(2)
+    ]
+
+
+def test_forwarded_batch_results_come_back_in_order(make_app, workers, points):
+    invalid = {'timestamp': '2025-07-14T10:00:00', 'status': 'denied'} # Rejeitado pelo dono
+    batch = points[:20] + [invalid] + points[20:]
+    body = json.dumps(batch)
+    expected = make_app('single.db').test_client().post('/receive_transactions', data=body,
+                                                         content_type='application/json').get_json()
+
+    response = workers[0].test_client().post('/receive_transactions', data=body, content_type='application/json')
+    assert response.status_code == 200
+    assert response.get_json() == expected
+    assert expected['rejected'] == 1 and 'error' in expected['results'][20]
+
+    # Cada status foi pontuado e guardado só pelo seu dono
+    for index, app in enumerate(workers):
+        owned = {key for key in partition_keys() if partition_of(key, 2, partition_keys()) == index}
+        resident = {status for status, _ in app.extensions['baseline']._hours_of_day}
+        assert resident and resident <= owned
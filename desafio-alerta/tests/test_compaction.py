@@ -0,0 +1,106 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from baseline import summarize
+from compaction import DAY, aggregate_stats, compact, compacted_until
+from schema import INSERT_AUTH_CODE, INSERT_TRANSACTION, bucket_columns, ensure_schema, to_epoch
+
+START = datetime(2025, 7, 1)
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/receive_transactions', [{'timestamp': '2025-07-14T10:00:00', 'status': 'denied', 'count': 5}]),
+    ('/receive_auth_code', {'timestamp': '2025-07-14T10:00:00', 'codes': {'51': 3}}),
+])
+def test_retention_check_does_not_wait_for_the_writer(make_app, monkeypatch, path, body):
+    # compacted_until só lê compaction_state, que o writer da ingestão nunca escreve
+    app = make_app(INGEST_WAIT=False)
+    waits = []
+    monkeypatch.setattr(app.extensions['writer'], 'wait_written', lambda *args: waits.append(args) or True)
+    response = app.test_client().post(path, json=body)
+    assert response.status_code == 200
+    assert waits == []
+
+
+def seeded_database(path) -> sqlite3.Connection:
+    # Dez dias, duas horas por dia, dois status e um código de autorização
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    for day in range(10):
+        for hour in (9, 10):
+            for minute in (0, 20, 40):
+                ts = START + timedelta(days=day, hours=hour, minutes=minute)
+                columns = (ts.isoformat(), *bucket_columns(ts))
+                for status in ('denied', 'failed'):
+                    conn.execute(INSERT_TRANSACTION, (columns[0], status, rng.randint(1, 50), *columns[1:],
+                                                      0, None, None, None, None))
+                conn.execute(INSERT_AUTH_CODE, (columns[0], '51', rng.randint(1, 50), *columns[1:],
+                                                0, None, None, None, None))
+    conn.commit()
+    return conn
+
+
+def raw_stats(conn: sqlite3.Connection, where: str, *args) -> tuple:
+    return summarize([row[0] for row in conn.execute(f"SELECT count FROM transactions WHERE {where}", args)])
+
+
+def test_compact_moves_rows_down_the_tiers_once(tmp_path):
+    conn = seeded_database(tmp_path / 'compact.db')
+    daily = conn.execute("SELECT hour_bucket / 24, status, SUM(n), SUM(total), SUM(total_sq) FROM hourly_stats "
+                         "GROUP BY hour_bucket / 24, status ORDER BY 1, 2").fetchall()
+    reference = to_epoch(START) + 9 * DAY # Dia do ponto mais recente
+    raw_cutoff, hourly_cutoff = reference - 2 * DAY, reference - 5 * DAY
+
+    result = compact(conn, raw_days=2, hourly_days=5, pause=0, now=10 ** 10)
+    assert result['transactions'] == {'raw_deleted': 7 * 2 * 3 * 2, 'hourly_rolled_up': 4 * 2 * 2}
+    assert result['auth_codes'] == {'raw_deleted': 7 * 2 * 3, 'hourly_rolled_up': 4 * 2}
+    for source in ('transactions', 'auth_codes'):
+        assert compacted_until(conn, source) == {'raw': raw_cutoff, 'hourly': hourly_cutoff}
+    assert conn.execute("SELECT MIN(ts) FROM transactions").fetchone()[0] == raw_cutoff + 9 * 3600
+    assert conn.execute("SELECT MIN(hour_bucket) FROM hourly_stats").fetchone()[0] == hourly_cutoff // 3600 + 9
+    # As horas roladas somam n, soma e soma dos quadrados no dia
+    assert conn.execute("SELECT day_bucket, status, n, total, total_sq FROM daily_stats "
+                        "ORDER BY 1, 2").fetchall() == [row for row in daily if row[0] < hourly_cutoff // DAY]
+
+    snapshot = [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                for table in ('transactions', 'hourly_stats', 'daily_stats', 'compaction_state')]
+    again = compact(conn, raw_days=2, hourly_days=5, pause=0, now=10 ** 10)
+    assert again['transactions'] == again['auth_codes'] == {'raw_deleted': 0, 'hourly_rolled_up': 0}
+    assert snapshot == [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                        for table in ('transactions', 'hourly_stats', 'daily_stats', 'compaction_state')]
+    conn.close()
+
+
+def test_aggregate_stats_reads_the_tier_that_covers_ts(tmp_path):
+    conn = seeded_database(tmp_path / 'tiers.db')
+    hourly_day, daily_day = START + timedelta(days=6), START + timedelta(days=2)
+    expected = {
+        # Hora ainda no horário: a hora inteira, inclusive depois de ts
+        'hour': raw_stats(conn, "status = 'denied' AND hour_bucket = ?", to_epoch(hourly_day) // 3600 + 10),
+        # Hora já rolada: o dia inteiro serve de baseline da hora
+        'day': raw_stats(conn, "status = 'denied' AND ts >= ? AND ts < ?",
+                         to_epoch(daily_day), to_epoch(daily_day) + DAY),
+        # Hora do dia sobre 7 dias: 10h dos dias no horário + dias inteiros no diário
+        'hour_of_day': raw_stats(
+            conn, "status = 'denied' AND ts < ? AND ((ts >= ? AND hour_of_day = 10) OR (ts >= ? AND ts < ?))",
+            to_epoch(START + timedelta(days=8, hours=10)), to_epoch(START + timedelta(days=4)),
+            to_epoch(START + timedelta(days=1)), to_epoch(START + timedelta(days=4))
+        ),
+    }
+    compact(conn, raw_days=2, hourly_days=5, pause=0, now=10 ** 10)
+
+    stats = {
+        'hour': aggregate_stats(conn, 'transactions', 'denied', 'hour', hourly_day + timedelta(hours=10)),
+        'day': aggregate_stats(conn, 'transactions', 'denied', 'hour', daily_day + timedelta(hours=9, minutes=5)),
+        'hour_of_day': aggregate_stats(conn, 'transactions', 'denied', 'hour_of_day',
+                                       START + timedelta(days=8, hours=10, minutes=30)),
+    }
+    for level, (n, mean, std) in expected.items():
+        assert stats[level] == (n, pytest.approx(mean), pytest.approx(std))
+    assert aggregate_stats(conn, 'auth_codes', '51', 'hour', daily_day)[0] == 6
+    assert aggregate_stats(conn, 'transactions', 'approved', 'hour', daily_day) == (0, None, None)
+    conn.close()
@@ -0,0 +1,137 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from detectors import MAD_SCALE, DetectorRegistry, EwmaDetector, MadDetector, SeasonalDetector
+from schema import ensure_schema
+
+START = datetime(2025, 7, 14) # Uma segunda-feira
+DETECTORS = 'denied=mad, failed=ewma, reversed=seasonal'
+ASSIGNMENTS = {'denied': 'mad', 'failed': 'ewma', 'reversed': 'seasonal'}
+
+
+def stream(n: int, seed: int = 0) -> list:
+    # Minutos seguidos, com valores repetidos e picos
+    rng = random.Random(seed)
+    return [
+        (START + timedelta(minutes=i), rng.randint(5, 20) * (8 if rng.random() < 0.1 else 1))
+        for i in range(n)
+    ]
+
+
+def test_ewma_follows_the_exponential_recurrence():
+    alpha = 0.2
+    detector = EwmaDetector(alpha=alpha, min_history_points=1)
+    points = stream(50)
+    counts = [count for _, count in points]
+    means = pd.Series(counts, dtype=float).ewm(alpha=alpha, adjust=False).mean()
+    var = 0.0
+    for i, (ts, count) in enumerate(points):
+        detector.absorb(ts, count)
+        if i:
+            var = (1 - alpha) * (var + alpha * (count - means[i - 1]) ** 2)
+        n, mean, std = detector.baseline(ts)
+        assert (n, mean) == (i + 1, pytest.approx(means[i]))
+        assert std == pytest.approx(np.sqrt(var))
+
+    alert, mean, std, threshold = detector.score(points[-1][0], 10 ** 6)
+    assert alert and threshold == pytest.approx(mean + 3 * std)
+
+
+@pytest.mark.parametrize('window', [7, 8])
+def test_mad_matches_numpy_over_the_window(window):
+    detector = MadDetector(window=window)
+    counts = []
+    for ts, count in stream(60):
+        detector.absorb(ts, count)
+        counts.append(count)
+        recent = np.array(counts[-window:])
+        median = np.median(recent)
+        n, center, spread = detector.baseline(ts)
+        assert (n, center) == (len(recent), median)
+        assert spread == pytest.approx(MAD_SCALE * np.median(np.abs(recent - median)))
+
+
+def test_mad_ignores_a_single_outlier():
+    detector = MadDetector(window=9)
+    for i, count in enumerate([10, 11, 9, 10, 12, 10, 9, 11]):
+        detector.absorb(START + timedelta(minutes=i), count)
+    before = detector.baseline(START)
+    detector.absorb(START + timedelta(minutes=8), 5000)
+    assert detector.baseline(START)[1] == before[1] # A mediana não se move
+
+
+def test_seasonal_keeps_one_baseline_per_hour_of_week():
+    detector = SeasonalDetector(alpha=0.5, min_history_points=2)
+    monday_10h = START + timedelta(hours=10)
+    for week in range(3):
+        detector.absorb(monday_10h + timedelta(weeks=week), 100)
+        detector.absorb(monday_10h + timedelta(weeks=week, hours=1), 5)
+
+    assert SeasonalDetector.slot(monday_10h) == 10
+    assert SeasonalDetector.slot(monday_10h + timedelta(days=6)) == 6 * 24 + 10
+    assert detector.baseline(monday_10h + timedelta(weeks=3, minutes=30)) == (3, 100.0, 0.0)
+    assert detector.baseline(monday_10h + timedelta(hours=1)) == (3, 5.0, 0.0)
+    assert detector.baseline(monday_10h + timedelta(days=1))[0] == 0 # Terça 10h: nada visto
+    # 100 é normal às 10h e pico às 11h
+    assert not detector.score(monday_10h, 100)[0]
+    assert detector.score(monday_10h + timedelta(hours=1), 100)[0]
+
+
+@pytest.mark.parametrize('size', [1, 40])
+def test_registry_score_leaves_the_detector_unchanged(size):
+    registry = DetectorRegistry(ASSIGNMENTS)
+    points = stream(100)
+    for status in ASSIGNMENTS:
+        registry.absorb(status, points[:60])
+    states = {status: registry.get(status).state() for status in ASSIGNMENTS}
+
+    for status in ASSIGNMENTS:
+        verdicts = registry.score(status, points[60:60 + size])
+        assert registry.get(status).state() == states[status]
+        # Cada ponto do lote vê os anteriores, como se fossem absorvidos um a um
+        reference = DetectorRegistry(ASSIGNMENTS)
+        reference.absorb(status, points[:60])
+        assert verdicts == [reference.get(status).update(ts, count) for ts, count in points[60:60 + size]]
+
+
+def test_saved_state_restores_the_same_detectors(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'state.db')
+    ensure_schema(conn)
+    points = stream(300)
+    saved = DetectorRegistry(ASSIGNMENTS)
+    for status in ASSIGNMENTS:
+        saved.absorb(status, points[:200])
+    saved.save(conn)
+
+    restored = DetectorRegistry(ASSIGNMENTS)
+    assert restored.load(conn) == set(ASSIGNMENTS)
+    # Outro detector para o status: o estado salvo não serve e é ignorado
+    assert DetectorRegistry({'denied': 'ewma'}).load(conn) == set()
+    conn.close()
+    for status in ASSIGNMENTS:
+        assert restored.get(status).state() == saved.get(status).state()
+        assert ([restored.get(status).update(*point) for point in points[200:]]
+                == [saved.get(status).update(*point) for point in points[200:]])
+
+
+def test_restart_keeps_the_same_verdicts(make_app, points):
+    ordered = sorted(points, key=lambda p: p['timestamp'])
+    half = len(ordered) // 2
+    config = {'DETECTORS': DETECTORS, 'DETECTOR_WARM_ROWS': 0} # Só o estado salvo conta
+    continuous = make_app('continuous.db', **config).test_client()
+    expected = [continuous.post('/receive_transaction', json=p).get_json() for p in ordered]
+
+    first = make_app('restarted.db', **config)
+    client = first.test_client()
+    results = [client.post('/receive_transaction', json=p).get_json() for p in ordered[:half]]
+    first.extensions['close']() # Salva o estado dos detectores
+    client = make_app('restarted.db', **config).test_client()
+    results += [client.post('/receive_transaction', json=p).get_json() for p in ordered[half:]]
+
+    assert results == expected
+    assert any(result['alert'] for result in expected[half:])
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import events as events_module
+from events import EventHub, format_sse
+
+
+def batch(start: int, n: int) -> list:
+    return [('transaction', {'i': i}) for i in range(start, start + n)]
+
+
+def test_readers_resume_from_their_cursor():
+    hub = EventHub()
+    firsts = [hub.publish_many(batch(0, 3)), hub.publish_many(batch(3, 4)), hub.publish_many([])]
+    assert firsts == [1, 4, None]
+    assert hub.version == 7
+
+    events, cursor, resync = hub.wait(0, 0)
+    assert [seq for seq, _, _ in events] == list(range(1, 8))
+    assert [payload['i'] for _, _, payload in events] == list(range(7))
+    assert (cursor, resync) == (7, False)
+    events, cursor, resync = hub.wait(hub.parse_token(hub.token(4)), 0)
+    assert [seq for seq, _, _ in events] == [5, 6, 7]
+    assert hub.wait(7, 0) == ([], 7, False) # Nada novo até o timeout
+
+
+def test_wait_wakes_up_on_publish():
+    hub = EventHub()
+    threading.Timer(0.05, hub.publish_many, (batch(0, 2),)).start()
+    started = time.monotonic()
+    events, cursor, resync = hub.wait(0, 5)
+    assert len(events) == 2 and cursor == 2 and not resync
+    assert time.monotonic() - started < 5
+
+
+def test_stale_or_foreign_cursors_resync():
+    hub = EventHub(capacity=5)
+    for i in range(4):
+        hub.publish_many(batch(3 * i, 3))
+    assert hub.wait(None, 0) == ([], 12, True)
+    assert hub.wait(6, 0) == ([], 12, True) # Os eventos 7 e 8 já saíram do buffer
+    assert [seq for seq, _, _ in hub.wait(7, 0)[0]] == [8, 9, 10, 11, 12]
+    assert hub.parse_token(f"other-{hub.version}") is None # Cursor de outro boot
+    assert hub.parse_token(hub.token()) == 12
+
+
+def test_out_of_order_batches_wait_for_the_gap():
+    hub = EventHub()
+    hub.insert(3, batch(2, 2))
+    assert hub.version == 0
+    hub.insert(1, batch(0, 2))
+    events, cursor, _ = hub.wait(0, 0)
+    assert [payload['i'] for _, _, payload in events] == [0, 1, 2, 3] and cursor == 4
+
+
+def test_a_gap_that_never_fills_is_skipped(monkeypatch):
+    monkeypatch.setattr(events_module, 'GAP_TIMEOUT', 0.05)
+    hub = EventHub()
+    hub.insert(3, batch(2, 2)) # Os eventos 1 e 2 nunca chegam
+    events, cursor, resync = hub.wait(0, 5)
+    # Quem estava antes do buraco perdeu eventos e precisa recarregar
+    assert (events, cursor, resync) == ([], 4, True)
+    assert [seq for seq, _, _ in hub.wait(2, 0)[0]] == [3, 4]
+    hub.insert(1, batch(0, 2)) # Atrasado demais: descartado
+    assert hub.version == 4 and hub.wait(4, 0) == ([], 4, False)
+
+
+def test_format_sse():
+    assert format_sse('abc-7', 'alert', {'status': 'denied', 'count': 5}) == (
+        'id: abc-7\nevent: alert\ndata: {"status": "denied", "count": 5}\n\n'
+    )
+
+
+def test_dashboard_stream_pushes_ingested_points(make_app):
+    app = make_app(STREAM_KEEPALIVE=1)
+    client = app.test_client()
+    hub = app.extensions['events']
+    cursor = hub.token()
+    client.post('/receive_transaction', json={'timestamp': '2025-07-14T10:00:00', 'status': 'denied', 'count': 5})
+
+    response = client.get('/dashboard_stream', headers={'Last-Event-ID': cursor}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    messages = [next(chunks).decode() for _ in range(hub.version)]
+    response.close()
+    kinds = [message.split('\n')[1] for message in messages]
+    assert 'event: transaction' in kinds and 'event: hourly' in kinds
+    assert messages[-1].startswith(f"id: {hub.token()}\n")
+    transaction = json.loads(messages[kinds.index('event: transaction')].split('data: ', 1)[1])
+    assert (transaction['status'], transaction['count']) == ('denied', 5)
+
+    stale = client.get('/dashboard_stream', headers={'Last-Event-ID': 'old-1'}, buffered=False)
+    chunks = iter(stale.response)
+    next(chunks)
+    assert next(chunks).decode() == format_sse(hub.token(), 'resync', {})
+    stale.close()
@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from schema import bucket_columns
+
+POINT = {'timestamp': '2025-07-14T10:30:00', 'status': 'denied', 'count': 10}
+_, HOUR_BUCKET, HOUR = bucket_columns(datetime(2025, 7, 14, 10, 30))
+
+
+def resident_state(app) -> tuple:
+    baseline = app.extensions['baseline']
+    return (
+        baseline.window_points('hour', 'denied', HOUR_BUCKET),
+        baseline.window_points('hour_of_day', 'denied', HOUR),
+        app.extensions['auth_code_baseline'].window_points('hour_of_day', '51', HOUR),
+        app.extensions['detectors'].get('denied').state(),
+    )
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/receive_transaction', POINT),
+    ('/receive_transactions', [POINT, {**POINT, 'timestamp': '2025-07-14T10:31:00'}]),
+    ('/receive_auth_code', {'timestamp': '2025-07-14T10:30:00', 'codes': {'51': 3}}),
+])
+def test_failed_persist_leaves_baselines_and_detectors_untouched(make_app, monkeypatch, path, body):
+    app = make_app(DETECTORS='denied=ewma')
+    client = app.test_client()
+    for minute in range(5):
+        client.post('/receive_transaction', json={**POINT, 'timestamp': f"2025-07-14T10:0{minute}:00"})
+    before = resident_state(app)
+
+    def refuse(*args, **kwargs):
+        raise RuntimeError("writer queue full")
+
+    writer = app.extensions['writer']
+    monkeypatch.setattr(writer, 'submit', refuse)
+    response = client.post(path, json=body)
+    assert response.status_code == 503
+    assert resident_state(app) == before
+
+    monkeypatch.undo()
+    assert client.post(path, json=body).status_code == 200
+    assert resident_state(app) != before
+
+
+def stored_counts(app) -> list:
+    conn = sqlite3.connect(app.config['DB_PATH'])
+    counts = [row[0] for row in conn.execute("SELECT count FROM transactions ORDER BY id")]
+    conn.close()
+    return counts
+
+
+@pytest.mark.parametrize('wait', [True, False])
+def test_failed_group_commit(make_app, wait):
+    app = make_app(DETECTORS='denied=ewma', INGEST_WAIT=wait)
+    client = app.test_client()
+    for minute in range(5):
+        client.post('/receive_transaction', json={**POINT, 'timestamp': f"2025-07-14T10:0{minute}:00"})
+    app.extensions['writer'].wait_written()
+    conn = sqlite3.connect(app.config['DB_PATH'])
+    conn.execute("CREATE TRIGGER refuse BEFORE INSERT ON transactions WHEN NEW.count = 666 "
+                 "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.close()
+    before = resident_state(app)
+
+    response = client.post('/receive_transaction', json={**POINT, 'count': 666})
+    app.extensions['writer'].wait_written()
+    assert app.extensions['writer'].stats()['errors'] == 1
+    assert 666 not in stored_counts(app)
+    if wait:
+        # Esperando o commit, a falha chega à resposta e nada é absorvido
+        assert response.status_code == 503
+        assert resident_state(app) == before
+    else:
+        # Sem espera, o ponto já foi respondido e absorvido ao ser enfileirado
+        assert response.status_code == 200
+        assert resident_state(app) != before
+    assert 'monitor_writer_errors_total 1' in client.get('/metrics').get_data(as_text=True).splitlines()
+
+    # O writer segue gravando os próximos lotes
+    assert client.post('/receive_transaction', json={**POINT, 'count': 7}, query_string={'wait': 1}).status_code == 200
+    assert stored_counts(app)[-1] == 7
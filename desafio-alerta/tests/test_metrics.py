@@ -0,0 +1,50 @@
+from metrics import CONTENT_TYPE, Registry
+
+
+def test_registry_renders_the_text_format():
+    registry = Registry()
+    requests = registry.counter('app_requests_total', "Requests", ('route', 'code'))
+    latency = registry.histogram('app_latency_seconds', "Latency", ('route',), buckets=(1, 5))
+    registry.gauge('app_rows', "Rows per table", lambda: {('transactions',): 3}, ('table',))
+    registry.gauge('app_broken', "Unavailable at scrape time", lambda: 1 / 0)
+
+    requests.inc(route='/a', code=200)
+    requests.inc(2, route='/a', code=200)
+    requests.inc(route='/"b"\n', code=500)
+    for value in (0.5, 1, 3, 10): # 1 cai no bucket le="1" (inclusive)
+        latency.observe(value, route='/a')
+
+    assert registry.render() == '\n'.join([
+        '# HELP app_requests_total Requests',
+        '# TYPE app_requests_total counter',
+        'app_requests_total{route="/a",code="200"} 3',
+        'app_requests_total{route="/\\"b\\"\\n",code="500"} 1',
+        '# HELP app_latency_seconds Latency',
+        '# TYPE app_latency_seconds histogram',
+        'app_latency_seconds_bucket{route="/a",le="1"} 2',
+        'app_latency_seconds_bucket{route="/a",le="5"} 3',
+        'app_latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'app_latency_seconds_sum{route="/a"} 14.5',
+        'app_latency_seconds_count{route="/a"} 4',
+        '# HELP app_rows Rows per table',
+        '# TYPE app_rows gauge',
+        'app_rows{table="transactions"} 3',
+        '# HELP app_broken Unavailable at scrape time',
+        '# TYPE app_broken gauge',
+    ]) + '\n'
+
+
+def test_metrics_endpoint(make_app):
+    client = make_app().test_client()
+    client.post('/receive_transaction', json={'timestamp': '2025-07-14T10:00:00', 'status': 'denied', 'count': 5})
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+    assert 'monitor_points_total{table="transactions"} 1' in lines
+    assert 'monitor_http_requests_total{route="/receive_transaction",method="POST",code="200"} 1' in lines
+    assert 'monitor_table_rows{table="transactions"} 1' in lines
+    assert '# TYPE monitor_http_request_duration_seconds histogram' in lines
+    assert any(line.startswith('monitor_http_request_duration_seconds_bucket{route="/receive_transaction",'
+                               'method="POST",le="+Inf"} 1') for line in lines)
@@ -0,0 +1,49 @@
+from helpers import SCORING, legacy_database
+from schema import SCHEMA_VERSION, bucket_columns, ensure_schema, parse_timestamp
+
+
+def test_legacy_database_migrates_to_current_schema(tmp_path, points):
+    odd = [
+        {'timestamp': 'not a timestamp', 'status': 'denied', 'count': 3},
+        {'timestamp': '2025-07-14T10:30:00-03:00', 'status': 'denied', 'count': 4},
+    ]
+    conn = legacy_database(tmp_path / 'legacy.db', points + odd, [
+        ('2025-07-14 10:00:00', 0, 5),
+        ('2025-07-14 10:01:00', '5', 2),
+        ('2025-07-14 10:02:00', 'N7', 1),
+    ])
+    ensure_schema(conn, SCORING)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    rows = conn.execute("SELECT id, timestamp, ts, hour_bucket, hour_of_day, severity FROM transactions "
+                        "ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == list(range(1, len(points) + len(odd) + 1)) # ids preservados
+    for _, timestamp, *columns, severity in rows:
+        if timestamp == 'not a timestamp':
+            assert columns == [None, None, None] and severity is None
+        else:
+            assert tuple(columns) == bucket_columns(parse_timestamp(timestamp))
+            assert severity is not None
+    assert rows[-1][2:5] == bucket_columns(parse_timestamp('2025-07-14T13:30:00')) # Convertido para UTC
+
+    assert conn.execute("SELECT hour_bucket, status, n, total, total_sq FROM hourly_stats "
+                        "ORDER BY hour_bucket, status").fetchall() == conn.execute(
+        "SELECT hour_bucket, status, COUNT(*), SUM(count), SUM(count * count) FROM transactions "
+        "WHERE hour_bucket IS NOT NULL GROUP BY hour_bucket, status ORDER BY hour_bucket, status"
+    ).fetchall()
+    assert [row[0] for row in conn.execute("SELECT auth_code FROM auth_codes ORDER BY id")] == ['00', '05', 'N7']
+    assert conn.execute("SELECT SUM(n) FROM auth_code_hourly_stats").fetchone()[0] == 3
+
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert {'detector_state', 'daily_stats', 'auth_code_daily_stats', 'compaction_state',
+            'idx_transactions_status_hour_bucket', 'idx_auth_codes_code_hour_of_day'} <= tables
+    conn.close()
+
+
+def test_ensure_schema_is_idempotent(tmp_path, points):
+    conn = legacy_database(tmp_path / 'legacy.db', points)
+    ensure_schema(conn, SCORING)
+    before = conn.execute("SELECT * FROM transactions ORDER BY id").fetchall()
+    ensure_schema(conn, {**SCORING, 'std_multiplier': 1}) # Já migrado: nada é repontuado
+    assert conn.execute("SELECT * FROM transactions ORDER BY id").fetchall() == before
+    conn.close()
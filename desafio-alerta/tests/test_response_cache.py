@@ -0,0 +1,98 @@
+import gzip
+import threading
+import time
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def concurrent_gets(cache: ResponseCache, key, build, n: int, release: threading.Event) -> list:
+    results = [None] * n
+
+    def get(i):
+        try:
+            results[i] = cache.get(key, build)
+        except Exception as err:
+            results[i] = err
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    # Todos chegaram: um constrói, os outros esperam o mesmo Future
+    wait_until(lambda: cache.misses + cache.coalesced == n)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_misses_share_one_build():
+    cache, release, calls = ResponseCache(), threading.Event(), []
+
+    def build():
+        calls.append(1)
+        release.wait(5)
+        return b'{"data": 1}'
+
+    results = concurrent_gets(cache, 'v1', build, 8, release)
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0] == (b'{"data": 1}', gzip.compress(b'{"data": 1}', 6))
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'coalesced': 7}
+    assert cache.get('v1', build) is results[0] and cache.stats()['hits'] == 1
+
+
+def test_a_failed_build_is_not_cached():
+    cache, release = ResponseCache(), threading.Event()
+
+    def build():
+        release.wait(5)
+        raise RuntimeError('database is locked')
+
+    results = concurrent_gets(cache, 'v1', build, 4, release)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # A próxima chamada constrói de novo, sem herdar o erro
+    assert cache.get('v1', lambda: b'ok')[0] == b'ok'
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'coalesced': 3}
+    with pytest.raises(KeyError):
+        cache.get('v2', lambda: {}['missing'])
+    assert cache.get('v2', lambda: b'again')[0] == b'again'
+
+
+def test_oldest_entries_age_out():
+    cache = ResponseCache(max_entries=2)
+    for key in ('v1', 'v2', 'v3'):
+        cache.get(key, key.encode)
+    assert cache.get('v1', lambda: b'rebuilt')[0] == b'rebuilt'
+    assert cache.get('v3', lambda: b'rebuilt')[0] == b'v3'
+
+
+def test_dashboard_data_revalidates_with_etag(make_app):
+    client = make_app().test_client()
+    first = client.get('/dashboard_data')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    unchanged = client.get('/dashboard_data', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    assert unchanged.headers['ETag'] == etag
+
+    zipped = client.get('/dashboard_data', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == first.data
+    assert client.application.extensions['dashboard_cache'].stats()['hits'] == 1
+
+    # Novos dados mudam a ETag: a mesma revalidação agora recebe o corpo novo
+    client.post('/receive_transaction', json={'timestamp': '2025-07-14T10:00:00', 'status': 'denied', 'count': 5})
+    changed = client.get('/dashboard_data', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.get_json()['recent_transactions'][0]['count'] == 5
@@ -0,0 +1,22 @@
+import sqlite3
+
+from helpers import SCORING, assert_same_verdicts, legacy_database, verdicts
+from schema import ensure_schema
+
+
+def test_migrated_verdicts_match_ingest(tmp_path, make_app, points):
+    ordered = sorted(points, key=lambda p: p['timestamp'])
+    app = make_app(HISTORY_LIMIT=SCORING['history_limit'], MIN_HISTORY_POINTS=SCORING['min_history_points'],
+                   STD_MULTIPLIER=SCORING['std_multiplier'])
+    client = app.test_client()
+    for point in ordered:
+        client.post('/receive_transaction', json=point)
+    app.extensions['close']()
+
+    # A mesma sequência, gravada sem veredicto e migrada
+    legacy = legacy_database(tmp_path / 'legacy.db', ordered)
+    ensure_schema(legacy, SCORING)
+    ingested = sqlite3.connect(app.config['DB_PATH'])
+    assert_same_verdicts(verdicts(legacy), verdicts(ingested))
+    legacy.close()
+    ingested.close()